@@ -0,0 +1,298 @@
+"""
+模型呼叫的准入控制（admission control）
+每個後端限制同時進行中的模型呼叫數，超過時依序在有上限的佇列中等候；
+佇列已滿或等候超過期限時立即拒絕並附上建議的重試秒數。
+瞬間湧入的請求會排隊或快速失敗，而不是同時打到同一台 Ollama 伺服器後一起逾時
+
+同一個行程內的同步（執行緒）與非同步（asyncio）呼叫共用同一組名額與佇列，依先到先得的順序取得名額
+
+環境變數（可用 ADMISSION_<後端>_MAX_IN_FLIGHT 等為單一後端設定，例如 ADMISSION_OLLAMA_MAX_IN_FLIGHT）：
+    ADMISSION_MAX_IN_FLIGHT   每個後端同時進行中的呼叫數上限（預設 Ollama 4、其他後端 16）
+    ADMISSION_MAX_QUEUE       等候佇列長度上限（預設 32）
+    ADMISSION_QUEUE_TIMEOUT   在佇列中等候的期限秒數（預設 30）
+"""
+
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+
+from metrics import REGISTRY
+
+# 本機 Ollama 通常只能同時處理少數幾個請求，雲端 API 可以放寬
+DEFAULT_MAX_IN_FLIGHT = {"ollama": 4}
+FALLBACK_MAX_IN_FLIGHT = 16
+DEFAULT_MAX_QUEUE = 32
+DEFAULT_QUEUE_TIMEOUT = 30.0
+
+IN_FLIGHT = REGISTRY.gauge("llm_admission_in_flight", "進行中的模型呼叫數", ("backend",))
+QUEUE_DEPTH = REGISTRY.gauge("llm_admission_queue_depth", "等候名額的請求數", ("backend",))
+WAIT_TIME = REGISTRY.histogram("llm_admission_wait_seconds", "取得名額前的等候時間（秒）", ("backend",),
+                               buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+REJECTED = REGISTRY.counter("llm_admission_rejected_total", "被拒絕的請求數（reason：queue_full、timeout）",
+                            ("backend", "reason"))
+
+_REASONS = {"queue_full": "等候佇列已滿", "timeout": "等候逾時"}
+
+
+class Overloaded(Exception):
+    """後端過載，請求未被受理"""
+
+    def __init__(self, backend: str, reason: str, retry_after: int):
+        self.backend = backend
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"⏳ {backend} 目前請求過多（{_REASONS.get(reason, reason)}），請約 {retry_after} 秒後再試")
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class _Waiter:
+    """佇列中的一個等候者：執行緒用 Event 喚醒，協程用 Future 喚醒"""
+
+    __slots__ = ("granted", "event", "loop", "future")
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.granted = False
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+
+    def wake(self) -> bool:
+        """通知等候者已取得名額；事件迴圈已關閉時回傳 False"""
+        if self.event is not None:
+            self.event.set()
+            return True
+        try:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+        except RuntimeError:
+            return False
+        return True
+
+
+class AdmissionController:
+    """單一後端的名額與等候佇列"""
+
+    def __init__(self, backend: str, max_in_flight: int = 4, max_queue: int = DEFAULT_MAX_QUEUE,
+                 queue_timeout: float = DEFAULT_QUEUE_TIMEOUT):
+        self.backend = backend
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        # 每次呼叫佔用名額的時間（指數移動平均），用來估計建議的重試秒數
+        self._service_time = 1.0
+        self._waiters: deque = deque()
+        self._lock = threading.Lock()
+
+    # ---------- 內部 ----------
+
+    def _update_gauges(self):
+        IN_FLIGHT.set(self.in_flight, backend=self.backend)
+        QUEUE_DEPTH.set(len(self._waiters), backend=self.backend)
+
+    def _retry_after(self) -> int:
+        """依平均佔用時間估計佇列消化完所需的秒數"""
+        return max(1, math.ceil(self._service_time * (len(self._waiters) + 1) / self.max_in_flight))
+
+    def _reject(self, reason: str) -> Overloaded:
+        self.rejected += 1
+        REJECTED.inc(backend=self.backend, reason=reason)
+        return Overloaded(self.backend, reason, self._retry_after())
+
+    def _enter(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> Optional[_Waiter]:
+        """有空的名額（且沒有人在排隊）時直接取得並回傳 None，否則排入佇列並回傳等候者"""
+        with self._lock:
+            if self.in_flight < self.max_in_flight and not self._waiters:
+                self.in_flight += 1
+                self.admitted += 1
+                self._update_gauges()
+                return None
+            if len(self._waiters) >= self.max_queue:
+                raise self._reject("queue_full")
+            waiter = _Waiter(loop)
+            self._waiters.append(waiter)
+            self._update_gauges()
+            return waiter
+
+    def _leave_queue(self, waiter: _Waiter) -> bool:
+        """等候結束卻沒被喚醒時移出佇列；回傳 True 表示名額其實已經轉交給它"""
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._waiters.remove(waiter)
+            self._update_gauges()
+            return False
+
+    def _handoff(self):
+        """釋放一個名額：有人在排隊時直接轉交給最早的等候者"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            waiter.granted = True
+            self.admitted += 1
+            if waiter.wake():
+                break
+        else:
+            self.in_flight -= 1
+        self._update_gauges()
+
+    # ---------- 取得與釋放名額 ----------
+
+    def acquire(self, timeout: Optional[float] = None):
+        """取得名額（阻塞目前的執行緒）；被拒絕時拋出 Overloaded"""
+        timeout = self.queue_timeout if timeout is None else timeout
+        started = time.perf_counter()
+        waiter = self._enter()
+        if waiter is not None:
+            waiter.event.wait(timeout)
+            if not self._leave_queue(waiter):
+                with self._lock:
+                    raise self._reject("timeout")
+        WAIT_TIME.observe(time.perf_counter() - started, backend=self.backend)
+
+    async def aacquire(self, timeout: Optional[float] = None):
+        """非同步版本的 acquire，等候時不會阻塞事件迴圈"""
+        timeout = self.queue_timeout if timeout is None else timeout
+        started = time.perf_counter()
+        waiter = self._enter(asyncio.get_running_loop())
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(waiter.future, timeout)
+            except asyncio.TimeoutError:
+                if not self._leave_queue(waiter):
+                    with self._lock:
+                        raise self._reject("timeout")
+            except BaseException:
+                # 請求被取消：已轉交過來的名額要還回去
+                if self._leave_queue(waiter):
+                    with self._lock:
+                        self._handoff()
+                raise
+        WAIT_TIME.observe(time.perf_counter() - started, backend=self.backend)
+
+    def release(self, held: float = 0.0):
+        """釋放名額；held 為這次呼叫佔用名額的秒數"""
+        with self._lock:
+            if held > 0:
+                self._service_time = 0.8 * self._service_time + 0.2 * held
+            self._handoff()
+
+    @contextmanager
+    def admit(self, timeout: Optional[float] = None) -> Iterator[None]:
+        """在區塊內佔用一個名額"""
+        self.acquire(timeout)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - started)
+
+    @asynccontextmanager
+    async def aadmit(self, timeout: Optional[float] = None) -> AsyncIterator[None]:
+        """非同步版本的 admit"""
+        await self.aacquire(timeout)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - started)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": self.backend,
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "queued": len(self._waiters),
+                "max_queue": self.max_queue,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "service_time": self._service_time,
+            }
+
+
+# ---------- 各後端共用的控制器 ----------
+
+_controllers: Dict[str, AdmissionController] = {}
+_controllers_lock = threading.Lock()
+
+
+def _env(backend: str, name: str, default):
+    value = os.getenv(f"ADMISSION_{backend.upper()}_{name}") or os.getenv(f"ADMISSION_{name}")
+    return type(default)(value) if value else default
+
+
+def get_controller(backend: str) -> AdmissionController:
+    """取得後端的准入控制器（同一個行程內共用，設定來自環境變數）"""
+    controller = _controllers.get(backend)
+    if controller is not None:
+        return controller
+    with _controllers_lock:
+        if backend not in _controllers:
+            _controllers[backend] = AdmissionController(
+                backend,
+                max_in_flight=_env(backend, "MAX_IN_FLIGHT",
+                                   DEFAULT_MAX_IN_FLIGHT.get(backend, FALLBACK_MAX_IN_FLIGHT)),
+                max_queue=_env(backend, "MAX_QUEUE", DEFAULT_MAX_QUEUE),
+                queue_timeout=_env(backend, "QUEUE_TIMEOUT", DEFAULT_QUEUE_TIMEOUT),
+            )
+        return _controllers[backend]
+
+
+def backend_of(model) -> str:
+    """依模型類別判斷後端（ChatOllama/OllamaLLM → ollama、ChatOpenAI → openai ...）"""
+    name = type(model).__name__.lower()
+    for keyword, backend in (("ollama", "ollama"), ("google", "gemini"), ("gemini", "gemini"),
+                             ("openai", "openai"), ("anthropic", "anthropic")):
+        if keyword in name:
+            return backend
+    return "default"
+
+
+def admission_for(model) -> AdmissionController:
+    """取得模型所屬後端的准入控制器"""
+    return get_controller(backend_of(model))
+
+
+def admitted(model, timeout: Optional[float] = None):
+    """包裝模型，讓每次 invoke/ainvoke（包括 batch/abatch 的每一筆）都先取得名額"""
+    from langchain_core.runnables import RunnableLambda
+
+    controller = admission_for(model)
+
+    def call(prompt):
+        with controller.admit(timeout):
+            return model.invoke(prompt)
+
+    async def acall(prompt):
+        async with controller.aadmit(timeout):
+            return await model.ainvoke(prompt)
+
+    return RunnableLambda(call, afunc=acall, name=f"admitted_{controller.backend}")
+
+
+def all_stats() -> Dict[str, Dict[str, Any]]:
+    with _controllers_lock:
+        controllers = list(_controllers.values())
+    return {controller.backend: controller.stats() for controller in controllers}
+
+
+def format_admission_stats(stats: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
+    """將各後端的准入狀態轉為 Markdown 清單"""
+    stats = all_stats() if stats is None else stats
+    if not stats:
+        return "- 尚無模型呼叫"
+    return "\n".join(
+        f"- {backend}：進行中 {item['in_flight']}/{item['max_in_flight']}、"
+        f"排隊 {item['queued']}/{item['max_queue']}、拒絕 {item['rejected']}"
+        for backend, item in stats.items()
+    )
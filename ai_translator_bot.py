@@ -1,22 +1,38 @@
 import gradio as gr
-from langchain_ollama import ChatOllama
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_openai import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate
 from dotenv import load_dotenv
 import os
+import time
+
+from admission import Overloaded, admission_for, admitted
+from metrics import NULL_TRACKER, lang_pair, start_metrics_server, track_request
+from model_registry import ModelRegistry
+from model_router import AUTO_MODEL, LatencyRouter
+from prompt_registry import get_prompt
+from translation_cache import TranslationMemory, make_cache_key, template_hash
+from translation_engine import DocumentTranslator
 
 # 載入環境變數
 load_dotenv()
 
+ENTRY_POINT = "ai_translator_bot"
+
 class AITranslatorBot:
-    def __init__(self):
-        self.models = {
-            "Ollama (Gemma3:1b)": ChatOllama(model="gemma3:1b", base_url="http://localhost:11434"),
-            "Google Gemini": ChatGoogleGenerativeAI(model="gemini-2.5-flash"),
-            "OpenAI GPT": ChatOpenAI(model="gpt-3.5-turbo")
-        }
+    def __init__(self, memory=None, document_translator=None):
+        # 模型在第一次使用時才匯入套件並建立 client，啟動時不必載入所有供應商的 SDK
+        self.models = ModelRegistry()
+        self.models.register("Ollama (Gemma3:1b)", "ollama_pool", "get_ollama_chat",
+                             model="gemma3:1b")
+        self.models.register("Google Gemini", "langchain_google_genai", "ChatGoogleGenerativeAI",
+                             model="gemini-2.5-flash")
+        self.models.register("OpenAI GPT", "langchain_openai", "ChatOpenAI",
+                             model="gpt-3.5-turbo")
         
+        # Auto 模式的路由器：依各後端的 p50/p95 延遲與錯誤率選擇，必要時發出對沖請求
+        self.router = LatencyRouter(
+            self.models.keys(),
+            hedge=os.getenv("TRANSLATOR_HEDGE", "1") != "0"
+        )
+
         # 支援的語言選項
         self.languages = {
             "繁體中文": "繁體中文",
@@ -49,46 +65,472 @@ class AITranslatorBot:
 
 {target_language}翻譯：
 """
+        self.template_digest = template_hash(self.translation_template)
 
-    def translate_text(self, text, source_lang, target_lang, model_name, temperature=0.7):
-        """執行翻譯功能"""
-        if not text.strip():
-            return "請輸入要翻譯的文本。"
-        
+        # 翻譯記憶（記憶體 LRU + SQLite），可用 TRANSLATION_MEMORY_DB 指定檔案位置
+        if memory is None:
+            db_path = os.getenv("TRANSLATION_MEMORY_DB")
+            memory = TranslationMemory(db_path) if db_path else TranslationMemory()
+        self.memory = memory
+
+        # 長文件翻譯引擎：超過 token 預算的輸入會分段平行翻譯
+        self.document_translator = document_translator or DocumentTranslator(
+            token_budget=int(os.getenv("TRANSLATOR_CHUNK_TOKENS", "1200")),
+            max_workers=int(os.getenv("TRANSLATOR_MAX_WORKERS", "4"))
+        )
+
+    def _build_prompt(self, text, source_lang, target_lang):
+        """格式化翻譯提示（模板與語言對只編譯一次）"""
+        prompt = get_prompt(
+            self.translation_template,
+            source_language=source_lang,
+            target_language=target_lang
+        )
+        return prompt.format_messages(text=text)
+
+    @staticmethod
+    def _chunk_text(chunk):
+        """取出串流片段中的文字"""
+        content = getattr(chunk, 'content', chunk)
+        if isinstance(content, list):
+            # 部分模型（如 Gemini）會回傳多段內容
+            return "".join(
+                part.get("text", "") if isinstance(part, dict) else str(part)
+                for part in content
+            )
+        return content if isinstance(content, str) else str(content)
+
+    @staticmethod
+    def _format_timing(timing):
+        """將計時資訊轉為顯示文字"""
+        if not timing:
+            return ""
+        ttft = timing.get("ttft")
+        ttft_text = f"{ttft:.2f} 秒" if ttft is not None else "—"
+        text = f"⏱️ 首字延遲：{ttft_text}｜總延遲：{timing['total']:.2f} 秒"
+        if timing.get("model"):
+            text += f"｜模型：{timing['model']}"
+        if timing.get("cached"):
+            text += "（翻譯記憶命中）"
+        return text
+
+    def _memory_lookup(self, text, source_lang, target_lang, model_name, temperature, fresh):
+        """查詢翻譯記憶，回傳 (快取鍵, 已快取的譯文或 None)
+
+        fresh=True 且 temperature > 0 時略過查詢，讓呼叫端取得新的譯文
+        """
+        key = make_cache_key(text, source_lang, target_lang, model_name, temperature, self.template_digest)
+        if fresh and temperature > 0:
+            return key, None
+        return key, self.memory.get(key)
+
+    def _report_timing(self, timing):
+        """設定 TRANSLATOR_DEBUG_TIMING=1 時輸出延遲資訊到終端機（平時由 metrics 記錄，不逐筆輸出）"""
+        if os.getenv("TRANSLATOR_DEBUG_TIMING", "0") != "0":
+            print(self._format_timing(timing))
+
+    def _resolve_model(self, model_name):
+        """取得模型，回傳 (模型, 錯誤訊息)"""
         try:
-            # 選擇模型
             model = self.models.get(model_name)
-            if not model:
-                return f"錯誤：找不到模型 {model_name}"
-            
-            # 建立提示模板
-            prompt_template = ChatPromptTemplate.from_template(self.translation_template)
-            
-            # 格式化提示
-            formatted_prompt = prompt_template.format_messages(
-                source_language=source_lang,
-                target_language=target_lang,
-                text=text
-            )
-            
-            # 設定模型參數（如果支援）
-            if hasattr(model, 'temperature'):
-                model.temperature = temperature
-            
-            # 執行翻譯
-            response = model.invoke(formatted_prompt)
-            
-            # 提取翻譯結果
-            if hasattr(response, 'content'):
-                return response.content
-            else:
-                return str(response)
-                
         except Exception as e:
-            return f"翻譯過程中發生錯誤：{str(e)}"
+            return None, f"翻譯過程中發生錯誤：{str(e)}"
+        if not model:
+            return None, f"錯誤：找不到模型 {model_name}"
+        return model, None
+
+    def _require_model(self, model_name):
+        """取得模型，失敗時拋出例外；訊息不含「翻譯過程中發生錯誤」前綴，由呼叫端統一加上"""
+        model = self.models.get(model_name)
+        if not model:
+            raise RuntimeError(f"找不到模型 {model_name}")
+        return model
+
+    @staticmethod
+    def _with_params(model, **params):
+        """複製一份帶有本次呼叫參數的模型
+
+        model_copy 為淺複製，底層的 HTTP client 仍然共用，
+        但參數只影響這次呼叫，並行請求之間不會互相干擾
+        """
+        updates = {key: value for key, value in params.items()
+                   if value is not None and hasattr(model, key)}
+        if not updates:
+            return model
+        return model.model_copy(update=updates)
+
+    def _translate_once(self, model, text, source_lang, target_lang, model_name, temperature, fresh,
+                        tracker=NULL_TRACKER):
+        """單次（非串流）翻譯一段文本，結果寫入翻譯記憶"""
+        cache_key, cached = self._memory_lookup(text, source_lang, target_lang, model_name, temperature, fresh)
+        if cached is not None:
+            return cached
+        with tracker.span("template_format"):
+            prompt = self._build_prompt(text, source_lang, target_lang)
+        with tracker.span("model_call"), admission_for(model).admit():
+            response = model.invoke(prompt)
+        with tracker.span("postprocess"):
+            tracker.record_usage(response)
+            translated = self._chunk_text(response)
+            if translated:
+                self.memory.put(cache_key, translated)
+        return translated
+
+    async def _atranslate_once(self, model, text, source_lang, target_lang, model_name, temperature, fresh,
+                               tracker=NULL_TRACKER):
+        """非同步版本的單次翻譯"""
+        cache_key, cached = self._memory_lookup(text, source_lang, target_lang, model_name, temperature, fresh)
+        if cached is not None:
+            return cached
+        with tracker.span("template_format"):
+            prompt = self._build_prompt(text, source_lang, target_lang)
+        with tracker.span("model_call"):
+            async with admission_for(model).aadmit():
+                response = await model.ainvoke(prompt)
+        with tracker.span("postprocess"):
+            tracker.record_usage(response)
+            translated = self._chunk_text(response)
+            if translated:
+                self.memory.put(cache_key, translated)
+        return translated
+
+    def _iter_output(self, model, text, source_lang, target_lang, model_name, temperature, fresh,
+                     tracker=NULL_TRACKER):
+        """逐步產生累積的譯文：長文件分段平行翻譯，其餘直接串流模型輸出"""
+        if self.document_translator.needs_chunking(text):
+            def translate_batch(batch_text):
+                return self._translate_once(model, batch_text, source_lang, target_lang,
+                                            model_name, temperature, fresh, tracker)
+            yield from self.document_translator.iter_translate(text, translate_batch)
+            return
+
+        with tracker.span("template_format"):
+            prompt = self._build_prompt(text, source_lang, target_lang)
+        translated = ""
+        with tracker.span("model_call"), admission_for(model).admit():
+            for chunk in model.stream(prompt):
+                tracker.record_usage(chunk)
+                piece = self._chunk_text(chunk)
+                if piece:
+                    translated += piece
+                    yield translated
+
+    async def _aiter_output(self, model, text, source_lang, target_lang, model_name, temperature, fresh,
+                            tracker=NULL_TRACKER):
+        """非同步版本的 _iter_output"""
+        if self.document_translator.needs_chunking(text):
+            async def translate_batch(batch_text):
+                return await self._atranslate_once(model, batch_text, source_lang, target_lang,
+                                                   model_name, temperature, fresh, tracker)
+            async for translated in self.document_translator.aiter_translate(text, translate_batch):
+                yield translated
+            return
+
+        with tracker.span("template_format"):
+            prompt = self._build_prompt(text, source_lang, target_lang)
+        translated = ""
+        with tracker.span("model_call"):
+            async with admission_for(model).aadmit():
+                async for chunk in model.astream(prompt):
+                    tracker.record_usage(chunk)
+                    piece = self._chunk_text(chunk)
+                    if piece:
+                        translated += piece
+                        yield translated
+
+    def stream_translation(self, text, source_lang, target_lang, model_name, temperature=0.7, fresh=False):
+        """串流翻譯，逐步產生 (目前譯文, 計時資訊)；計時資訊只在最後一次提供"""
+        if not text.strip():
+            yield "請輸入要翻譯的文本。", None
+            return
+
+        # Auto：同步版本不做對沖，直接選目前最快且健康的後端
+        if model_name == AUTO_MODEL:
+            model_name = self.router.choose()
+
+        with track_request(ENTRY_POINT, model_name, lang_pair(source_lang, target_lang)) as tracker:
+            # 選擇模型（第一次使用時才會建立）
+            with tracker.span("model_load"):
+                model, error = self._resolve_model(model_name)
+            if error:
+                self.router.record(model_name, 0.0, False)
+                tracker.fail("ModelUnavailable")
+                yield error, None
+                return
+
+            start = time.perf_counter()
+            cache_key, cached = self._memory_lookup(text, source_lang, target_lang, model_name, temperature, fresh)
+            if cached is not None:
+                tracker.status = "cached"
+                elapsed = time.perf_counter() - start
+                yield cached, {"ttft": elapsed, "total": elapsed, "cached": True, "model": model_name}
+                return
 
-    def create_interface(self):
-        """創建 Gradio 介面"""
+            first_token_at = None
+            translated = ""
+            try:
+                # 本次呼叫專用的模型參數，不修改共享的模型物件
+                model = self._with_params(model, temperature=temperature)
+
+                for translated in self._iter_output(model, text, source_lang, target_lang,
+                                                    model_name, temperature, fresh, tracker):
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                        tracker.first_token()
+                        self.router.record(model_name, first_token_at - start, True)
+                    yield translated, None
+
+            except Overloaded as e:
+                self.router.record(model_name, time.perf_counter() - start, False)
+                tracker.reject(e)
+                yield str(e), None
+                return
+            except Exception as e:
+                self.router.record(model_name, time.perf_counter() - start, False)
+                tracker.fail(e)
+                yield f"翻譯過程中發生錯誤：{str(e)}", None
+                return
+
+            with tracker.span("postprocess"):
+                tracker.estimate_usage(text, translated)
+                timing = {
+                    "ttft": first_token_at - start if first_token_at is not None else None,
+                    "total": time.perf_counter() - start,
+                    "model": model_name
+                }
+                self._report_timing(timing)
+                if translated:
+                    self.memory.put(cache_key, translated)
+            yield translated, timing
+
+    async def _astart_auto(self, text, source_lang, target_lang, temperature, fresh, tracker=NULL_TRACKER):
+        """Auto：以對沖請求找出最先產生輸出的後端，回傳 (後端名稱, 輸出串流, 第一段輸出)"""
+        async def start(name):
+            model = self._require_model(name)
+            model = self._with_params(model, temperature=temperature)
+            outputs = self._aiter_output(model, text, source_lang, target_lang, name, temperature, fresh, tracker)
+            try:
+                first = await outputs.__anext__()
+            except BaseException:
+                await outputs.aclose()
+                raise
+            return outputs, first
+
+        async def discard(result):
+            await result[0].aclose()
+
+        name, (outputs, first) = await self.router.race(start, on_discard=discard)
+        return name, outputs, first
+
+    async def astream_translation(self, text, source_lang, target_lang, model_name, temperature=0.7, fresh=False):
+        """非同步版本的串流翻譯，使用模型的 astream()；Auto 會啟用對沖請求"""
+        if not text.strip():
+            yield "請輸入要翻譯的文本。", None
+            return
+
+        auto = model_name == AUTO_MODEL
+        with track_request(ENTRY_POINT, model_name, lang_pair(source_lang, target_lang)) as tracker:
+            if not auto:
+                with tracker.span("model_load"):
+                    model, error = self._resolve_model(model_name)
+                if error:
+                    self.router.record(model_name, 0.0, False)
+                    tracker.fail("ModelUnavailable")
+                    yield error, None
+                    return
+
+            start = time.perf_counter()
+            # Auto 與同步版本一樣先決定後端再查翻譯記憶，快取鍵一律使用實際的後端名稱
+            served_by = self.router.choose() if auto else model_name
+            cache_key, cached = self._memory_lookup(text, source_lang, target_lang, served_by, temperature, fresh)
+            if cached is not None:
+                tracker.model = served_by
+                tracker.status = "cached"
+                elapsed = time.perf_counter() - start
+                yield cached, {"ttft": elapsed, "total": elapsed, "cached": True, "model": served_by}
+                return
+
+            first_token_at = None
+            translated = ""
+            try:
+                if auto:
+                    # 路由器已記錄勝出後端的延遲；對沖請求可能由其他後端勝出，譯文存在勝出後端的快取鍵下
+                    served_by, outputs, translated = await self._astart_auto(
+                        text, source_lang, target_lang, temperature, fresh, tracker)
+                    cache_key = make_cache_key(text, source_lang, target_lang, served_by, temperature,
+                                               self.template_digest)
+                    tracker.model = served_by
+                    first_token_at = time.perf_counter()
+                    tracker.first_token()
+                    yield translated, None
+                else:
+                    model = self._with_params(model, temperature=temperature)
+                    outputs = self._aiter_output(model, text, source_lang, target_lang,
+                                                 model_name, temperature, fresh, tracker)
+
+                async for translated in outputs:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                        tracker.first_token()
+                        self.router.record(model_name, first_token_at - start, True)
+                    yield translated, None
+
+            except Exception as e:
+                if not auto:
+                    self.router.record(model_name, time.perf_counter() - start, False)
+                if isinstance(e, Overloaded):
+                    tracker.reject(e)
+                    yield str(e), None
+                    return
+                tracker.fail(e)
+                yield f"翻譯過程中發生錯誤：{str(e)}", None
+                return
+
+            with tracker.span("postprocess"):
+                tracker.estimate_usage(text, translated)
+                timing = {
+                    "ttft": first_token_at - start if first_token_at is not None else None,
+                    "total": time.perf_counter() - start,
+                    "model": served_by
+                }
+                self._report_timing(timing)
+                if translated:
+                    self.memory.put(cache_key, translated)
+            yield translated, timing
+
+    async def atranslate(self, text, source_lang, target_lang, model_name, temperature=0.7, fresh=False, **params):
+        """非同步翻譯（ainvoke），回傳完整譯文
+
+        temperature 與其他模型參數（如 top_p、max_tokens）只套用在這次呼叫；
+        model_name 為 Auto 時交給路由器選擇後端並視情況發出對沖請求
+        """
+        if not text.strip():
+            return "請輸入要翻譯的文本。"
+
+        async def run(name):
+            model = self._require_model(name)
+            model = self._with_params(model, temperature=temperature, **params)
+            if not self.document_translator.needs_chunking(text):
+                return await self._atranslate_once(model, text, source_lang, target_lang,
+                                                   name, temperature, fresh, tracker)
+            cache_key, cached = self._memory_lookup(text, source_lang, target_lang, name, temperature, fresh)
+            if cached is not None:
+                return cached
+            translated = text
+            async for translated in self._aiter_output(model, text, source_lang, target_lang,
+                                                       name, temperature, fresh, tracker):
+                pass
+            self.memory.put(cache_key, translated)
+            return translated
+
+        start = time.perf_counter()
+        with track_request(ENTRY_POINT, model_name, lang_pair(source_lang, target_lang)) as tracker:
+            try:
+                if model_name == AUTO_MODEL:
+                    # 競速的是完整回應，延遲記在 total 視窗，不與串流的第一段輸出時間混在一起
+                    tracker.model, translated = await self.router.race(run, metric="total")
+                    tracker.estimate_usage(text, translated)
+                    return translated
+                translated = await run(model_name)
+            except Exception as e:
+                if model_name != AUTO_MODEL:
+                    self.router.record(model_name, time.perf_counter() - start, False, metric="total")
+                if isinstance(e, Overloaded):
+                    tracker.reject(e)
+                    return str(e)
+                tracker.fail(e)
+                return f"翻譯過程中發生錯誤：{str(e)}"
+            self.router.record(model_name, time.perf_counter() - start, True, metric="total")
+            tracker.estimate_usage(text, translated)
+            return translated
+
+    def _split_cached(self, texts, source_lang, target_lang, model_name, temperature):
+        """批次前先查翻譯記憶，回傳 (結果串列, 待翻譯的 [(索引, 快取鍵)])"""
+        results = [None] * len(texts)
+        pending = []
+        for index, text in enumerate(texts):
+            if not text.strip():
+                results[index] = ("", None)
+                continue
+            cache_key, cached = self._memory_lookup(text, source_lang, target_lang, model_name, temperature, False)
+            if cached is not None:
+                results[index] = (cached, None)
+            else:
+                pending.append((index, cache_key))
+        return results, pending
+
+    def _collect_batch(self, results, pending, responses, tracker=NULL_TRACKER):
+        """整理 batch 的回應：成功的寫入翻譯記憶，失敗的保留錯誤訊息"""
+        for (index, cache_key), response in zip(pending, responses):
+            if isinstance(response, Exception):
+                tracker.error(response)
+                results[index] = (None, str(response))
+                continue
+            tracker.record_usage(response)
+            translated = self._chunk_text(response)
+            if translated:
+                self.memory.put(cache_key, translated)
+            results[index] = (translated, None)
+        return results
+
+    def translate_batch(self, texts, source_lang, target_lang, model_name, temperature=0.0, max_concurrency=8):
+        """批次翻譯（model.batch），回傳與 texts 對應的 [(譯文, 錯誤訊息)]
+
+        已在翻譯記憶中的文本不會送出；單筆失敗不會影響其他筆
+        """
+        if model_name == AUTO_MODEL:
+            model_name = self.router.choose()
+        model, error = self._resolve_model(model_name)
+        if error:
+            raise RuntimeError(error)
+        model = self._with_params(model, temperature=temperature)
+
+        results, pending = self._split_cached(texts, source_lang, target_lang, model_name, temperature)
+        if not pending:
+            return results
+        with track_request(f"{ENTRY_POINT}.batch", model_name, lang_pair(source_lang, target_lang)) as tracker:
+            with tracker.span("template_format"):
+                prompts = [self._build_prompt(texts[index], source_lang, target_lang) for index, _ in pending]
+            with tracker.span("model_call"):
+                # 每一筆都經過准入控制，與互動請求共用同一組名額
+                responses = admitted(model).batch(prompts, config={"max_concurrency": max_concurrency},
+                                                  return_exceptions=True)
+            with tracker.span("postprocess"):
+                self._collect_batch(results, pending, responses, tracker)
+        return results
+
+    async def atranslate_batch(self, texts, source_lang, target_lang, model_name, temperature=0.0, max_concurrency=8):
+        """非同步版本的批次翻譯（model.abatch）"""
+        if model_name == AUTO_MODEL:
+            model_name = self.router.choose()
+        model, error = self._resolve_model(model_name)
+        if error:
+            raise RuntimeError(error)
+        model = self._with_params(model, temperature=temperature)
+
+        results, pending = self._split_cached(texts, source_lang, target_lang, model_name, temperature)
+        if not pending:
+            return results
+        with track_request(f"{ENTRY_POINT}.batch", model_name, lang_pair(source_lang, target_lang)) as tracker:
+            with tracker.span("template_format"):
+                prompts = [self._build_prompt(texts[index], source_lang, target_lang) for index, _ in pending]
+            with tracker.span("model_call"):
+                responses = await admitted(model).abatch(prompts, config={"max_concurrency": max_concurrency},
+                                                         return_exceptions=True)
+            with tracker.span("postprocess"):
+                self._collect_batch(results, pending, responses, tracker)
+        return results
+
+    def translate_text(self, text, source_lang, target_lang, model_name, temperature=0.7, fresh=False):
+        """執行翻譯功能（串流輸出，逐步產生目前的譯文）"""
+        for translated, _ in self.stream_translation(text, source_lang, target_lang, model_name, temperature, fresh):
+            yield translated
+
+    def create_interface(self, concurrency_limit="default"):
+        """創建 Gradio 介面
+
+        concurrency_limit：翻譯事件可同時處理的請求數，"default" 沿用 queue() 的預設值，None 表示不限制
+        """
         
         # 自定義 CSS 樣式
         css = """
@@ -131,7 +573,7 @@ class AITranslatorBot:
                 with gr.Column(scale=1):
                     # 模型選擇
                     model_dropdown = gr.Dropdown(
-                        choices=list(self.models.keys()),
+                        choices=[AUTO_MODEL] + list(self.models.keys()),
                         value="Ollama (Gemma3:1b)",
                         label="🤖 選擇 AI 模型",
                         info="選擇您偏好的翻譯模型"
@@ -146,6 +588,12 @@ class AITranslatorBot:
                         label="🎯 創意度 (Temperature)",
                         info="較高值 = 更有創意，較低值 = 更保守"
                     )
+
+                    fresh_checkbox = gr.Checkbox(
+                        value=False,
+                        label="🔁 重新生成",
+                        info="略過翻譯記憶，取得新的譯文（創意度 > 0 時生效）"
+                    )
                 
                 with gr.Column(scale=2):
                     # 語言選擇
@@ -185,6 +633,7 @@ class AITranslatorBot:
                         show_label=True,
                         interactive=False
                     )
+                    timing_info = gr.Markdown()
                     gr.HTML('</div>')
             
             # 控制按鈕
@@ -213,7 +662,7 @@ class AITranslatorBot:
                 - **多模型支援**：整合 Ollama、Google Gemini、OpenAI 等頂級 AI 模型
                 - **多語言翻譯**：支援 12+ 種主要語言互譯
                 - **智能調節**：可調整創意度參數，獲得不同風格的翻譯
-                - **即時翻譯**：快速準確的翻譯結果
+                - **即時翻譯**：串流顯示翻譯結果，並回報首字延遲與總延遲
                 - **用戶友好**：直觀的現代化介面設計
                 
                 ### 🚀 使用步驟
@@ -234,7 +683,12 @@ class AITranslatorBot:
                 return target_lang.value, source_lang.value
             
             def clear_all():
-                return "", ""
+                return "", "", ""
+
+            async def translate_with_timing(text, source, target, model_name, temperature, fresh):
+                async for translated, timing in self.astream_translation(text, source, target, model_name,
+                                                                         temperature, fresh):
+                    yield translated, self._format_timing(timing)
             
             # 綁定事件
             swap_btn.click(
@@ -244,13 +698,14 @@ class AITranslatorBot:
             
             clear_btn.click(
                 fn=clear_all,
-                outputs=[input_text, output_text]
+                outputs=[input_text, output_text, timing_info]
             )
             
             translate_btn.click(
-                fn=self.translate_text,
-                inputs=[input_text, source_lang, target_lang, model_dropdown, temperature_slider],
-                outputs=output_text
+                fn=translate_with_timing,
+                inputs=[input_text, source_lang, target_lang, model_dropdown, temperature_slider, fresh_checkbox],
+                outputs=[output_text, timing_info],
+                concurrency_limit=concurrency_limit
             )
         
         return interface
@@ -258,12 +713,19 @@ class AITranslatorBot:
 def main():
     """主程式入口"""
     print("🚀 正在啟動 AI 翻譯機器人...")
+
+    # 本機 /metrics 指標服務（METRICS_PORT=0 可關閉）
+    start_metrics_server()
     
     # 創建翻譯機器人實例
     translator = AITranslatorBot()
     
+    # 同時處理的翻譯請求數（可用 TRANSLATOR_CONCURRENCY 調整）
+    concurrency = int(os.getenv("TRANSLATOR_CONCURRENCY", "16"))
+
     # 創建並啟動介面
-    interface = translator.create_interface()
+    interface = translator.create_interface(concurrency_limit=concurrency)
+    interface.queue(default_concurrency_limit=concurrency)
     
     print("✅ AI 翻譯機器人已準備就緒！")
     print("🌐 介面將在 http://127.0.0.1:7860 開啟")
@@ -0,0 +1,268 @@
+"""
+批次翻譯
+從 JSONL / CSV / gettext PO 檔案串流讀取紀錄，分組後以 model.batch / abatch 翻譯，
+結果逐批寫入輸出檔，並以檢查點檔案支援中斷後續跑
+"""
+
+import asyncio
+import csv
+import json
+import os
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+SUPPORTED_FORMATS = (".jsonl", ".csv", ".po")
+
+
+def detect_format(path: str) -> str:
+    """依副檔名判斷檔案格式"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in SUPPORTED_FORMATS:
+        raise ValueError(f"不支援的檔案格式：{ext}（支援 {', '.join(SUPPORTED_FORMATS)}）")
+    return ext
+
+
+# ---------- 讀取 ----------
+
+def iter_jsonl(path: str, field: str) -> Iterator[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            yield {"text": str(data.get(field) or ""), "data": data}
+
+
+def iter_csv(path: str, field: str) -> Iterator[Dict[str, Any]]:
+    with open(path, encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            yield {"text": row.get(field) or "", "data": row}
+
+
+def _po_unescape(value: str) -> str:
+    return (value.replace('\\\\', '\x00').replace('\\n', '\n').replace('\\t', '\t')
+            .replace('\\"', '"').replace('\x00', '\\'))
+
+
+def _po_escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\t', '\\t')
+
+
+def iter_po(path: str, field: str = "msgid") -> Iterator[Dict[str, Any]]:
+    """逐筆讀取 PO 條目；已有譯文的條目與檔頭會原樣保留，不送去翻譯"""
+    entry = {"comments": [], "fields": {}}
+    current = None
+
+    def finish(entry):
+        fields = entry["fields"]
+        translated = any(value for key, value in fields.items() if key.startswith("msgstr"))
+        header = fields.get("msgid", None) == ""
+        text = "" if header or translated else fields.get("msgid", "")
+        return {"text": text, "data": entry}
+
+    with open(path, encoding="utf-8") as f:
+        for raw in f:
+            line = raw.strip()
+            if not line:
+                if entry["fields"] or entry["comments"]:
+                    yield finish(entry)
+                entry, current = {"comments": [], "fields": {}}, None
+            elif line.startswith("#"):
+                entry["comments"].append(line)
+            elif line.startswith('"') and current:
+                entry["fields"][current] += _po_unescape(line[1:-1])
+            else:
+                keyword, _, value = line.partition(" ")
+                current = keyword
+                entry["fields"][keyword] = _po_unescape(value.strip()[1:-1])
+    if entry["fields"] or entry["comments"]:
+        yield finish(entry)
+
+
+READERS = {".jsonl": iter_jsonl, ".csv": iter_csv, ".po": iter_po}
+
+
+# ---------- 寫入 ----------
+
+class JsonlWriter:
+    def __init__(self, f):
+        self.f = f
+
+    def write(self, record, translation, error):
+        data = dict(record["data"]) if "fields" not in record["data"] else {
+            "msgctxt": record["data"]["fields"].get("msgctxt"),
+            "msgid": record["data"]["fields"].get("msgid"),
+        }
+        data["translation"] = translation
+        if error:
+            data["error"] = error
+        self.f.write(json.dumps(data, ensure_ascii=False) + "\n")
+
+
+class CsvWriter:
+    def __init__(self, f):
+        self.f = f
+        self.writer = None
+
+    def write(self, record, translation, error):
+        row = dict(record["data"])
+        row["translation"] = translation or ""
+        row["error"] = error or ""
+        if self.writer is None:
+            self.writer = csv.DictWriter(self.f, fieldnames=list(row.keys()))
+            if self.f.tell() == 0:
+                self.writer.writeheader()
+        self.writer.writerow(row)
+
+
+class PoWriter:
+    def __init__(self, f):
+        self.f = f
+
+    def write(self, record, translation, error):
+        entry = record["data"]
+        if "fields" not in entry:
+            raise ValueError("PO 輸出只支援 PO 輸入")
+        lines = list(entry["comments"])
+        if error:
+            lines.append(f"# 翻譯失敗：{error}")
+        for keyword, value in entry["fields"].items():
+            if keyword.startswith("msgstr") and translation:
+                # 複數形式的每個 msgstr[n] 都填入同一個譯文
+                value = translation
+            lines.append(f'{keyword} "{_po_escape(value)}"')
+        self.f.write("\n".join(lines) + "\n\n")
+
+
+WRITERS = {".jsonl": JsonlWriter, ".csv": CsvWriter, ".po": PoWriter}
+
+
+# ---------- 檢查點 ----------
+
+def checkpoint_path(output_path: str) -> str:
+    return output_path + ".ckpt"
+
+
+def checkpoint_params(source_lang: str, target_lang: str, model_name: str, temperature: float,
+                      field: str, template_digest: Optional[str]) -> Dict[str, Any]:
+    """會影響譯文的設定；續跑時必須與檢查點相同，否則同一個輸出檔會混入不同設定的譯文"""
+    return {"source_lang": source_lang, "target_lang": target_lang, "model": model_name,
+            "temperature": temperature, "field": field, "template": template_digest}
+
+
+def load_checkpoint(output_path: str, input_path: str, params: Dict[str, Any]) -> Dict[str, int]:
+    """讀取檢查點；輸入檔不同時視為重新開始，翻譯設定不同時拒絕續跑"""
+    path = checkpoint_path(output_path)
+    if not os.path.exists(path):
+        return {"done": 0, "output_bytes": 0}
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("input") != os.path.abspath(input_path):
+        return {"done": 0, "output_bytes": 0}
+    saved = data.get("params") or {}
+    changed = [f"{key}: {saved.get(key)} → {value}" for key, value in params.items() if saved.get(key) != value]
+    if changed:
+        raise ValueError(f"檢查點 {path} 的翻譯設定與這次不同（{'；'.join(changed)}），"
+                         "請使用相同設定續跑，或以 --no-resume 從頭開始")
+    return data
+
+
+def save_checkpoint(output_path: str, input_path: str, params: Dict[str, Any], done: int, output_bytes: int):
+    """原子性地寫入檢查點（先寫暫存檔再取代）"""
+    path = checkpoint_path(output_path)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"input": os.path.abspath(input_path), "params": params, "done": done,
+                   "output_bytes": output_bytes}, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+# ---------- 主流程 ----------
+
+def _grouped(records: Iterator[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    group = []
+    for record in records:
+        group.append(record)
+        if len(group) >= size:
+            yield group
+            group = []
+    if group:
+        yield group
+
+
+def run_batch(input_path: str, output_path: str, source_lang: str, target_lang: str,
+              model_name: str, temperature: float = 0.0, field: Optional[str] = None,
+              batch_size: int = 32, max_concurrency: int = 8, resume: bool = True,
+              use_async: bool = False, translator=None) -> Dict[str, Any]:
+    """批次翻譯整個檔案，回傳統計資訊"""
+    input_format = detect_format(input_path)
+    output_format = detect_format(output_path)
+    if output_format == ".po" and input_format != ".po":
+        raise ValueError("PO 輸出只支援 PO 輸入")
+    field = field or ("msgid" if input_format == ".po" else "text")
+
+    if translator is None:
+        from ai_translator_bot import AITranslatorBot
+        translator = AITranslatorBot()
+
+    params = checkpoint_params(source_lang, target_lang, model_name, temperature, field,
+                               getattr(translator, "template_digest", None))
+    # 續跑：截掉最後一次檢查點之後寫了一半的內容，並跳過已完成的紀錄
+    state = load_checkpoint(output_path, input_path, params) if resume else {"done": 0, "output_bytes": 0}
+    done = state["done"]
+    if done and os.path.exists(output_path):
+        os.truncate(output_path, state["output_bytes"])
+        print(f"↩️ 從第 {done + 1} 筆紀錄繼續")
+    else:
+        done = 0
+
+    records = READERS[input_format](input_path, field)
+    for _ in range(done):
+        next(records, None)
+
+    stats = {"records": done, "translated": 0, "failed": 0, "skipped": 0}
+    started = time.perf_counter()
+    # 非同步模式共用同一個事件迴圈，讓模型的 async client 可以重複使用連線
+    loop = asyncio.new_event_loop() if use_async else None
+
+    def translate_group(texts):
+        if loop is not None:
+            return loop.run_until_complete(translator.atranslate_batch(
+                texts, source_lang, target_lang, model_name, temperature, max_concurrency))
+        return translator.translate_batch(
+            texts, source_lang, target_lang, model_name, temperature, max_concurrency)
+
+    try:
+        with open(output_path, "a" if done else "w", encoding="utf-8", newline="") as out:
+            writer = WRITERS[output_format](out)
+            for group in _grouped(records, batch_size):
+                results = translate_group([record["text"] for record in group])
+                for record, (translation, error) in zip(group, results):
+                    if not record["text"].strip():
+                        stats["skipped"] += 1
+                        translation = None
+                    elif error:
+                        stats["failed"] += 1
+                    else:
+                        stats["translated"] += 1
+                    writer.write(record, translation, error)
+
+                # 確定寫入磁碟後才更新檢查點
+                out.flush()
+                os.fsync(out.fileno())
+                stats["records"] += len(group)
+                save_checkpoint(output_path, input_path, params, stats["records"], os.fstat(out.fileno()).st_size)
+
+                elapsed = time.perf_counter() - started
+                rate = (stats["records"] - done) / elapsed if elapsed else 0.0
+                print(f"📦 已完成 {stats['records']} 筆（成功 {stats['translated']}、失敗 {stats['failed']}、"
+                      f"略過 {stats['skipped']}），{rate:.1f} 筆/秒")
+    finally:
+        if loop is not None:
+            loop.close()
+
+    # 全部完成後移除檢查點
+    if os.path.exists(checkpoint_path(output_path)):
+        os.remove(checkpoint_path(output_path))
+    stats["elapsed"] = time.perf_counter() - started
+    return stats
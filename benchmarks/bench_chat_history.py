@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+對話歷史每輪額外開銷的微基準測試
+比較原本「每輪把整段歷史字典轉成訊息物件 + strftime 時間戳記」與
+chat_history.ChatHistory（訊息物件只建立一次）在長對話中的每輪開銷（不呼叫模型）
+
+用法：python benchmarks/bench_chat_history.py [--turns 1000]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "lesson5_0927"))
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from chat_history import ChatHistory
+from chat_memory import ConversationMemory
+
+SYSTEM_MESSAGE = "你是一個友善且樂於助人的 AI 助手，請用繁體中文回答問題。"
+QUESTION = "請說明 LangChain 的 Chat Model 與 LLM 有什麼不同？"
+ANSWER = "Chat Model 以訊息串列作為輸入與輸出，LLM 則是輸入字串、輸出字串。" * 3
+
+
+def before_turn(history, user_input):
+    """原本的作法：每輪重建所有訊息物件"""
+    messages = [SystemMessage(content=SYSTEM_MESSAGE)]
+    for msg in history:
+        if msg["role"] == "user":
+            messages.append(HumanMessage(content=msg["content"]))
+        elif msg["role"] == "assistant":
+            messages.append(AIMessage(content=msg["content"]))
+    messages.append(HumanMessage(content=user_input))
+    for role, content in (("user", user_input), ("assistant", ANSWER)):
+        history.append({"role": role, "content": content,
+                        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
+    return messages
+
+
+def make_after_turn(strategy):
+    memory = ConversationMemory(token_budget=4096, strategy=strategy)
+
+    def after_turn(history, user_input):
+        messages, _ = memory.build_messages(SYSTEM_MESSAGE, history, user_input)
+        history.append("user", user_input)
+        history.append("assistant", ANSWER)
+        return messages
+
+    return after_turn
+
+
+def run(turn_fn, history, turns):
+    """回傳每一輪的耗時（微秒）"""
+    durations = []
+    for i in range(turns):
+        started = time.perf_counter()
+        turn_fn(history, f"{QUESTION}（第 {i} 輪）")
+        durations.append((time.perf_counter() - started) * 1e6)
+    return durations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="對話歷史每輪額外開銷的微基準測試")
+    parser.add_argument("--turns", type=int, default=1000, help="對話輪數")
+    args = parser.parse_args()
+
+    checkpoints = [10, args.turns // 10, args.turns // 2, args.turns]
+    print(f"{args.turns} 輪對話，每輪耗時（µs，取該輪之前 10 輪的平均）\n")
+    print(f"{'':<34}" + "".join(f"{f'第 {n} 輪':>12}" for n in checkpoints) + f"{'總計 (ms)':>12}")
+    for name, turn_fn, history in [
+        ("之前（每輪重建訊息物件）", before_turn, []),
+        ("之後（ChatHistory，full）", make_after_turn("full"), ChatHistory()),
+        ("之後（ChatHistory，window 4096）", make_after_turn("window"), ChatHistory()),
+    ]:
+        durations = run(turn_fn, history, args.turns)
+        cells = "".join(f"{statistics.fmean(durations[max(0, n - 10):n]):12.1f}" for n in checkpoints)
+        print(f"{name:<34}{cells}{sum(durations) / 1000:12.1f}")
+
+
+if __name__ == "__main__":
+    main()
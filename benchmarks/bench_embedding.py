@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+匯入流程 embedding 階段的基準測試
+以模擬的 embedding 模型（每批固定延遲，或以 numpy 做 CPU 運算）比較：
+逐一呼叫 embed_documents、EmbeddingStage 分批平行計算、以及快取命中後重新匯入的耗時
+
+用法：python benchmarks/bench_embedding.py [--chunks 2000] [--batch-size 64] [--workers 4]
+                                          [--executor thread|process] [--mode latency|cpu]
+"""
+
+import argparse
+import functools
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "lesson7"))
+
+from embedding_stage import EmbeddingStage
+
+
+class SimulatedEmbeddings:
+    """模擬的 embedding 模型：latency 模式每批等待固定時間（像呼叫模型伺服器），cpu 模式做矩陣運算"""
+
+    def __init__(self, mode: str = "latency", size: int = 1024, batch_latency: float = 0.05):
+        self.mode = mode
+        self.size = size
+        self.batch_latency = batch_latency
+
+    def _vector(self, text: str):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.size)
+        if self.mode == "cpu":
+            matrix = np.random.default_rng(seed + 1).standard_normal((256, self.size))
+            vector = np.tanh(matrix.T @ (matrix @ vector))
+        return vector.tolist()
+
+    def embed_documents(self, texts):
+        if self.mode == "latency":
+            time.sleep(self.batch_latency)
+        return [self._vector(text) for text in texts]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="embedding 階段基準測試")
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--executor", choices=("thread", "process"), default="thread")
+    parser.add_argument("--mode", choices=("latency", "cpu"), default="latency")
+    args = parser.parse_args()
+
+    texts = [f"第 {i} 段手冊內容：" + "藍牙、Wi-Fi 與電池設定說明。" * 20 for i in range(args.chunks)]
+    hashes = [hashlib.sha256(text.encode("utf-8")).hexdigest() for text in texts]
+    embeddings = SimulatedEmbeddings(args.mode)
+    # 行程池的每個工作行程以 factory 建立自己的模型，不必每批都序列化模型
+    factory = functools.partial(SimulatedEmbeddings, args.mode)
+
+    print(f"🧪 {args.chunks} 個片段，batch_size={args.batch_size}，{args.workers} 個 {args.executor} 工作者，"
+          f"模式 {args.mode}")
+
+    started = time.perf_counter()
+    for start in range(0, len(texts), args.batch_size):
+        embeddings.embed_documents(texts[start:start + args.batch_size])
+    serial = time.perf_counter() - started
+    print(f"   逐批依序計算：{serial:.2f} 秒（{args.chunks / serial:.0f} 片段/秒）")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for label in ("平行計算（快取為空）", "重新匯入（快取命中）"):
+            with EmbeddingStage(embeddings, batch_size=args.batch_size, workers=args.workers,
+                                executor=args.executor, cache_dir=cache_dir, factory=factory) as stage:
+                started = time.perf_counter()
+                stage.embed(texts, hashes)
+                elapsed = time.perf_counter() - started
+            print(f"   {label}：{elapsed:.2f} 秒（{args.chunks / elapsed:.0f} 片段/秒，"
+                  f"計算 {stage.computed}、命中 {stage.cache.hits}）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+翻譯與聊天入口的端到端基準測試
+啟動本機假 Ollama 伺服器（benchmarks/fake_ollama.py），以固定並行數呼叫
+AITranslatorBot.translate_text、simple_translator.translate_text 與 ChatModelsManager.chat，
+量測 req/s、首字延遲（TTFT）、p50/p95/p99 延遲與 RSS，結果寫成 JSON 方便跨版本比對
+
+用法：python benchmarks/bench_entry_points.py [--concurrency 1 4 16] [--requests 64]
+      [--tokens 32] [--token-delay 0.01] [--output bench_entry_points.json]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TEXTS = [
+    "Hello, how are you today?",
+    "The quarterly revenue increased by 15% compared to last year.",
+    "人工智慧正在改變我們的世界，帶來無限的可能性。",
+    "La vie est belle et pleine de surprises.",
+]
+ENTRY_POINTS = ["ai_translator_bot", "simple_translator", "chat_manager"]
+
+
+# ---------- 假伺服器 ----------
+
+def start_fake_server(tokens, token_delay, first_token_delay):
+    """在子行程啟動假 Ollama 伺服器（避免與被測程式搶 GIL），回傳 (行程, 網址)"""
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "benchmarks", "fake_ollama.py"), "--port", "0",
+         "--tokens", str(tokens), "--token-delay", str(token_delay),
+         "--first-token-delay", str(first_token_delay)],
+        stdout=subprocess.PIPE, text=True,
+    )
+    line = process.stdout.readline()
+    if "http://" not in line:
+        process.kill()
+        raise RuntimeError("假 Ollama 伺服器啟動失敗")
+    return process, line[line.index("http://"):].strip()
+
+
+# ---------- 量測 ----------
+
+def current_rss_mb():
+    """目前的常駐記憶體（MB）；沒有 /proc 時改用峰值"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 回傳 KB，macOS 回傳 bytes
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def percentiles(values):
+    """回傳毫秒為單位的 mean/p50/p95/p99（最近秩法）"""
+    if not values:
+        return None
+    values = sorted(values)
+
+    def pick(q):
+        return values[max(0, min(len(values) - 1, int(q * len(values) + 0.999999) - 1))] * 1000
+
+    return {
+        "mean": round(sum(values) / len(values) * 1000, 3),
+        "p50": round(pick(0.50), 3),
+        "p95": round(pick(0.95), 3),
+        "p99": round(pick(0.99), 3),
+    }
+
+
+# ---------- 被測入口 ----------
+
+class _NullMemory:
+    """基準測試不使用翻譯記憶，每個請求都要真的呼叫模型"""
+
+    def get(self, key):
+        return None
+
+    def put(self, key, value):
+        pass
+
+
+def build_entry_points():
+    """建立各入口的呼叫函式：fn(i) -> (首字延遲或 None, 是否成功)"""
+    from ai_translator_bot import AITranslatorBot
+    import simple_translator
+
+    sys.path.insert(0, os.path.join(ROOT, "lesson5_0927"))
+    from lesson5_4 import ChatModelsManager
+
+    bot = AITranslatorBot(memory=_NullMemory())
+
+    def bot_translate(i):
+        started = time.perf_counter()
+        ttft, output = None, ""
+        for output in bot.translate_text(TEXTS[i % len(TEXTS)], "英文", "繁體中文",
+                                         "Ollama (Gemma3:1b)", 0.0):
+            if ttft is None:
+                ttft = time.perf_counter() - started
+        return ttft, not output.startswith("翻譯過程中發生錯誤")
+
+    def simple_translate(i):
+        # 非串流：沒有首字延遲
+        output = simple_translator.translate_text(TEXTS[i % len(TEXTS)], "英文", "繁體中文")
+        return None, not output.startswith("翻譯錯誤")
+
+    # 每個執行緒一個對話管理器，模擬各自獨立的使用者
+    local = threading.local()
+
+    def chat(i):
+        manager = getattr(local, "manager", None)
+        if manager is None:
+            manager = local.manager = ChatModelsManager()
+        output = manager.chat(TEXTS[i % len(TEXTS)], "Ollama (llama3.2)")
+        return None, not output.startswith("❌")
+
+    return {"ai_translator_bot": bot_translate, "simple_translator": simple_translate, "chat_manager": chat}
+
+
+def run_level(fn, concurrency, requests, warmup):
+    """以固定並行數送出 requests 個請求"""
+    latencies, ttfts, errors = [], [], 0
+    lock = threading.Lock()
+
+    def call(i):
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            ttft, ok = fn(i)
+        except Exception:
+            ttft, ok = None, False
+        elapsed = time.perf_counter() - started
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+                if ttft is not None:
+                    ttfts.append(ttft)
+            else:
+                errors += 1
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        # 暖身：建立模型與連線，不列入統計
+        list(executor.map(fn, range(warmup)))
+        rss_before = current_rss_mb()
+        started = time.perf_counter()
+        list(executor.map(call, range(requests)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 4),
+        "requests_per_s": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+        "latency_ms": percentiles(latencies),
+        "ttft_ms": percentiles(ttfts),
+        "rss_mb": {"before": round(rss_before, 1), "after": round(current_rss_mb(), 1),
+                   "peak": round(peak_rss_mb(), 1)},
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="翻譯與聊天入口的吞吐量/延遲基準測試")
+    parser.add_argument("--entry", nargs="+", choices=ENTRY_POINTS, default=ENTRY_POINTS, help="要測試的入口")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="並行數")
+    parser.add_argument("--requests", type=int, default=64, help="每個並行數送出的請求數")
+    parser.add_argument("--warmup", type=int, default=4, help="暖身請求數（不列入統計）")
+    parser.add_argument("--tokens", type=int, default=32, help="假伺服器每個回應的 token 數")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="假伺服器每個 token 的延遲（秒）")
+    parser.add_argument("--first-token-delay", type=float, default=0.05, help="假伺服器第一個 token 前的延遲（秒）")
+    parser.add_argument("--server-url", help="使用已啟動的伺服器，而不是自動啟動假伺服器")
+    parser.add_argument("--output", default="bench_entry_points.json", help="結果 JSON 檔案路徑")
+    args = parser.parse_args()
+
+    process = None
+    if args.server_url:
+        url = args.server_url
+    else:
+        process, url = start_fake_server(args.tokens, args.token_delay, args.first_token_delay)
+    # 必須在建立任何 Ollama client 之前設定
+    os.environ["OLLAMA_URL"] = url
+
+    results = []
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            entry_points = build_entry_points()
+        from ollama_pool import get_pool
+
+        print(f"🧪 伺服器 {url}，每個回應 {args.tokens} 個 token（間隔 {args.token_delay * 1000:.0f} ms）\n")
+        for name in args.entry:
+            for concurrency in args.concurrency:
+                # 被測程式會在終端機輸出計時資訊，量測時先關掉
+                with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                    result = run_level(entry_points[name], concurrency, args.requests, args.warmup)
+                result["entry_point"] = name
+                result["pool"] = get_pool().stats()
+                results.append(result)
+
+                latency = result["latency_ms"] or {}
+                ttft = f"{result['ttft_ms']['p50']:.1f} ms" if result["ttft_ms"] else "—"
+                print(f"{name:<18} 並行 {concurrency:>3}  {result['requests_per_s']:8.1f} req/s  "
+                      f"p50 {latency.get('p50', 0):8.1f} ms  p95 {latency.get('p95', 0):8.1f} ms  "
+                      f"p99 {latency.get('p99', 0):8.1f} ms  "
+                      f"TTFT p50 {ttft:>10}  "
+                      f"RSS {result['rss_mb']['after']:.0f} MB  錯誤 {result['errors']}")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "server": {"url": None if process else url, "tokens": args.tokens,
+                       "token_delay": args.token_delay, "first_token_delay": args.first_token_delay},
+            "requests": args.requests,
+            "warmup": args.warmup,
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 結果已寫入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
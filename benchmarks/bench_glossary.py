@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+領域術語表查詢的微基準測試
+以隨機產生的術語建立 glossary.GlossaryIndex（Aho-Corasick），比較與「逐一檢查每個術語是否出現在原文」
+的查詢耗時；索引的查詢時間只與原文長度有關，不會隨術語數量增加
+
+用法：python benchmarks/bench_glossary.py [--terms 100000] [--words 300]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "lesson5_0927"))
+
+from glossary import GlossaryEntry, GlossaryIndex
+
+
+def random_word(rng):
+    return "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(4, 10)))
+
+
+def naive_lookup(entries, text):
+    """原本的作法：每個術語都在原文中搜尋一次"""
+    lowered = text.lower()
+    return [entry for entry in entries if entry.term.lower() in lowered]
+
+
+def measure(fn, repeat):
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        durations.append((time.perf_counter() - started) * 1000)
+    return statistics.median(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="領域術語表查詢的微基準測試")
+    parser.add_argument("--terms", type=int, default=100000, help="術語數量")
+    parser.add_argument("--words", type=int, default=300, help="原文的單字數")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    entries = [GlossaryEntry(random_word(rng), {"繁體中文": "譯名"}) for _ in range(args.terms)]
+    text = " ".join(rng.choice(entries).term if i % 10 == 0 else random_word(rng) for i in range(args.words))
+
+    started = time.perf_counter()
+    index = GlossaryIndex(entries)
+    print(f"建立索引：{len(index)} 個術語，{time.perf_counter() - started:.2f} 秒（每個領域只需一次）")
+    print(f"原文：{args.words} 個單字，{len(text)} 個字元\n")
+
+    print(f"{'':<28}{'中位數 (ms)':>14}")
+    print(f"{'逐一搜尋每個術語':<28}{measure(lambda: naive_lookup(entries, text), args.repeat):14.2f}")
+    print(f"{'GlossaryIndex.lookup':<28}{measure(lambda: index.lookup(text, '繁體中文'), args.repeat):14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+提示模板微基準測試
+比較「每次請求重新解析模板 / 重建 client」與 prompt_registry 的每次請求額外開銷
+
+用法：python benchmarks/bench_prompt_registry.py [--requests 1000] [--rate 1000]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_ollama import ChatOllama
+
+from ai_translator_bot import AITranslatorBot
+from prompt_registry import get_prompt
+from simple_translator import TRANSLATION_TEMPLATE
+
+LANGUAGES = ["繁體中文", "簡體中文", "英文", "日文", "韓文", "法文", "德文", "西班牙文"]
+TEXTS = [
+    "Hello, how are you today?",
+    "The quarterly revenue increased by 15% compared to last year.",
+    "人工智慧正在改變我們的世界，帶來無限的可能性。",
+    "La vie est belle et pleine de surprises.",
+]
+
+
+def synthetic_requests(count, seed=0):
+    """產生隨機語言對與文本的合成請求"""
+    rng = random.Random(seed)
+    return [(rng.choice(TEXTS), *rng.sample(LANGUAGES, 2)) for _ in range(count)]
+
+
+def run_paced(fn, requests, rate):
+    """以固定速率送出請求，回傳每次請求的處理時間（微秒）"""
+    interval = 1.0 / rate
+    durations = []
+    next_at = time.perf_counter()
+    for request in requests:
+        # 依速率等待下一個請求到達
+        while time.perf_counter() < next_at:
+            pass
+        started = time.perf_counter()
+        fn(*request)
+        durations.append((time.perf_counter() - started) * 1e6)
+        next_at += interval
+    return durations
+
+
+def summarize(name, durations, rate):
+    durations = sorted(durations)
+    p99 = durations[int(len(durations) * 0.99) - 1]
+    mean = statistics.fmean(durations)
+    budget = 1e6 / rate
+    print(f"{name:<36} 平均 {mean:8.1f} µs  p50 {statistics.median(durations):8.1f} µs  "
+          f"p99 {p99:8.1f} µs  佔請求間隔 {mean / budget:6.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="提示模板每次請求額外開銷的微基準測試")
+    parser.add_argument("--requests", type=int, default=1000, help="請求數量")
+    parser.add_argument("--rate", type=int, default=1000, help="每秒請求數")
+    args = parser.parse_args()
+
+    requests = synthetic_requests(args.requests)
+    # 模型延遲載入，建立機器人只是為了取得模板字串
+    bot_template = AITranslatorBot(memory=_NullMemory()).translation_template
+
+    # ai_translator_bot：每次解析 vs 註冊表
+    def bot_before(text, source, target):
+        ChatPromptTemplate.from_template(bot_template).format_messages(
+            source_language=source, target_language=target, text=text)
+
+    def bot_after(text, source, target):
+        get_prompt(bot_template, source_language=source, target_language=target).format_messages(text=text)
+
+    # simple_translator：每次建立 client + f-string vs 共用 client + 註冊表
+    def simple_before(text, source, target):
+        ChatOllama(model="gemma3:1b", base_url="http://localhost:11434")
+        TRANSLATION_TEMPLATE.format(source_lang=source, target_lang=target, text=text)
+
+    def simple_after(text, source, target):
+        get_prompt(TRANSLATION_TEMPLATE, source_lang=source, target_lang=target).format(text=text)
+
+    print(f"合成負載：{args.requests} 個請求，{args.rate} req/s\n")
+    for name, fn in [
+        ("ai_translator_bot 之前（每次解析）", bot_before),
+        ("ai_translator_bot 之後（註冊表）", bot_after),
+        ("simple_translator 之前（每次建 client）", simple_before),
+        ("simple_translator 之後（共用 client）", simple_after),
+    ]:
+        summarize(name, run_paced(fn, requests, args.rate), args.rate)
+
+
+class _NullMemory:
+    """基準測試不需要翻譯記憶"""
+
+    def get(self, key):
+        return None
+
+    def put(self, key, value):
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+串流切分的基準測試
+產生指定大小的文字語料，比較 TextLoader + CharacterTextSplitter（整個檔案與所有片段一次載入）
+與 stream_splitter（逐區塊讀取、逐一產生片段）的峰值記憶體、第一個片段出現的時間與總耗時，並確認兩者切出的片段相同
+
+用法：python benchmarks/bench_stream_splitter.py [--mb 50] [--block-size 1048576]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "lesson7"))
+
+from langchain_community.document_loaders import TextLoader
+from langchain_text_splitters import CharacterTextSplitter
+
+from stream_splitter import iter_chunks
+
+WORDS = ["藍牙", "電池", "螢幕", "設定", "相機", "充電", "Wi-Fi", "更新", "備份", "通知", "指紋", "儲存空間"]
+
+
+def write_corpus(path: str, megabytes: int):
+    rng = random.Random(0)
+    target = megabytes * 1024 * 1024
+    written = 0
+    with open(path, "w", encoding="utf-8") as f:
+        while written < target:
+            paragraph = "".join(rng.choice(WORDS) + rng.choice("，。、") for _ in range(rng.randint(10, 80)))
+            f.write(paragraph + "\n\n")
+            written += len(paragraph.encode("utf-8")) + 2
+
+
+def measure(label: str, chunks_fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    first = None
+    digest = 0
+    count = 0
+    for text in chunks_fn():
+        if first is None:
+            first = time.perf_counter() - started
+        digest = hash((digest, text))
+        count += 1
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"   {label}：{count} 個片段，第一個片段 {first:.3f} 秒，共 {elapsed:.2f} 秒，"
+          f"峰值記憶體 {peak / 1024 / 1024:.1f} MB")
+    return digest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="串流切分基準測試")
+    parser.add_argument("--mb", type=int, default=50, help="語料大小（MB）")
+    parser.add_argument("--block-size", type=int, default=1 << 20, help="每次讀取的字元數")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "corpus.txt")
+        write_corpus(path, args.mb)
+        print(f"🧪 語料 {os.path.getsize(path) / 1024 / 1024:.0f} MB，chunk_size=500，chunk_overlap=200")
+
+        def load_all():
+            documents = TextLoader(file_path=path, encoding="utf-8").load()
+            splitter = CharacterTextSplitter(chunk_size=500, chunk_overlap=200)
+            return (doc.page_content for doc in splitter.split_documents(documents))
+
+        def stream():
+            return (chunk.text for chunk in iter_chunks(path, block_size=args.block_size))
+
+        expected = measure("TextLoader + split_documents", load_all)
+        actual = measure("stream_splitter", stream)
+        print("✅ 片段完全相同" if expected == actual else "❌ 片段不一致")
+
+
+if __name__ == "__main__":
+    main()
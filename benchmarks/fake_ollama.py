@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+本機假 Ollama 伺服器
+實作 /api/chat、/api/generate（串流與非串流）與 /api/tags，依設定的延遲逐 token 回應，
+讓基準測試不需要真正的模型也能量測吞吐量與延遲
+
+用法：python benchmarks/fake_ollama.py [--port 11500] [--tokens 32] [--token-delay 0.01]
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_MODELS = ["gemma3:1b", "gemma3:270m", "llama3.2:latest", "gpt-oss:20b"]
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    """依伺服器設定（server.config）產生固定長度的回應"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, payload):
+        data = (json.dumps(payload, ensure_ascii=False) + "\n").encode()
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            models = [{"name": name, "model": name, "modified_at": _now(), "size": 0, "digest": ""}
+                      for name in self.server.config["models"]]
+            self._send_json(200, {"models": models})
+        elif self.path == "/":
+            self._send_json(200, {"status": "Ollama is running"})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        if self.path not in ("/api/chat", "/api/generate"):
+            self._send_json(404, {"error": "not found"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+        config = self.server.config
+        chat = self.path == "/api/chat"
+        started = time.perf_counter()
+
+        def message(content):
+            if chat:
+                return {"message": {"role": "assistant", "content": content}}
+            return {"response": content}
+
+        def final():
+            return {
+                "model": request.get("model", ""),
+                "created_at": _now(),
+                **message(""),
+                "done": True,
+                "done_reason": "stop",
+                "total_duration": int((time.perf_counter() - started) * 1e9),
+                "prompt_eval_count": len(json.dumps(request.get("messages") or request.get("prompt", ""))) // 4,
+                "eval_count": config["tokens"],
+            }
+
+        time.sleep(config["first_token_delay"])
+        if request.get("stream", True):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                for i in range(config["tokens"]):
+                    if i:
+                        time.sleep(config["token_delay"])
+                    self._write_chunk({"model": request.get("model", ""), "created_at": _now(),
+                                       **message(config["token"]), "done": False})
+                self._write_chunk(final())
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                # 用戶端中途關閉連線（例如使用者按下停止），和 Ollama 一樣停止生成
+                self.close_connection = True
+        else:
+            time.sleep(config["token_delay"] * max(0, config["tokens"] - 1))
+            payload = final()
+            payload.update(message(config["token"] * config["tokens"]))
+            self._send_json(200, payload)
+
+
+def create_server(host="127.0.0.1", port=11500, tokens=32, token_delay=0.01,
+                  first_token_delay=0.05, token="詞", models=None) -> ThreadingHTTPServer:
+    """建立（尚未啟動的）假 Ollama 伺服器；port 為 0 時由系統指定"""
+    server = ThreadingHTTPServer((host, port), FakeOllamaHandler)
+    server.daemon_threads = True
+    server.config = {
+        "tokens": tokens,
+        "token_delay": token_delay,
+        "first_token_delay": first_token_delay,
+        "token": token,
+        "models": list(models or DEFAULT_MODELS),
+    }
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模擬 Ollama /api/chat 的本機伺服器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--tokens", type=int, default=32, help="每個回應的 token 數")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="每個 token 之間的延遲（秒）")
+    parser.add_argument("--first-token-delay", type=float, default=0.05, help="第一個 token 前的延遲（秒）")
+    args = parser.parse_args()
+
+    server = create_server(args.host, args.port, args.tokens, args.token_delay, args.first_token_delay)
+    print(f"🧪 假 Ollama 伺服器：http://{args.host}:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
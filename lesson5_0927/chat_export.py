@@ -0,0 +1,146 @@
+"""
+對話匯出與匯入
+逐筆把對話紀錄寫入檔案（Markdown、JSONL、MessagePack），不在記憶體中組出整份內容；
+可以只匯出部分輪次，JSONL 匯出檔也能匯入回來繼續對話
+"""
+
+import json
+import os
+import struct
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+FORMATS = {"markdown": ".md", "jsonl": ".jsonl", "msgpack": ".msgpack"}
+# 寫入緩衝區大小：累積到這個大小才寫入磁碟
+CHUNK_SIZE = 64 * 1024
+
+
+def select_turns(records: Iterable, start_turn: Optional[int] = None,
+                 end_turn: Optional[int] = None) -> Iterator[Tuple[int, Any]]:
+    """依輪次（從 1 開始，每則使用者訊息開始新的一輪）篩選紀錄，產生 (輪次, 紀錄)"""
+    turn = 0
+    for record in records:
+        if record.role == "user" or turn == 0:
+            turn += 1
+        if start_turn and turn < start_turn:
+            continue
+        if end_turn and turn > end_turn:
+            break
+        yield turn, record
+
+
+# ---------- MessagePack ----------
+
+def _pack_str(value: str) -> bytes:
+    data = value.encode("utf-8")
+    size = len(data)
+    if size < 32:
+        return bytes([0xA0 | size]) + data
+    if size < 2**8:
+        return b"\xd9" + struct.pack(">B", size) + data
+    if size < 2**16:
+        return b"\xda" + struct.pack(">H", size) + data
+    return b"\xdb" + struct.pack(">I", size) + data
+
+
+def _pack(value) -> bytes:
+    """MessagePack 編碼（只支援匯出用到的型別），可用任何 MessagePack 函式庫讀取"""
+    if value is None:
+        return b"\xc0"
+    if isinstance(value, bool):
+        return b"\xc3" if value else b"\xc2"
+    if isinstance(value, int):
+        if 0 <= value < 128:
+            return bytes([value])
+        return b"\xd3" + struct.pack(">q", value)
+    if isinstance(value, float):
+        return b"\xcb" + struct.pack(">d", value)
+    if isinstance(value, str):
+        return _pack_str(value)
+    if isinstance(value, dict):
+        size = len(value)
+        header = bytes([0x80 | size]) if size < 16 else b"\xde" + struct.pack(">H", size)
+        return header + b"".join(_pack_str(str(key)) + _pack(item) for key, item in value.items())
+    raise TypeError(f"不支援的型別：{type(value).__name__}")
+
+
+# ---------- 匯出 ----------
+
+def _write_markdown(out, meta, selected):
+    out.write("# 對話歷史匯出\n".encode())
+    out.write(f"匯出時間: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n".encode())
+    out.write(f"使用模型: {meta.get('model')}\n\n".encode())
+    for i, (turn, record) in enumerate(selected, 1):
+        role_emoji = "👤" if record.role == "user" else "🤖"
+        out.write((f"## {i}. {role_emoji} {record.role.title()}（第 {turn} 輪）\n"
+                   f"**時間**: {record.formatted_time()}\n"
+                   f"**內容**: {record.content}\n\n").encode())
+
+
+def _write_jsonl(out, meta, selected):
+    # 第一行是系統訊息，匯入時用來還原設定
+    out.write((json.dumps({"role": "system", "content": meta.get("system_message", ""),
+                           "model": meta.get("model"), "timestamp": time.time()},
+                          ensure_ascii=False) + "\n").encode())
+    for _, record in selected:
+        out.write((json.dumps(record.to_dict(), ensure_ascii=False) + "\n").encode())
+
+
+def _write_msgpack(out, meta, selected):
+    # 連續的 MessagePack 物件：第一個是中繼資料，之後每則訊息一個
+    out.write(_pack({"model": meta.get("model"), "system_message": meta.get("system_message", ""),
+                     "exported_at": time.time()}))
+    for _, record in selected:
+        out.write(_pack({"role": record.role, "content": record.content, "timestamp": record.timestamp}))
+
+
+_WRITERS = {"markdown": _write_markdown, "jsonl": _write_jsonl, "msgpack": _write_msgpack}
+
+
+def export_history(records: Iterable, fmt: str = "markdown", start_turn: Optional[int] = None,
+                   end_turn: Optional[int] = None, meta: Optional[Dict[str, Any]] = None,
+                   directory: Optional[str] = None, prefix: str = "chat") -> Tuple[str, int]:
+    """把對話紀錄串流寫入檔案，回傳 (檔案路徑, 匯出的訊息數)"""
+    if fmt not in FORMATS:
+        raise ValueError(f"不支援的匯出格式：{fmt}（支援 {', '.join(FORMATS)}）")
+    directory = directory or os.getenv("CHAT_EXPORT_DIR") or os.path.join(tempfile.gettempdir(), "chat_exports")
+    os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix=f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_",
+                                suffix=FORMATS[fmt], dir=directory)
+
+    count = 0
+
+    def counted(selected):
+        nonlocal count
+        for item in selected:
+            count += 1
+            yield item
+
+    with open(fd, "wb", buffering=CHUNK_SIZE) as out:
+        _WRITERS[fmt](out, meta or {}, counted(select_turns(records, start_turn, end_turn)))
+    return path, count
+
+
+# ---------- 匯入 ----------
+
+def import_jsonl(path: str) -> Dict[str, Any]:
+    """讀取 JSONL 匯出檔，回傳可交給 ChatModelsManager.restore_state() 的狀態"""
+    state: Dict[str, Any] = {"conversation_history": []}
+    history: List[Dict[str, Any]] = state["conversation_history"]
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"第 {line_number} 行不是有效的 JSON：{e}") from e
+            if record.get("role") == "system":
+                state["system_message"] = record.get("content", "")
+                if record.get("model"):
+                    state["current_model"] = record["model"]
+            elif record.get("role") in ("user", "assistant"):
+                history.append(record)
+    return state
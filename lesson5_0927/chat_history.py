@@ -0,0 +1,85 @@
+"""
+只能附加的對話歷史
+每則訊息在加入時就建好 LangChain 訊息物件並估計 token 數，之後每一輪直接取用，
+不必再把整段歷史重新轉換一次；時間戳記以數字儲存，需要顯示時才格式化
+"""
+
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+from chat_memory import count_tokens
+
+_MESSAGE_TYPES = {"user": HumanMessage, "assistant": AIMessage}
+
+
+class ChatRecord:
+    """單則對話紀錄"""
+
+    __slots__ = ("role", "content", "timestamp", "message", "tokens")
+
+    def __init__(self, role: str, content: str, timestamp: Optional[float] = None):
+        self.role = role
+        self.content = content
+        self.timestamp = time.time() if timestamp is None else timestamp
+        message_type = _MESSAGE_TYPES.get(role)
+        self.message: Optional[BaseMessage] = message_type(content=content) if message_type else None
+        self.tokens = count_tokens(content)
+
+    def formatted_time(self) -> str:
+        return datetime.fromtimestamp(self.timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"role": self.role, "content": self.content, "timestamp": self.timestamp}
+
+
+class ChatHistory:
+    """對話紀錄串列；append 為 O(1)，messages() 直接回傳已建好的訊息物件"""
+
+    def __init__(self, records: Optional[List[Dict[str, Any]]] = None):
+        self._records: List[ChatRecord] = []
+        self._messages: List[BaseMessage] = []
+        for record in records or []:
+            self.append(record["role"], record["content"], _parse_timestamp(record.get("timestamp")))
+
+    def append(self, role: str, content: str, timestamp: Optional[float] = None) -> ChatRecord:
+        record = ChatRecord(role, content, timestamp)
+        self._records.append(record)
+        if record.message is not None:
+            self._messages.append(record.message)
+        return record
+
+    def messages(self, start: int = 0) -> List[BaseMessage]:
+        """第 start 則紀錄之後的訊息物件"""
+        if len(self._messages) == len(self._records):
+            return self._messages[start:]
+        # 有無法對應到訊息物件的角色時才逐筆挑選
+        return [record.message for record in self._records[start:] if record.message is not None]
+
+    def clear(self):
+        self._records.clear()
+        self._messages.clear()
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        return [record.to_dict() for record in self._records]
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __getitem__(self, index):
+        return self._records[index]
+
+    def __iter__(self) -> Iterator[ChatRecord]:
+        return iter(self._records)
+
+
+def _parse_timestamp(value) -> Optional[float]:
+    """相容舊格式的 "%Y-%m-%d %H:%M:%S" 字串"""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    try:
+        return datetime.strptime(value, "%Y-%m-%d %H:%M:%S").timestamp()
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,195 @@
+"""
+有 token 預算的對話記憶
+每一輪只把「系統訊息 + 先前對話摘要 + 預算內最近的對話」送給模型，
+讓長時間的對話每輪提示大小與延遲維持穩定
+
+策略：
+    full      送出完整歷史（原本的行為，不做裁切）
+    window    滑動視窗：只保留預算內最近的訊息
+    summary   滑動視窗 + 滾動摘要：被移出視窗的訊息在背景執行緒整理成摘要，不佔用請求時間
+系統訊息固定放在最前面（pinned），永遠不會被裁掉
+"""
+
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Tuple
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from admission import admitted
+from translation_engine import estimate_tokens
+
+STRATEGIES = ("full", "window", "summary")
+# 每則訊息的角色標記等額外開銷
+MESSAGE_OVERHEAD = 4
+
+SUMMARY_PROMPT = """請將以下對話整理成簡短的摘要，保留使用者的需求、重要事實與結論，不超過 {limit} 字。
+
+{previous}新的對話：
+{dialogue}
+
+摘要："""
+
+# 所有對話共用一個背景執行緒做摘要，避免大量對話同時建立執行緒
+_summary_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-summary")
+
+
+def count_tokens(content: str) -> int:
+    """單則訊息的 token 估計值"""
+    return estimate_tokens(content) + MESSAGE_OVERHEAD
+
+
+def keep_tail(content: str, limit: int) -> str:
+    """保留 content 最後、token 估計值（含訊息開銷）不超過 limit 的部分"""
+    if count_tokens(content) <= limit:
+        return content
+    # 後綴越長 token 數越多：二分搜尋最早可保留的起點
+    low, high = 0, len(content)
+    while low < high:
+        middle = (low + high) // 2
+        if count_tokens(content[middle:]) <= limit:
+            high = middle
+        else:
+            low = middle + 1
+    return content[low:]
+
+
+class ConversationMemory:
+    """依 token 預算挑選要送給模型的對話內容"""
+
+    def __init__(self, token_budget: int = 4096, strategy: str = "summary", summary_ratio: float = 0.25):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"不支援的記憶策略：{strategy}（支援 {', '.join(STRATEGIES)}）")
+        self.token_budget = token_budget
+        self.strategy = strategy
+        # 摘要最多佔用的預算比例
+        self.summary_limit = int(token_budget * summary_ratio)
+        self._lock = threading.Lock()
+        # 清除對話後，進行中的摘要結果以此判斷是否已過期
+        self._generation = 0
+        self._reset_state()
+
+    def _reset_state(self):
+        self._synced = 0               # 已計入視窗的歷史訊息數
+        self._start = 0                # 視窗起點在歷史中的位置
+        self._window_tokens = 0
+        self._pending: list = []       # 已移出視窗、尚未摘要的紀錄
+        self._summarizing = False
+        self.summary = ""
+        self.summary_tokens = 0
+        self.last_prompt_tokens = 0
+        self.turn_tokens = deque(maxlen=1000)
+
+    def reset(self):
+        """清除視窗、摘要與統計（對話歷史被清除時呼叫）"""
+        with self._lock:
+            self._generation += 1
+            self._reset_state()
+
+    def _sync(self, history):
+        """只計入新加入歷史的訊息（token 數在加入歷史時已算好），每輪的工作量與歷史長度無關"""
+        if len(history) < self._synced:
+            # 歷史被外部清除或截斷：重新開始
+            self._generation += 1
+            self._reset_state()
+        for index in range(self._synced, len(history)):
+            self._window_tokens += history[index].tokens
+        self._synced = len(history)
+
+    def _evict(self, history, available: int) -> list:
+        """把超出預算的最舊訊息移出視窗，回傳被移出的紀錄"""
+        evicted = []
+        while self._window_tokens > available and self._start < len(history):
+            evicted.append(history[self._start])
+            self._window_tokens -= history[self._start].tokens
+            self._start += 1
+        # 視窗不以助理回覆開頭，避免模型看到沒有問題的回答
+        while self._start < len(history) and history[self._start].role == "assistant":
+            evicted.append(history[self._start])
+            self._window_tokens -= history[self._start].tokens
+            self._start += 1
+        return evicted
+
+    def build_messages(self, system_message: str, history, user_input: str,
+                       summarizer=None) -> Tuple[list, int]:
+        """組出本輪要送出的訊息，回傳 (訊息列表, 估計的提示 token 數)
+
+        history：ChatHistory（紀錄已帶有建好的訊息物件與 token 數）
+        summarizer：用來產生摘要的模型（summary 策略才會使用）
+        """
+        fixed = count_tokens(system_message) + count_tokens(user_input)
+        with self._lock:
+            self._sync(history)
+            if self.strategy != "full":
+                evicted = self._evict(history, self.token_budget - fixed - self.summary_tokens)
+                if evicted and self.strategy == "summary" and summarizer is not None:
+                    self._pending.extend(evicted)
+                    self._schedule_summary(summarizer)
+
+            messages = [SystemMessage(content=system_message)]
+            if self.summary:
+                messages.append(SystemMessage(content=f"先前對話的摘要：{self.summary}"))
+            messages.extend(history.messages(self._start))
+            messages.append(HumanMessage(content=user_input))
+
+            prompt_tokens = fixed + self.summary_tokens + self._window_tokens
+            self.last_prompt_tokens = prompt_tokens
+            self.turn_tokens.append(prompt_tokens)
+            return messages, prompt_tokens
+
+    # ---------- 背景摘要 ----------
+
+    def _schedule_summary(self, summarizer):
+        """已持有 self._lock；同一時間每個對話只有一個摘要工作"""
+        if self._summarizing or not self._pending:
+            return
+        self._summarizing = True
+        pending, self._pending = self._pending, []
+        _summary_executor.submit(self._summarize, summarizer, self.summary, pending, self._generation)
+
+    def _summarize(self, summarizer, previous: str, pending: list, generation: int):
+        dialogue = "\n".join(
+            f"{'使用者' if record.role == 'user' else '助理'}：{record.content}" for record in pending
+        )
+        prompt = SUMMARY_PROMPT.format(
+            limit=self.summary_limit,
+            previous=f"先前的摘要：\n{previous}\n\n" if previous else "",
+            dialogue=dialogue,
+        )
+        try:
+            # 摘要也是模型請求，與互動請求共用准入名額
+            response = admitted(summarizer).invoke(prompt)
+            summary = (response.content if hasattr(response, "content") else str(response)).strip()
+        except Exception as e:
+            print(f"⚠️ 對話摘要失敗：{e}")
+            summary = None
+
+        with self._lock:
+            if generation != self._generation:
+                # 摘要期間對話已被清除
+                return
+            self._summarizing = False
+            if summary is None:
+                # 失敗時保留待摘要的訊息，下次再試
+                self._pending = pending + self._pending
+                return
+            # 模型沒有遵守長度限制時，以同一個 token 估計保留後半段（較新的內容）
+            summary = keep_tail(summary, self.summary_limit)
+            self.summary, self.summary_tokens = summary, count_tokens(summary)
+            self._schedule_summary(summarizer)
+
+    # ---------- 統計 ----------
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "strategy": self.strategy,
+                "token_budget": self.token_budget,
+                "window_messages": self._synced - self._start,
+                "evicted_messages": self._start,
+                "summary_tokens": self.summary_tokens,
+                "summarizing": self._summarizing,
+                "last_prompt_tokens": self.last_prompt_tokens,
+                "max_prompt_tokens": max(self.turn_tokens, default=0),
+            }
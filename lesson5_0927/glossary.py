@@ -0,0 +1,198 @@
+"""
+專業領域術語表
+每個領域一個 CSV 檔（glossaries/<領域>.csv，可用 GLOSSARY_DIR 指定目錄），第一欄是原文術語，
+其餘欄位是各目標語言的譯名。術語表在第一次使用時建成 Aho-Corasick 自動機，
+之後每次翻譯只需掃描原文一次（與術語數量無關）就能找出出現的術語，只把這些術語放進提示
+"""
+
+import csv
+import os
+import threading
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "glossaries")
+# 放進提示的術語數上限，避免提示過長
+MAX_PROMPT_TERMS = 50
+
+
+def _fold(ch: str) -> str:
+    """比對時不分大小寫（只在轉換後仍是單一字元時轉換，讓位置保持一致）"""
+    lower = ch.lower()
+    return lower if len(lower) == 1 else ch
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isascii() and (ch.isalnum() or ch == "_")
+
+
+class GlossaryEntry(NamedTuple):
+    term: str
+    translations: Dict[str, str]
+
+
+class GlossaryIndex:
+    """以 Aho-Corasick 自動機索引的術語表"""
+
+    def __init__(self, entries: List[GlossaryEntry]):
+        self.entries: List[GlossaryEntry] = []
+        self._lengths: List[int] = []
+        # 每個狀態的轉移、失敗連結、在此結束的術語與下一個有輸出的狀態
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[int] = [-1]
+        self._next_output: List[int] = [-1]
+        for entry in entries:
+            self._add(entry)
+        self._build_links()
+
+    def _add(self, entry: GlossaryEntry):
+        term = entry.term.strip()
+        if not term:
+            return
+        state = 0
+        for ch in term:
+            ch = _fold(ch)
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(-1)
+                self._next_output.append(-1)
+            state = nxt
+        entry = entry._replace(term=term)
+        if self._output[state] >= 0:
+            # 重複的術語：後面的譯名覆蓋前面的
+            self.entries[self._output[state]] = entry
+        else:
+            self._output[state] = len(self.entries)
+            self.entries.append(entry)
+            self._lengths.append(len(term))
+
+    def _build_links(self):
+        """以廣度優先計算失敗連結與輸出連結"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                link = self._fail[nxt]
+                self._next_output[nxt] = link if self._output[link] >= 0 else self._next_output[link]
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def find(self, text: str) -> List[Tuple[int, int, GlossaryEntry]]:
+        """找出原文中出現的術語，回傳不重疊的 (開始位置, 結束位置, 術語)，重疊時取最左、最長者
+
+        英數字開頭或結尾的術語必須是完整的單字（"cat" 不會比對到 "category"）
+        """
+        goto, fail, output, next_output, lengths = (self._goto, self._fail, self._output,
+                                                    self._next_output, self._lengths)
+        best: Dict[int, Tuple[int, int]] = {}
+        state = 0
+        for end, ch in enumerate(text, 1):
+            ch = _fold(ch)
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            hit = state if output[state] >= 0 else next_output[state]
+            while hit > 0:
+                index = output[hit]
+                start = end - lengths[index]
+                if self._on_word_boundary(text, start, end) and end > best.get(start, (0, -1))[0]:
+                    best[start] = (end, index)
+                hit = next_output[hit]
+
+        matches = []
+        covered = 0
+        for start in sorted(best):
+            end, index = best[start]
+            if start >= covered:
+                matches.append((start, end, self.entries[index]))
+                covered = end
+        return matches
+
+    @staticmethod
+    def _on_word_boundary(text: str, start: int, end: int) -> bool:
+        if _is_word_char(text[start]) and start > 0 and _is_word_char(text[start - 1]):
+            return False
+        if _is_word_char(text[end - 1]) and end < len(text) and _is_word_char(text[end]):
+            return False
+        return True
+
+    def lookup(self, text: str, target_language: str, limit: int = MAX_PROMPT_TERMS) -> List[Tuple[str, str]]:
+        """原文中出現、且有目標語言譯名的術語，回傳 [(原文術語, 譯名)]（依出現順序，不重複）"""
+        pairs: List[Tuple[str, str]] = []
+        seen = set()
+        for _, _, entry in self.find(text):
+            translation = entry.translations.get(target_language)
+            if not translation or entry.term in seen:
+                continue
+            seen.add(entry.term)
+            pairs.append((entry.term, translation))
+            if len(pairs) >= limit:
+                break
+        return pairs
+
+
+def load_entries(path: str) -> List[GlossaryEntry]:
+    """讀取術語表 CSV：第一欄為原文術語，其餘欄位名稱為目標語言"""
+    entries = []
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if not header:
+            return entries
+        languages = [name.strip() for name in header[1:]]
+        for row in reader:
+            if not row or not row[0].strip() or row[0].startswith("#"):
+                continue
+            translations = {language: value.strip() for language, value in zip(languages, row[1:]) if value.strip()}
+            entries.append(GlossaryEntry(row[0].strip(), translations))
+    return entries
+
+
+_indexes: Dict[str, Optional[GlossaryIndex]] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_glossary(domain: str, directory: Optional[str] = None) -> Optional[GlossaryIndex]:
+    """取得領域的術語表索引（每個領域只載入與建立一次），沒有術語表時回傳 None"""
+    directory = directory or os.getenv("GLOSSARY_DIR") or DEFAULT_DIR
+    key = os.path.join(directory, domain)
+    if key in _indexes:
+        return _indexes[key]
+    with _indexes_lock:
+        if key not in _indexes:
+            path = os.path.join(directory, f"{domain}.csv")
+            _indexes[key] = GlossaryIndex(load_entries(path)) if os.path.exists(path) else None
+            if _indexes[key] is not None:
+                print(f"📚 已載入「{domain}」術語表：{len(_indexes[key])} 個術語")
+        return _indexes[key]
+
+
+def preload_glossaries(directory: Optional[str] = None) -> threading.Thread:
+    """在背景執行緒預先建立目錄中所有領域的索引，第一個請求不必等待建立"""
+    directory = directory or os.getenv("GLOSSARY_DIR") or DEFAULT_DIR
+    domains = [name[:-len(".csv")] for name in sorted(os.listdir(directory)) if name.endswith(".csv")] \
+        if os.path.isdir(directory) else []
+    thread = threading.Thread(target=lambda: [get_glossary(domain, directory) for domain in domains],
+                              name="glossary-preload", daemon=True)
+    thread.start()
+    return thread
+
+
+def format_glossary(pairs: List[Tuple[str, str]]) -> str:
+    """轉為放進提示的術語對照；沒有術語時回傳空字串"""
+    if not pairs:
+        return ""
+    lines = "\n".join(f"- {term} → {translation}" for term, translation in pairs)
+    return f"\n請一律使用以下術語譯名：\n{lines}\n"
@@ -1,10 +1,21 @@
 import gradio as gr
-from langchain_ollama import OllamaLLM
 from langchain.prompts import ChatPromptTemplate
+import os
+import sys
 import time
 
-# 初始化模型
-model = OllamaLLM(model="gpt-oss:20b")
+# 讓這個目錄下的腳本可以使用專案根目錄的共用模組
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from admission import Overloaded, admission_for
+from glossary import format_glossary, get_glossary, preload_glossaries
+from metrics import lang_pair, start_metrics_server, track_request
+from ollama_pool import get_ollama_llm
+from translation_output import FORMAT_INSTRUCTIONS, TranslationStreamParser
+
+# 初始化模型（連線由共用連線池管理）
+MODEL_NAME = "gpt-oss:20b"
+model = get_ollama_llm(MODEL_NAME)
 
 # 建立多變數的翻譯模板
 complex_template = """
@@ -13,47 +24,78 @@ complex_template = """
 1. 保持原文的語氣和風格
 2. 使用專業術語
 3. 符合{target_language}的語言習慣
+{glossary}
+{format_instructions}
 
 {source_language}文本：{text}
 {target_language}翻譯：
 """
 
-chat_prompt_template = ChatPromptTemplate.from_template(complex_template)
+chat_prompt_template = ChatPromptTemplate.from_template(complex_template).partial(
+    format_instructions=FORMAT_INSTRUCTIONS
+)
 
-def translate_text(source_text, source_language, target_language, domain):
+def stream_translate(source_text, source_language, target_language, domain):
     """
-    翻譯文本的主要函數
+    串流翻譯，逐步產生目前已擷取出的譯文（最後一次為完整譯文）
     """
     if not source_text.strip():
-        return "請輸入要翻譯的文本。"
+        yield "請輸入要翻譯的文本。"
+        return
     
-    try:
-        # 格式化提示詞
-        formatted_prompt = chat_prompt_template.format(
-            target_language=target_language,
-            source_language=source_language,
-            domain=domain,
-            text=source_text
-        )
-        
-        # 調用模型進行翻譯
-        response = model.invoke(formatted_prompt)
-        
-        # 清理回應文本，移除模板中的提示部分
-        if target_language in response:
-            # 提取翻譯結果
-            lines = response.split('\n')
-            for i, line in enumerate(lines):
-                if target_language in line and "翻譯" in line:
-                    # 返回翻譯結果部分
-                    if i + 1 < len(lines):
-                        return '\n'.join(lines[i+1:]).strip()
-                    break
-        
-        return response.strip()
-        
-    except Exception as e:
-        return f"翻譯過程中發生錯誤：{str(e)}"
+    with track_request("gradio_translator", MODEL_NAME, lang_pair(source_language, target_language)) as tracker:
+        try:
+            # 只把原文中出現的領域術語放進提示
+            with tracker.span("glossary"):
+                glossary = get_glossary(domain)
+                terms = glossary.lookup(source_text, target_language) if glossary else []
+            
+            # 格式化提示詞
+            with tracker.span("template_format"):
+                formatted_prompt = chat_prompt_template.format(
+                    target_language=target_language,
+                    source_language=source_language,
+                    domain=domain,
+                    glossary=format_glossary(terms),
+                    text=source_text
+                )
+            
+            # 調用模型進行翻譯，邊接收邊擷取 <translation> 標記內的譯文
+            parser = TranslationStreamParser(answer_marker=f"{target_language}翻譯：")
+            with tracker.span("model_call"), admission_for(model).admit():
+                stream = model.stream(formatted_prompt)
+                try:
+                    for chunk in stream:
+                        tracker.first_token()
+                        if parser.feed(chunk):
+                            yield parser.text
+                        if parser.done:
+                            # 譯文已完整，關閉串流讓模型停止生成後面的說明文字
+                            break
+                finally:
+                    stream.close()
+            
+            # 模型沒有遵守輸出格式時，改從完整輸出中擷取
+            with tracker.span("postprocess"):
+                translated = parser.finish()
+                tracker.estimate_usage(formatted_prompt, parser.raw_text)
+            yield translated
+            
+        except Overloaded as e:
+            tracker.reject(e)
+            yield str(e)
+        except Exception as e:
+            tracker.fail(e)
+            yield f"翻譯過程中發生錯誤：{str(e)}"
+
+def translate_text(source_text, source_language, target_language, domain):
+    """
+    翻譯文本的主要函數，回傳完整譯文
+    """
+    translated = ""
+    for translated in stream_translate(source_text, source_language, target_language, domain):
+        pass
+    return translated
 
 def create_interface():
     """
@@ -205,7 +247,10 @@ def create_interface():
             status_msg = update_status("正在翻譯中，請稍候...")
             yield status_msg, ""
             
-            result = translate_text(*args)
+            # 譯文隨著模型輸出逐步顯示
+            result = ""
+            for result in stream_translate(*args):
+                yield status_msg, result
             final_status = "✅ 翻譯完成！"
             
             yield final_status, result
@@ -240,18 +285,25 @@ def create_interface():
 if __name__ == "__main__":
     # 創建並啟動介面
     interface = create_interface()
+    start_metrics_server()
+    preload_glossaries()
     
     print("🚀 正在啟動 AI 翻譯助手...")
     print("📱 介面將在瀏覽器中自動開啟")
     print("🔗 本地訪問地址：http://127.0.0.1:7860")
     print("🌐 公開訪問地址將在啟動後顯示")
     
+    # 啟用隊列處理（新版 Gradio 以 queue() 取代 launch 的 enable_queue）：
+    # 限制同時處理的請求數與排隊長度，模型呼叫另外由 admission.py 控制
+    interface.queue(
+        default_concurrency_limit=int(os.getenv("TRANSLATOR_CONCURRENCY", "16")),
+        max_size=int(os.getenv("TRANSLATOR_QUEUE_SIZE", "64"))
+    )
+    
     interface.launch(
         server_name="0.0.0.0",  # 允許外部訪問
         server_port=7860,       # 端口號
         share=True,             # 創建公開連結
-        show_error=True,        # 顯示錯誤信息
-        show_tips=True,         # 顯示使用提示
-        enable_queue=True       # 啟用隊列處理
+        show_error=True         # 顯示錯誤信息
     )
 
@@ -1,14 +1,19 @@
-from langchain_ollama import ChatOllama
 import gradio as gr
 from dotenv import load_dotenv
 import os
+import sys
+
+# 讓這個目錄下的腳本可以使用專案根目錄的共用模組
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ollama_pool import get_ollama_chat
 
 # 載入環境變數（可用 OLLAMA_URL / OLLAMA_MODEL 覆蓋預設）
 load_dotenv()
 
 
-# 使用最原始的呼叫方式：直接以字串 prompt 送到 Ollama
-model = ChatOllama(model="gemma3:270m", base_url="http://localhost:11434")
+# 使用最原始的呼叫方式：直接以字串 prompt 送到 Ollama（連線由共用連線池管理）
+model = get_ollama_chat(os.getenv("OLLAMA_MODEL", "gemma3:270m"))
 
 
 def answer(prompt: str) -> str:
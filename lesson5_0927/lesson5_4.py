@@ -6,42 +6,71 @@ LangChain Chat Models Gradio 應用程式
 
 import gradio as gr
 import os
+import sys
 import json
 import socket
-from datetime import datetime
-from typing import List, Dict, Any, Optional
+import threading
+from contextlib import closing
+from typing import List, Dict, Any, Iterator, Optional
 from dotenv import load_dotenv
 
+# 讓這個目錄下的腳本可以使用專案根目錄的共用模組
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 # LangChain imports
-from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
-from langchain_ollama import ChatOllama
 from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
 from langchain_google_genai import ChatGoogleGenerativeAI
 
+from admission import Overloaded, admission_for, format_admission_stats
+from metrics import start_metrics_server, track_request
+from ollama_pool import format_pool_stats, get_ollama_chat, get_pool
+from chat_export import FORMATS as EXPORT_FORMATS, export_history, import_jsonl
+from chat_history import ChatHistory
+from chat_memory import ConversationMemory
+from model_health import HealthChecker, default_probes
+from session_store import SessionStore
+
 # 載入環境變數
 load_dotenv()
 
+ENTRY_POINT = "lesson5_4"
+
 class ChatModelsManager:
     """管理多種 Chat Models 的類別"""
     
-    def __init__(self):
+    def __init__(self, models: Optional[Dict[str, Any]] = None, health: Optional[HealthChecker] = None):
+        # models：與其他使用者共用的模型（每個工作階段不必重新建立 client）
+        # health：後端健康檢查，不健康的模型不會出現在可用模型中
+        self.health = health
         self.models = {}
         self.current_model = None
-        self.conversation_history = []
+        self.conversation_history = ChatHistory()
         self.system_message = "你是一個友善且樂於助人的 AI 助手，請用繁體中文回答問題。"
         
+        # 對話記憶：每輪只送出 token 預算內的內容（CHAT_MEMORY_STRATEGY 可設為 full / window / summary）
+        self.memory = ConversationMemory(
+            token_budget=int(os.getenv("CHAT_TOKEN_BUDGET", "4096")),
+            strategy=os.getenv("CHAT_MEMORY_STRATEGY", "summary"),
+        )
+        
         # 初始化所有可用的模型
-        self._initialize_models()
+        if models is None:
+            self._initialize_models()
+        else:
+            self.models = models
+            self.current_model = next(iter(self.get_available_models()), None)
+    
+    def _assign(self, model_name: str, backend: str, remote_name: Optional[str] = None):
+        if self.health is not None:
+            self.health.assign(model_name, backend, remote_name)
     
     def _initialize_models(self):
         """初始化所有可用的模型"""
         try:
-            # Ollama 模型
-            self.models["Ollama (llama3.2)"] = ChatOllama(
-                model="llama3.2:latest", 
-                base_url="http://localhost:11434"
-            )
+            # Ollama 模型（使用共用連線池）
+            self.models["Ollama (llama3.2)"] = get_ollama_chat("llama3.2:latest")
+            self._assign("Ollama (llama3.2)", "ollama", "llama3.2:latest")
         except Exception as e:
             print(f"無法初始化 Ollama 模型: {e}")
         
@@ -51,6 +80,7 @@ class ChatModelsManager:
                 self.models["Gemini (gemini-2.5-flash)"] = ChatGoogleGenerativeAI(
                     model="gemini-2.5-flash"
                 )
+                self._assign("Gemini (gemini-2.5-flash)", "gemini")
         except Exception as e:
             print(f"無法初始化 Gemini 模型: {e}")
         
@@ -60,6 +90,7 @@ class ChatModelsManager:
                 self.models["OpenAI (gpt-4o-mini)"] = ChatOpenAI(
                     model="gpt-4o-mini"
                 )
+                self._assign("OpenAI (gpt-4o-mini)", "openai")
         except Exception as e:
             print(f"無法初始化 OpenAI 模型: {e}")
         
@@ -69,6 +100,7 @@ class ChatModelsManager:
                 self.models["Anthropic (claude-3-5-sonnet)"] = ChatAnthropic(
                     model="claude-3-5-sonnet-latest"
                 )
+                self._assign("Anthropic (claude-3-5-sonnet)", "anthropic")
         except Exception as e:
             print(f"無法初始化 Anthropic 模型: {e}")
         
@@ -76,9 +108,26 @@ class ChatModelsManager:
         if self.models:
             self.current_model = list(self.models.keys())[0]
     
+    def register_catalog(self, backend: str, catalog: List[str]):
+        """註冊健康檢查回報的 Ollama 本機模型（已註冊的不重複建立）"""
+        if backend != "ollama":
+            return
+        for remote_name in catalog:
+            short_name = remote_name[:-len(":latest")] if remote_name.endswith(":latest") else remote_name
+            model_name = f"Ollama ({short_name})"
+            if model_name not in self.models:
+                self.models[model_name] = get_ollama_chat(remote_name)
+                self._assign(model_name, "ollama", remote_name)
+                print(f"🔎 發現 Ollama 模型：{remote_name}")
+        if self.current_model is None and self.models:
+            self.current_model = next(iter(self.models))
+    
+    def is_available(self, model_name: str) -> bool:
+        return model_name in self.models and (self.health is None or self.health.is_available(model_name))
+    
     def get_available_models(self) -> List[str]:
-        """取得可用的模型列表"""
-        return list(self.models.keys())
+        """取得可用的模型列表（排除健康檢查失敗的後端）"""
+        return [name for name in list(self.models) if self.is_available(name)]
     
     def set_model(self, model_name: str) -> str:
         """切換模型"""
@@ -94,20 +143,33 @@ class ChatModelsManager:
     
     def clear_conversation(self):
         """清除對話歷史"""
-        self.conversation_history = []
+        self.conversation_history.clear()
+        self.memory.reset()
         return "✅ 對話歷史已清除"
     
-    def get_conversation_history(self) -> List[Dict[str, Any]]:
+    def get_conversation_history(self) -> ChatHistory:
         """取得對話歷史"""
         return self.conversation_history
     
+    def export_state(self) -> Dict[str, Any]:
+        """匯出這個使用者的狀態（不含模型）"""
+        return {
+            "current_model": self.current_model,
+            "system_message": self.system_message,
+            "conversation_history": self.conversation_history.to_dicts(),
+        }
+    
+    def restore_state(self, state: Dict[str, Any]):
+        """還原 export_state() 匯出的狀態"""
+        if state.get("current_model") in self.models:
+            self.current_model = state["current_model"]
+        self.system_message = state.get("system_message", self.system_message)
+        self.conversation_history = ChatHistory(state.get("conversation_history"))
+        self.memory.reset()
+    
     def add_message(self, role: str, content: str):
-        """添加訊息到對話歷史"""
-        self.conversation_history.append({
-            "role": role,
-            "content": content,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        })
+        """添加訊息到對話歷史（訊息物件在這裡建立一次，之後每輪直接重複使用）"""
+        self.conversation_history.append(role, content)
     
     def chat(self, user_input: str, model_name: str = None) -> str:
         """進行對話"""
@@ -119,92 +181,244 @@ class ChatModelsManager:
         
         if not selected_model or selected_model not in self.models:
             return "❌ 沒有可用的模型，請檢查模型設定"
-        
-        try:
-            # 建立訊息列表
-            messages = [SystemMessage(content=self.system_message)]
-            
-            # 添加對話歷史
-            for msg in self.conversation_history:
-                if msg["role"] == "user":
-                    messages.append(HumanMessage(content=msg["content"]))
-                elif msg["role"] == "assistant":
-                    messages.append(AIMessage(content=msg["content"]))
+        with track_request(ENTRY_POINT, selected_model) as tracker:
+            if not self.is_available(selected_model):
+                tracker.fail("ModelUnavailable")
+                return f"❌ 模型 {selected_model} 目前無法連線，請切換其他模型"
             
-            # 添加當前用戶輸入
-            messages.append(HumanMessage(content=user_input))
+            try:
+                model = self.models[selected_model]
+                
+                # 建立訊息列表：系統訊息 + 摘要 + 預算內的對話歷史 + 當前用戶輸入
+                with tracker.span("template_format"):
+                    messages, prompt_tokens = self.memory.build_messages(
+                        self.system_message, self.conversation_history, user_input, summarizer=model
+                    )
+                self._report_prompt(prompt_tokens, messages)
+                
+                # 呼叫模型
+                with tracker.span("model_call"), admission_for(model).admit():
+                    response = model.invoke(messages)
+                
+                with tracker.span("postprocess"):
+                    # 取得回應內容
+                    if hasattr(response, 'content'):
+                        ai_response = response.content
+                    else:
+                        ai_response = str(response)
+                    if not tracker.record_usage(response):
+                        tracker.estimate_usage(messages, ai_response)
+                    
+                    # 保存對話
+                    self.add_message("user", user_input)
+                    self.add_message("assistant", ai_response)
+                
+                return ai_response
+                
+            except Overloaded as e:
+                tracker.reject(e)
+                print(e)
+                return str(e)
+            except Exception as e:
+                tracker.fail(e)
+                error_msg = f"❌ 發生錯誤: {str(e)}"
+                print(error_msg)
+                return error_msg
+    
+    def _report_prompt(self, prompt_tokens: int, messages: list):
+        """設定 CHAT_DEBUG_PROMPT=1 時輸出本輪提示大小（平時只記錄在 memory.stats()，顯示於模型資訊）"""
+        if os.getenv("CHAT_DEBUG_PROMPT", "0") != "0":
+            print(f"🧮 本輪提示約 {prompt_tokens} tokens（{len(messages)} 則訊息）")
+
+    def stream_chat(self, user_input: str, model_name: str = None,
+                    stop_event: Optional[threading.Event] = None) -> Iterator[str]:
+        """串流對話，逐步產生目前的回應
+        
+        stop_event 被設定（或呼叫端關閉這個產生器）時會中止生成並關閉與後端的連線，
+        只把已經產生的部分存入對話歷史
+        """
+        if not user_input.strip():
+            yield "請輸入您的問題..."
+            return
+        
+        selected_model = model_name if model_name and model_name in self.models else self.current_model
+        if not selected_model or selected_model not in self.models:
+            yield "❌ 沒有可用的模型，請檢查模型設定"
+            return
+        with track_request(ENTRY_POINT, selected_model) as tracker:
+            if not self.is_available(selected_model):
+                tracker.fail("ModelUnavailable")
+                yield f"❌ 模型 {selected_model} 目前無法連線，請切換其他模型"
+                return
             
-            # 呼叫模型
             model = self.models[selected_model]
-            response = model.invoke(messages)
-            
-            # 取得回應內容
-            if hasattr(response, 'content'):
-                ai_response = response.content
-            else:
-                ai_response = str(response)
-            
-            # 保存對話
-            self.add_message("user", user_input)
-            self.add_message("assistant", ai_response)
-            
-            return ai_response
+            with tracker.span("template_format"):
+                messages, prompt_tokens = self.memory.build_messages(
+                    self.system_message, self.conversation_history, user_input, summarizer=model
+                )
+            self._report_prompt(prompt_tokens, messages)
             
-        except Exception as e:
-            error_msg = f"❌ 發生錯誤: {str(e)}"
-            print(error_msg)
-            return error_msg
+            ai_response = ""
+            failed = False
+            stream = model.stream(messages)
+            try:
+                with tracker.span("model_call"), admission_for(model).admit():
+                    try:
+                        for chunk in stream:
+                            tracker.record_usage(chunk)
+                            ai_response += chunk.content if hasattr(chunk, 'content') else str(chunk)
+                            if ai_response:
+                                tracker.first_token()
+                            yield ai_response
+                            if stop_event is not None and stop_event.is_set():
+                                print("⏹️ 已停止生成")
+                                tracker.status = "cancelled"
+                                break
+                    finally:
+                        # 關閉串流會一併關閉 HTTP 回應，後端隨即停止生成並釋放連線（之後才釋放名額）
+                        stream.close()
+            except Overloaded as e:
+                failed = True
+                tracker.reject(e)
+                print(e)
+                yield str(e)
+            except Exception as e:
+                failed = True
+                tracker.fail(e)
+                error_msg = f"❌ 發生錯誤: {str(e)}"
+                print(error_msg)
+                yield error_msg
+            finally:
+                if not failed and ai_response:
+                    with tracker.span("postprocess"):
+                        tracker.estimate_usage(messages, ai_response)
+                        self.add_message("user", user_input)
+                        self.add_message("assistant", ai_response)
+
+# 後端健康檢查（main() 啟動時先探測一次，之後每 CHAT_HEALTH_INTERVAL 秒在背景探測）
+health = HealthChecker(
+    default_probes(),
+    interval=float(os.getenv("CHAT_HEALTH_INTERVAL", "30")),
+    timeout=float(os.getenv("CHAT_HEALTH_TIMEOUT", "3")),
+)
+
+# 建立全域的 ChatModelsManager 實例（負責建立共用的模型，也是沒有工作階段時的預設狀態）
+chat_manager = ChatModelsManager(health=health)
+health.on_catalog(chat_manager.register_catalog)
+
+def _new_session():
+    return ChatModelsManager(models=chat_manager.models, health=health)
+
+def _load_session(state: Dict[str, Any]):
+    manager = _new_session()
+    manager.restore_state(state)
+    return manager
+
+# 每個瀏覽器工作階段各自的對話狀態（CHAT_SESSION_DIR 設定時，被移出記憶體的工作階段會寫到磁碟）
+sessions = SessionStore(
+    factory=_new_session,
+    max_sessions=int(os.getenv("CHAT_MAX_SESSIONS", "1000")),
+    ttl=float(os.getenv("CHAT_SESSION_TTL", "3600")),
+    spill_dir=os.getenv("CHAT_SESSION_DIR") or None,
+    dump=lambda manager: manager.export_state(),
+    load=_load_session,
+)
+
+def _session_id(request: Optional[gr.Request]) -> str:
+    """Gradio 的 session hash；沒有請求資訊時使用共用的預設工作階段"""
+    return getattr(request, "session_hash", None) or "default"
 
-# 建立全域的 ChatModelsManager 實例
-chat_manager = ChatModelsManager()
+# 進行中的串流回應：{session id: 停止事件}，按下停止時不需要等待工作階段的鎖
+_stop_events: Dict[str, threading.Event] = {}
+_stop_lock = threading.Lock()
 
-def chat_function(message: str, history: List[Dict[str, str]], model_name: str) -> tuple:
-    """Gradio 聊天函數"""
+def chat_function(message: str, history: List[Dict[str, str]], model_name: str,
+                  request: gr.Request = None):
+    """Gradio 聊天函數（串流更新最後一則助理訊息）"""
     if not message.strip():
-        return history, ""
+        yield history, ""
+        return
     
-    # 進行對話
-    response = chat_manager.chat(message, model_name)
+    session_id = _session_id(request)
+    stop_event = threading.Event()
+    with _stop_lock:
+        _stop_events[session_id] = stop_event
     
     # 更新 Gradio 歷史 (使用 messages 格式)
-    history.append({"role": "user", "content": message})
-    history.append({"role": "assistant", "content": response})
+    history = history + [{"role": "user", "content": message}, {"role": "assistant", "content": ""}]
+    try:
+        # 進行對話（只鎖定這個使用者的工作階段）
+        # 按下停止時 Gradio 會取消這個事件並關閉產生器；closing 確保 stream_chat 在釋放工作階段鎖之前
+        # 關閉後端串流並存入已產生的部分
+        with sessions.session(session_id) as manager, \
+                closing(manager.stream_chat(message, model_name, stop_event)) as stream:
+            for partial in stream:
+                history[-1] = {"role": "assistant", "content": partial}
+                yield history, ""
+    finally:
+        with _stop_lock:
+            if _stop_events.get(session_id) is stop_event:
+                del _stop_events[session_id]
     
-    return history, ""
+    if stop_event.is_set():
+        history[-1] = {"role": "assistant", "content": history[-1]["content"] + "\n\n⏹️ 已停止生成"}
+        yield history, ""
 
-def clear_chat():
+def stop_chat(request: gr.Request = None):
+    """停止目前這個使用者正在生成的回應（事件本身由 cancels 取消，這裡通知 stream_chat 不再讀取後續輸出）"""
+    with _stop_lock:
+        stop_event = _stop_events.get(_session_id(request))
+    if stop_event is not None:
+        stop_event.set()
+
+def clear_chat(request: gr.Request = None):
     """清除聊天"""
-    chat_manager.clear_conversation()
+    with sessions.session(_session_id(request)) as manager:
+        manager.clear_conversation()
     return [], ""
 
-def update_system_message(system_msg: str):
+def update_system_message(system_msg: str, request: gr.Request = None):
     """更新系統訊息"""
-    chat_manager.set_system_message(system_msg)
-    return "✅ 系統訊息已更新"
+    with sessions.session(_session_id(request)) as manager:
+        return manager.set_system_message(system_msg)
 
-def export_conversation():
-    """匯出對話歷史"""
-    history = chat_manager.get_conversation_history()
+def export_conversation(fmt: str = "markdown", start_turn: Optional[int] = None,
+                        end_turn: Optional[int] = None, request: gr.Request = None):
+    """匯出對話歷史到檔案，回傳 (檔案路徑, 狀態訊息)"""
+    with sessions.session(_session_id(request)) as manager:
+        # 紀錄不會再被修改，複製串列後就可以放開工作階段的鎖
+        history = list(manager.get_conversation_history())
+        meta = {"model": manager.current_model, "system_message": manager.system_message}
     if not history:
-        return "❌ 沒有對話歷史可匯出"
-    
-    # 建立匯出內容
-    export_content = f"# 對話歷史匯出\n"
-    export_content += f"匯出時間: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-    export_content += f"使用模型: {chat_manager.current_model}\n\n"
+        return None, "❌ 沒有對話歷史可匯出"
     
-    for i, msg in enumerate(history, 1):
-        role_emoji = "👤" if msg["role"] == "user" else "🤖"
-        export_content += f"## {i}. {role_emoji} {msg['role'].title()}\n"
-        export_content += f"**時間**: {msg['timestamp']}\n"
-        export_content += f"**內容**: {msg['content']}\n\n"
+    path, count = export_history(history, fmt, start_turn or None, end_turn or None, meta)
+    if not count:
+        os.remove(path)
+        return None, "❌ 指定的輪次範圍內沒有對話"
+    return path, f"✅ 已匯出 {count} 則訊息（{fmt}）"
+
+def import_conversation(path: Optional[str], request: gr.Request = None):
+    """匯入 JSONL 匯出檔以繼續先前的對話，回傳 (聊天介面歷史, 狀態訊息)"""
+    if not path:
+        return gr.update(), "❌ 請先選擇 JSONL 匯出檔"
+    try:
+        state = import_jsonl(path)
+    except (OSError, ValueError) as e:
+        return gr.update(), f"❌ 匯入失敗：{e}"
     
-    return export_content
+    with sessions.session(_session_id(request)) as manager:
+        manager.restore_state(state)
+        history = [{"role": record.role, "content": record.content}
+                   for record in manager.get_conversation_history()]
+    return history, f"✅ 已匯入 {len(history)} 則訊息"
 
-def get_model_info():
+def get_model_info(request: gr.Request = None):
     """取得模型資訊"""
-    available_models = chat_manager.get_available_models()
-    current_model = chat_manager.current_model
+    with sessions.session(_session_id(request)) as manager:
+        available_models = manager.get_available_models()
+        current_model = manager.current_model
+        memory = manager.memory.stats()
     
     info = f"## 📊 模型資訊\n\n"
     info += f"**當前模型**: {current_model}\n\n"
@@ -213,6 +427,24 @@ def get_model_info():
         status = "🟢" if model == current_model else "⚪"
         info += f"{i}. {status} {model}\n"
     
+    backends = health.snapshot()
+    if backends:
+        info += f"\n**後端健康狀態**:\n"
+        for backend, status in backends.items():
+            mark = "✅" if status["healthy"] else "❌"
+            models = f"，{status['models']} 個模型" if status["models"] else ""
+            error = f"（{status['error']}）" if status["error"] else ""
+            info += f"- {mark} {backend}：探測延遲 {status['latency'] * 1000:.0f} ms{models}{error}\n"
+    
+    info += f"\n**對話記憶**（{memory['strategy']}，預算 {memory['token_budget']} tokens）\n"
+    info += f"- 上一輪提示：{memory['last_prompt_tokens']} tokens（最高 {memory['max_prompt_tokens']}）\n"
+    info += f"- 視窗內訊息：{memory['window_messages']} 則，已移出 {memory['evicted_messages']} 則，摘要 {memory['summary_tokens']} tokens\n"
+    
+    active = sessions.stats()
+    info += f"\n**工作階段**：{active['active']} 個使用中（上限 {active['max_sessions']}）\n"
+    
+    info += f"\n{format_pool_stats(get_pool().stats())}\n"
+    info += f"\n**模型呼叫名額**:\n{format_admission_stats()}\n"
     return info
 
 # 建立 Gradio 介面
@@ -300,9 +532,10 @@ def create_gradio_interface():
         
         這是一個整合多種 AI 模型的對話介面，支援：
         - 🔄 **多模型切換**：Ollama、Gemini、OpenAI、Anthropic
-        - 🧠 **對話記憶**：保持完整的對話上下文
+        - ⚡ **串流回應**：回答逐字顯示，可隨時按「⏹️ 停止」中止生成
+        - 🧠 **對話記憶**：在 token 預算內保留最近的對話，較早的內容自動整理成摘要
         - ⚙️ **系統訊息設定**：自訂 AI 的行為
-        - 📤 **對話匯出**：保存對話記錄
+        - 📤 **對話匯出**：下載 Markdown / JSONL / MessagePack 檔案，JSONL 可再匯入繼續對話
         """)
         
         with gr.Row():
@@ -324,6 +557,7 @@ def create_gradio_interface():
                         scale=4
                     )
                     send_btn = gr.Button("📤 發送", variant="primary", scale=1)
+                    stop_btn = gr.Button("⏹️ 停止", variant="stop", scale=1)
                 
                 with gr.Row():
                     clear_btn = gr.Button("🗑️ 清除對話", variant="secondary")
@@ -353,42 +587,55 @@ def create_gradio_interface():
                 gr.Markdown("### 📊 模型資訊")
                 model_info_output = gr.Markdown(get_model_info())
                 
-                # 匯出結果
-                gr.Markdown("### 📤 匯出結果")
-                export_output = gr.Textbox(
-                    label="匯出的對話",
-                    lines=10,
-                    interactive=False
+                # 匯出 / 匯入
+                gr.Markdown("### 📤 匯出 / 📥 匯入")
+                export_format = gr.Radio(
+                    choices=list(EXPORT_FORMATS),
+                    value="markdown",
+                    label="匯出格式"
                 )
+                with gr.Row():
+                    start_turn_input = gr.Number(value=0, precision=0, minimum=0, label="從第幾輪（0 表示開頭）")
+                    end_turn_input = gr.Number(value=0, precision=0, minimum=0, label="到第幾輪（0 表示最後）")
+                export_output = gr.File(label="匯出的對話", interactive=False)
+                import_file = gr.File(label="匯入 JSONL 匯出檔", file_types=[".jsonl"], type="filepath")
+                import_btn = gr.Button("📥 匯入對話", variant="secondary")
+                transfer_status = gr.Markdown()
         
         # 事件處理
-        def update_model_info():
-            return get_model_info()
+        def update_model_info(request: gr.Request):
+            return get_model_info(request)
+        
+        def handle_model_change(model_name, request: gr.Request):
+            with sessions.session(_session_id(request)) as manager:
+                result = manager.set_model(model_name)
+            return result, update_model_info(request)
         
-        def handle_model_change(model_name):
-            result = chat_manager.set_model(model_name)
-            return result, update_model_info()
+        def handle_export(fmt, start_turn, end_turn, request: gr.Request):
+            return export_conversation(fmt, int(start_turn or 0), int(end_turn or 0), request)
         
-        def handle_export():
-            return export_conversation()
+        def handle_import(path, request: gr.Request):
+            return import_conversation(path, request)
         
-        def handle_system_update(system_msg):
-            result = chat_manager.set_system_message(system_msg)
-            return result
+        def handle_system_update(system_msg, request: gr.Request):
+            return update_system_message(system_msg, request)
         
         # 綁定事件
-        send_btn.click(
+        send_event = send_btn.click(
             chat_function,
             inputs=[msg_input, chatbot, model_dropdown],
             outputs=[chatbot, msg_input]
         )
         
-        msg_input.submit(
+        submit_event = msg_input.submit(
             chat_function,
             inputs=[msg_input, chatbot, model_dropdown],
             outputs=[chatbot, msg_input]
         )
         
+        # 取消進行中的生成事件：畫面立即停止更新，產生器被關閉時仍會存入已產生的部分回覆
+        stop_btn.click(stop_chat, cancels=[send_event, submit_event])
+        
         clear_btn.click(
             clear_chat,
             outputs=[chatbot, msg_input]
@@ -396,7 +643,14 @@ def create_gradio_interface():
         
         export_btn.click(
             handle_export,
-            outputs=[export_output]
+            inputs=[export_format, start_turn_input, end_turn_input],
+            outputs=[export_output, transfer_status]
+        )
+        
+        import_btn.click(
+            handle_import,
+            inputs=[import_file],
+            outputs=[chatbot, transfer_status]
         )
         
         model_dropdown.change(
@@ -410,6 +664,21 @@ def create_gradio_interface():
             inputs=[system_msg_input],
             outputs=[gr.Textbox(visible=False)]
         )
+        
+        # 開啟頁面時依最新的健康檢查結果更新模型清單
+        def refresh_models(request: gr.Request):
+            with sessions.session(_session_id(request)) as manager:
+                choices = manager.get_available_models()
+                current = manager.current_model if manager.current_model in choices else None
+            return gr.update(choices=choices, value=current), get_model_info(request)
+        
+        interface.load(refresh_models, outputs=[model_dropdown, model_info_output])
+        
+        # 使用者關閉頁面時釋放其工作階段
+        def release_session(request: gr.Request):
+            sessions.discard(_session_id(request))
+        
+        interface.unload(release_session)
     
     return interface
 
@@ -428,6 +697,12 @@ def main():
     """主函數"""
     print("🚀 啟動 LangChain Chat Models Gradio 應用程式...")
     
+    # 探測各後端並註冊 Ollama 本機已下載的模型，之後在背景定期檢查
+    health.start()
+    
+    # 本機 /metrics 指標服務（METRICS_PORT=0 可關閉）
+    start_metrics_server()
+    
     # 檢查可用模型
     available_models = chat_manager.get_available_models()
     if not available_models:
@@ -437,6 +712,9 @@ def main():
         print("   3. 網路連線是否正常")
         return
     
+    if chat_manager.current_model not in available_models:
+        chat_manager.current_model = available_models[0]
+    
     print(f"✅ 找到 {len(available_models)} 個可用模型:")
     for model in available_models:
         print(f"   - {model}")
@@ -452,6 +730,9 @@ def main():
     # 建立並啟動介面
     interface = create_gradio_interface()
     
+    # 不同使用者的對話可以同時處理（同一個使用者的請求仍依序執行）
+    interface.queue(default_concurrency_limit=int(os.getenv("CHAT_CONCURRENCY", "16")))
+    
     print("🌐 啟動 Web 介面...")
     try:
         interface.launch(
@@ -1,7 +1,14 @@
-from langchain_ollama import OllamaLLM
+import os
+import sys
+
 from langchain.prompts import ChatPromptTemplate
 
-model = OllamaLLM(model="geamm3:1b")
+# 讓這個目錄下的腳本可以使用專案根目錄的共用模組
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ollama_pool import get_ollama_llm
+
+model = get_ollama_llm("geamm3:1b")
 
 
 
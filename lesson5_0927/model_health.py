@@ -0,0 +1,169 @@
+"""
+模型後端健康檢查
+啟動時與之後每隔一段時間，以非同步請求同時探測各個後端（Ollama 的 /api/tags、雲端供應商的模型列表 API），
+記錄是否可用與探測延遲；Ollama 會回報本機已下載的模型，讓 ChatModelsManager 動態註冊。
+不健康的後端上的模型不會出現在可用模型中，請求也不必等到逾時才發現後端已失效
+"""
+
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+# probe(client) 成功時回傳該後端提供的模型名稱列表（沒有列表時回傳 None），失敗時拋出例外
+Probe = Callable[[httpx.AsyncClient], Awaitable[Optional[List[str]]]]
+
+
+def ollama_probe(base_url: str) -> Probe:
+    """列出 Ollama 本機已下載的模型"""
+    async def probe(client: httpx.AsyncClient):
+        response = await client.get(f"{base_url.rstrip('/')}/api/tags")
+        response.raise_for_status()
+        return [item["name"] for item in response.json().get("models", [])]
+    return probe
+
+
+def http_probe(url: str, headers: Optional[Dict[str, str]] = None, params: Optional[Dict[str, str]] = None) -> Probe:
+    """以 GET 請求檢查雲端 API 是否可用（通常是模型列表端點）"""
+    async def probe(client: httpx.AsyncClient):
+        response = await client.get(url, headers=headers, params=params)
+        response.raise_for_status()
+        return None
+    return probe
+
+
+def default_probes() -> Dict[str, Probe]:
+    """依環境變數建立各後端的探測函式（沒有 API 金鑰的供應商不探測）"""
+    probes = {"ollama": ollama_probe(os.getenv("OLLAMA_URL", "http://localhost:11434"))}
+    if os.getenv("GOOGLE_API_KEY"):
+        probes["gemini"] = http_probe("https://generativelanguage.googleapis.com/v1beta/models",
+                                      params={"key": os.getenv("GOOGLE_API_KEY"), "pageSize": "1"})
+    if os.getenv("OPENAI_API_KEY"):
+        base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+        probes["openai"] = http_probe(f"{base_url}/models",
+                                      headers={"Authorization": f"Bearer {os.getenv('OPENAI_API_KEY')}"})
+    if os.getenv("ANTHROPIC_API_KEY"):
+        probes["anthropic"] = http_probe("https://api.anthropic.com/v1/models",
+                                         headers={"x-api-key": os.getenv("ANTHROPIC_API_KEY"),
+                                                  "anthropic-version": "2023-06-01"},
+                                         params={"limit": "1"})
+    return probes
+
+
+class HealthChecker:
+    """定期探測後端，並判斷某個模型目前是否可用"""
+
+    def __init__(self, probes: Dict[str, Probe], interval: float = 30.0, timeout: float = 3.0):
+        self.probes = dict(probes)
+        self.interval = interval
+        self.timeout = timeout
+        self._status: Dict[str, Dict[str, Any]] = {}
+        # 模型名稱 -> (後端, 後端上的模型名稱)
+        self._assignments: Dict[str, tuple] = {}
+        self._listeners: List[Callable[[str, List[str]], None]] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------- 設定 ----------
+
+    def assign(self, model_name: str, backend: str, remote_name: Optional[str] = None):
+        """登記模型屬於哪個後端；remote_name 指定時，還要求該後端的模型列表中有這個模型"""
+        with self._lock:
+            self._assignments[model_name] = (backend, remote_name)
+
+    def on_catalog(self, listener: Callable[[str, List[str]], None]):
+        """後端回報模型列表時呼叫 listener(後端, 模型名稱列表)，用來動態註冊模型"""
+        self._listeners.append(listener)
+
+    # ---------- 探測 ----------
+
+    async def _probe_one(self, client: httpx.AsyncClient, backend: str, probe: Probe):
+        started = time.perf_counter()
+        try:
+            catalog = await asyncio.wait_for(probe(client), self.timeout)
+            error = None
+        except Exception as e:
+            catalog, error = None, str(e) or type(e).__name__
+        latency = time.perf_counter() - started
+
+        with self._lock:
+            previous = self._status.get(backend, {})
+            self._status[backend] = {
+                "healthy": error is None,
+                "latency": latency,
+                "checked_at": time.time(),
+                "error": error,
+                # 探測失敗時保留上次的模型列表，恢復後不必重新註冊
+                "catalog": catalog if catalog is not None else previous.get("catalog"),
+            }
+        if error is not None and previous.get("healthy", True):
+            print(f"⚠️ 後端 {backend} 無法使用：{error}")
+        elif error is None and previous.get("healthy") is False:
+            print(f"✅ 後端 {backend} 已恢復（{latency * 1000:.0f} ms）")
+        if catalog:
+            for listener in self._listeners:
+                try:
+                    listener(backend, catalog)
+                except Exception as e:
+                    print(f"⚠️ 註冊 {backend} 的模型失敗：{e}")
+
+    async def probe_all(self):
+        """同時探測所有後端"""
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+            await asyncio.gather(*(self._probe_one(client, backend, probe)
+                                   for backend, probe in self.probes.items()))
+
+    def check_now(self):
+        """同步執行一次探測（啟動時使用）"""
+        asyncio.run(self.probe_all())
+
+    def start(self):
+        """先探測一次，之後在背景執行緒定期探測"""
+        self.check_now()
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name="model-health", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        try:
+            while not self._stop.wait(self.interval):
+                loop.run_until_complete(self.probe_all())
+        finally:
+            loop.close()
+
+    def stop(self):
+        self._stop.set()
+
+    # ---------- 查詢 ----------
+
+    def is_available(self, model_name: str) -> bool:
+        """尚未登記或尚未探測的模型視為可用"""
+        with self._lock:
+            assignment = self._assignments.get(model_name)
+            if assignment is None:
+                return True
+            backend, remote_name = assignment
+            status = self._status.get(backend)
+        if status is None:
+            return True
+        if not status["healthy"]:
+            return False
+        catalog = status["catalog"]
+        return remote_name is None or catalog is None or remote_name in catalog
+
+    def backend_of(self, model_name: str) -> Optional[str]:
+        with self._lock:
+            assignment = self._assignments.get(model_name)
+        return assignment[0] if assignment else None
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """各後端的健康狀態與探測延遲"""
+        with self._lock:
+            return {backend: {key: value for key, value in status.items() if key != "catalog"}
+                    | {"models": len(status["catalog"] or [])}
+                    for backend, status in self._status.items()}
@@ -0,0 +1,232 @@
+"""
+每個使用者各自的對話狀態
+以 Gradio 的 session id 為鍵，記憶體中最多保留 max_sessions 個工作階段（LRU），
+閒置超過 ttl 秒的工作階段會被移除；設定 spill_dir 時，被移出記憶體的工作階段會先寫到磁碟，
+之後同一個使用者回來時再讀回。每個工作階段有自己的鎖，不同使用者之間不會互相等待
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+
+class _Entry:
+    __slots__ = ("state", "lock", "last_used")
+
+    def __init__(self, state):
+        self.state = state
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+
+class SessionStore:
+    """有容量與閒置時間上限的工作階段儲存"""
+
+    def __init__(self, factory: Callable[[], Any], max_sessions: int = 1000, ttl: float = 3600.0,
+                 spill_dir: Optional[str] = None,
+                 dump: Optional[Callable[[Any], Dict[str, Any]]] = None,
+                 load: Optional[Callable[[Dict[str, Any]], Any]] = None,
+                 sweep_interval: float = 60.0):
+        if spill_dir and (dump is None or load is None):
+            raise ValueError("使用 spill_dir 時必須提供 dump 與 load")
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.spill_dir = spill_dir
+        self.dump = dump
+        self.load = load
+        self.sweep_interval = sweep_interval
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        # 已移出記憶體、正在寫入磁碟的工作階段 {id: (工作階段, 本次移出的憑證)}；寫完之前被要求時直接放回記憶體
+        self._spilling: Dict[str, Tuple[_Entry, object]] = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        self._stats = {"created": 0, "restored": 0, "evicted": 0, "expired": 0, "spilled": 0}
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    # ---------- 取得工作階段 ----------
+
+    @contextmanager
+    def session(self, session_id: str) -> Iterator[Any]:
+        """取得並鎖定某個使用者的狀態；同一個使用者的請求依序處理"""
+        while True:
+            entry, locked = self._entry(session_id)
+            if not locked:
+                entry.lock.acquire()
+            # 取得鎖之前可能剛好被移出記憶體：重新取得（必要時從磁碟讀回）
+            if self._entries.get(session_id) is entry:
+                break
+            entry.lock.release()
+        try:
+            yield entry.state
+        finally:
+            entry.last_used = time.monotonic()
+            entry.lock.release()
+        # 所有工作階段都在處理請求時會暫時超過上限，請求結束後再補做淘汰
+        if len(self._entries) > self.max_sessions:
+            self._shrink()
+
+    def _entry(self, session_id: str):
+        """回傳 (工作階段, 是否已由本執行緒鎖定)"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_sweep >= self.sweep_interval:
+                self._sweep(now)
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                self._entries.move_to_end(session_id)
+                entry.last_used = now
+                return entry, False
+            entry, _ = self._spilling.pop(session_id, (None, None))
+            if entry is not None:
+                # 還在寫入磁碟：直接放回記憶體
+                self._entries[session_id] = entry
+                entry.last_used = now
+                return entry, False
+            # 先放入鎖定中的空位，同一個使用者的其他請求會等待讀回完成
+            entry = self._entries[session_id] = _Entry(None)
+            entry.lock.acquire()
+
+        try:
+            # 從磁碟讀回或建立新的狀態（不持有全域鎖）
+            state = self._restore(session_id)
+            if state is None:
+                entry.state, stat = self.factory(), "created"
+            else:
+                entry.state, stat = state, "restored"
+        except BaseException:
+            with self._lock:
+                self._entries.pop(session_id, None)
+            entry.lock.release()
+            raise
+        with self._lock:
+            self._stats[stat] += 1
+        self._shrink()
+        return entry, True
+
+    def _shrink(self):
+        with self._lock:
+            evicted = self._evict_over_capacity()
+        for key, old, ticket in evicted:
+            self._spill(key, old, ticket)
+
+    def _evict_over_capacity(self):
+        """已持有 self._lock；移出最久沒用的工作階段（正在處理請求的跳過）"""
+        evicted = []
+        if len(self._entries) <= self.max_sessions:
+            return evicted
+        for key in list(self._entries):
+            if len(self._entries) <= self.max_sessions:
+                break
+            entry = self._entries[key]
+            if entry.lock.locked():
+                continue
+            del self._entries[key]
+            self._stats["evicted"] += 1
+            if self.spill_dir:
+                ticket = object()
+                self._spilling[key] = (entry, ticket)
+                evicted.append((key, entry, ticket))
+        return evicted
+
+    def _sweep(self, now: float):
+        """已持有 self._lock；移除閒置過久的工作階段與過期的磁碟檔案"""
+        self._last_sweep = now
+        for key in list(self._entries):
+            entry = self._entries[key]
+            if now - entry.last_used < self.ttl:
+                # OrderedDict 依最近使用排序，後面的都比較新
+                break
+            if not entry.lock.locked():
+                del self._entries[key]
+                self._stats["expired"] += 1
+        if self.spill_dir:
+            cutoff = time.time() - self.ttl
+            with os.scandir(self.spill_dir) as it:
+                for item in it:
+                    if item.name.endswith(".json") and item.stat().st_mtime < cutoff:
+                        self._remove(item.path)
+
+    # ---------- 磁碟 ----------
+
+    def _spill_path(self, session_id: str) -> str:
+        digest = hashlib.sha256(session_id.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.spill_dir, f"{digest}.json")
+
+    def _spill(self, session_id: str, entry: _Entry, ticket: object):
+        path = self._spill_path(session_id)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        # 持有工作階段的鎖寫檔，同一個工作階段的寫入不會交錯
+        with entry.lock:
+            with self._lock:
+                current = self._spilling.get(session_id)
+            if current is None or current[1] is not ticket:
+                # 已被放回記憶體，或之後又被移出（由較新的那次寫入）
+                return
+            try:
+                data = self.dump(entry.state)
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(tmp, path)
+                written = True
+            except Exception as e:
+                print(f"⚠️ 無法將工作階段寫入磁碟：{e}")
+                self._remove(tmp)
+                written = False
+
+            with self._lock:
+                current = self._spilling.get(session_id)
+                if current is not None and current[1] is ticket:
+                    del self._spilling[session_id]
+                    if written:
+                        self._stats["spilled"] += 1
+                elif written:
+                    # 寫入期間又被使用而放回記憶體：磁碟上的版本已過時
+                    self._remove(path)
+
+    def _restore(self, session_id: str):
+        if not self.spill_dir:
+            return None
+        path = self._spill_path(session_id)
+        try:
+            if time.time() - os.path.getmtime(path) >= self.ttl:
+                self._remove(path)
+                return None
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"⚠️ 無法讀回工作階段：{e}")
+            return None
+        self._remove(path)
+        return self.load(data)
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    # ---------- 其他 ----------
+
+    def discard(self, session_id: str):
+        """移除某個使用者的狀態（包含磁碟上的檔案）"""
+        with self._lock:
+            self._entries.pop(session_id, None)
+        if self.spill_dir:
+            self._remove(self._spill_path(session_id))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"active": len(self._entries), "max_sessions": self.max_sessions, **self._stats}
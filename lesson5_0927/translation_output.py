@@ -0,0 +1,135 @@
+"""
+翻譯結果的結構化擷取
+提示要求模型把譯文放在 <translation> 與 </translation> 之間；TranslationStreamParser 在串流時逐段解析，
+標記內的文字一出現就可以顯示，每段輸出只檢查一次（不必每次重新掃描整段回應）。
+模型沒有遵守格式時，改用 JSON（{"translation": ...}）或提示末尾的「xx翻譯：」標記擷取，最後才使用原始輸出
+"""
+
+import json
+import re
+from typing import List, Optional
+
+START_TAG = "<translation>"
+END_TAG = "</translation>"
+
+# 加在翻譯提示中的輸出格式說明
+FORMAT_INSTRUCTIONS = f"只輸出譯文，並放在 {START_TAG} 與 {END_TAG} 之間，不要加上任何說明。"
+
+_CODE_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def extract_translation(text: str, answer_marker: Optional[str] = None) -> str:
+    """從完整的模型輸出中擷取譯文：標記 → JSON → answer_marker 之後的文字 → 原始輸出"""
+    start = text.find(START_TAG)
+    if start >= 0:
+        start += len(START_TAG)
+        end = text.find(END_TAG, start)
+        return (text[start:end] if end >= 0 else text[start:]).strip()
+
+    stripped = _CODE_FENCE.sub("", text.strip())
+    if stripped.startswith("{"):
+        try:
+            data = json.loads(stripped)
+        except ValueError:
+            data = None
+        if isinstance(data, dict) and isinstance(data.get("translation"), str):
+            return data["translation"].strip()
+
+    if answer_marker:
+        index = text.rfind(answer_marker)
+        if index >= 0:
+            return text[index + len(answer_marker):].strip()
+    return text.strip()
+
+
+def _partial_suffix(text: str, tag: str) -> int:
+    """text 結尾與 tag 開頭重疊的長度（可能是被切成兩段的標記）"""
+    for size in range(min(len(tag) - 1, len(text)), 0, -1):
+        if text.endswith(tag[:size]):
+            return size
+    return 0
+
+
+class TranslationStreamParser:
+    """逐段解析串流輸出，只保留 <translation> 標記之間的譯文
+
+    在開頭 max_preamble 個字元內沒有出現開始標記時，視為模型忽略了格式，之後直接顯示原始輸出；
+    finish() 會再以 extract_translation() 對完整輸出做一次擷取，得到最終結果
+    """
+
+    def __init__(self, answer_marker: Optional[str] = None, max_preamble: int = 200):
+        self.answer_marker = answer_marker
+        self.max_preamble = max_preamble
+        # before：等待開始標記；inside：標記內；after：已讀到結束標記；raw：模型沒有遵守格式
+        self.state = "before"
+        self._raw: List[str] = []
+        self._raw_length = 0
+        self._pending = ""
+        self._parts: List[str] = []
+
+    @property
+    def text(self) -> str:
+        """目前可以顯示的譯文"""
+        return "".join(self._parts)
+
+    @property
+    def done(self) -> bool:
+        """已讀到結束標記，之後的輸出都不需要了"""
+        return self.state == "after"
+
+    @property
+    def raw_text(self) -> str:
+        return "".join(self._raw)
+
+    def _emit(self, text: str) -> str:
+        if not self._parts:
+            text = text.lstrip()
+        if text:
+            self._parts.append(text)
+        return text
+
+    def feed(self, chunk: str) -> str:
+        """加入一段模型輸出，回傳這次新增、可以顯示的譯文"""
+        self._raw.append(chunk)
+        self._raw_length += len(chunk)
+        if self.state == "after":
+            return ""
+        self._pending += chunk
+
+        if self.state == "before":
+            index = self._pending.find(START_TAG)
+            if index >= 0:
+                self._pending = self._pending[index + len(START_TAG):]
+                self.state = "inside"
+            elif self._raw_length > self.max_preamble:
+                self.state = "raw"
+                pending, self._pending = self._pending, ""
+                if self.answer_marker and self.answer_marker in pending:
+                    pending = pending[pending.rindex(self.answer_marker) + len(self.answer_marker):]
+                return self._emit(pending)
+            else:
+                return ""
+
+        if self.state == "raw":
+            pending, self._pending = self._pending, ""
+            return self._emit(pending)
+
+        # inside：保留可能是結束標記前半段的結尾，等下一段輸出再判斷
+        index = self._pending.find(END_TAG)
+        if index >= 0:
+            text, self._pending = self._pending[:index], ""
+            self.state = "after"
+        else:
+            keep = _partial_suffix(self._pending, END_TAG)
+            split = len(self._pending) - keep
+            text, self._pending = self._pending[:split], self._pending[split:]
+        return self._emit(text)
+
+    def finish(self) -> str:
+        """輸出結束，回傳最終譯文"""
+        if self.state in ("inside", "after"):
+            # 沒有結束標記時，保留下來的結尾也是譯文的一部分
+            self._emit(self._pending)
+            self._pending = ""
+            return self.text.strip()
+        return extract_translation(self.raw_text, self.answer_marker)
@@ -0,0 +1,150 @@
+"""
+帶快取的向量檢索器
+RAG 鏈每次呼叫都要把問題轉成 embedding 再查詢 Chroma；客服流量中大多是重複的常見問題（例如「藍牙怎麼使用?」），
+CachedRetriever 以 LRU 快取保存問題的 embedding 與前 k 筆檢索結果，重複的問題兩個步驟都可以省略。
+
+匯入程式（rag_ingest、ingest_library）每次修改 collection 後都會增加 collection metadata 中的 ingest_version，
+檢索前比對版本，資料庫有變動時自動清除檢索結果快取（問題的 embedding 與資料庫內容無關，會繼續保留）
+
+環境變數：
+    RETRIEVER_CACHE_SIZE          檢索結果快取的問題數上限（預設 1024）
+    QUERY_EMBEDDING_CACHE_SIZE    問題 embedding 快取的問題數上限（預設 4096）
+    RETRIEVER_VERSION_TTL         檢查 collection 版本的最短間隔秒數（預設 0，每次檢索都檢查）
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict, PrivateAttr
+
+from embedding_stage import model_id
+
+VERSION_KEY = "ingest_version"
+
+
+class LRUCache:
+    """執行緒安全、有大小上限的 LRU 快取"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def normalize_query(query: str) -> str:
+    """快取鍵：去掉頭尾空白並合併連續空白"""
+    return " ".join(query.split())
+
+
+def collection_version(client, name: str) -> int:
+    """從資料庫讀取 collection 目前的版本（每次重新讀取，不使用 Collection 物件中快取的 metadata）"""
+    return int((client.get_collection(name).metadata or {}).get(VERSION_KEY, 0))
+
+
+class CachedRetriever(BaseRetriever):
+    """以 LRU 快取問題 embedding 與檢索結果的 Chroma 相似度檢索器"""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vectorstore: Any
+    k: int = 4
+    filter: Optional[Dict[str, Any]] = None
+    cache_size: int = int(os.getenv("RETRIEVER_CACHE_SIZE", 1024))
+    embedding_cache_size: int = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", 4096))
+    version_ttl: float = float(os.getenv("RETRIEVER_VERSION_TTL", 0))
+
+    _results: LRUCache = PrivateAttr()
+    _embeddings: LRUCache = PrivateAttr()
+    _model: str = PrivateAttr()
+    _version: Optional[int] = PrivateAttr(default=None)
+    _checked_at: float = PrivateAttr(default=0.0)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def model_post_init(self, __context: Any):
+        self._results = LRUCache(self.cache_size)
+        self._embeddings = LRUCache(self.embedding_cache_size)
+        self._model = model_id(self.vectorstore.embeddings)
+
+    def _current_version(self) -> int:
+        """目前的 collection 版本；版本改變時清除檢索結果快取"""
+        now = time.monotonic()
+        with self._lock:
+            if self._version is not None and now - self._checked_at < self.version_ttl:
+                return self._version
+        # langchain_chroma 沒有公開的 client 屬性，改用它內部保存的 client 重新讀取 collection
+        version = collection_version(self.vectorstore._client, self.vectorstore._collection.name)
+        with self._lock:
+            if version != self._version:
+                self._results.clear()
+                self._version = version
+            self._checked_at = now
+        return version
+
+    def embed_query(self, query: str) -> List[float]:
+        """問題的 embedding（有快取時直接取用）"""
+        key = (self._model, normalize_query(query))
+        vector = self._embeddings.get(key)
+        if vector is None:
+            vector = self.vectorstore.embeddings.embed_query(query)
+            self._embeddings.put(key, vector)
+        return vector
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        version = self._current_version()
+        key = (version, normalize_query(query), self.k, repr(sorted((self.filter or {}).items())))
+        cached = self._results.get(key)
+        if cached is not None:
+            # 回傳副本，呼叫端修改文件時不會影響快取
+            return [document.model_copy(deep=True) for document in cached]
+        documents = self.vectorstore.similarity_search_by_vector(self.embed_query(query), k=self.k,
+                                                                 filter=self.filter)
+        self._results.put(key, [document.model_copy(deep=True) for document in documents])
+        return documents
+
+    def clear_cache(self):
+        self._results.clear()
+        self._embeddings.clear()
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return {
+            "version": self._version,
+            "results": len(self._results),
+            "result_hits": self._results.hits,
+            "result_misses": self._results.misses,
+            "embeddings": len(self._embeddings),
+            "embedding_hits": self._embeddings.hits,
+            "embedding_misses": self._embeddings.misses,
+        }
@@ -0,0 +1,257 @@
+"""
+匯入流程的 embedding 階段
+把片段分批（每批 batch_size 個）交給執行緒池或行程池同時計算 embedding，
+算好的向量存進以記憶體映射（memmap）的 float32 快取，鍵為（模型 ID、片段雜湊）；
+重新匯入或不同文件中重複的內容直接從快取讀取，不必再計算
+
+快取檔案（每個模型一個目錄）：
+    model.json    模型 ID 與向量維度
+    vectors.f32   所有向量依序排列（float32）
+    keys.txt      每行一個片段雜湊，第 n 行對應第 n 個向量
+同一時間只應有一個行程寫入同一個快取目錄
+
+環境變數：
+    EMBED_BATCH_SIZE   每批的片段數（預設 64）
+    EMBED_WORKERS      同時計算的批次數（預設 CPU 核心數）
+    EMBED_EXECUTOR     thread 或 process（預設 thread；呼叫外部服務用 thread，本機 CPU 模型用 process）
+                       process 模式下每個工作行程以 factory 建立一次模型，之後只傳送片段文字
+    EMBED_CACHE_DIR    快取目錄（預設 lesson7/db/embedding_cache，設為空字串停用快取）
+"""
+
+import functools
+import hashlib
+import json
+import os
+import threading
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+LESSON_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DIR = os.path.join(LESSON_DIR, "db", "embedding_cache")
+DEFAULT_BATCH_SIZE = 64
+# 快取檔案每次擴充的最少向量數
+_GROW_ROWS = 1024
+
+
+def model_id(embeddings) -> str:
+    """embedding 模型的識別字串（類別名稱加上模型名稱／維度），作為快取鍵的一部分"""
+    parts = [type(embeddings).__name__]
+    for name in ("model", "model_name", "size", "dimensions"):
+        value = getattr(embeddings, name, None)
+        if value is not None:
+            parts.append(f"{name}={value}")
+    return ":".join(parts)
+
+
+class EmbeddingCache:
+    """以記憶體映射檔案儲存的向量快取（單一模型）"""
+
+    def __init__(self, directory: str, model: str):
+        self.model = model
+        self.path = os.path.join(directory, hashlib.sha256(model.encode("utf-8")).hexdigest()[:16])
+        os.makedirs(self.path, exist_ok=True)
+        self._meta_path = os.path.join(self.path, "model.json")
+        self._vectors_path = os.path.join(self.path, "vectors.f32")
+        self._keys_path = os.path.join(self.path, "keys.txt")
+        self._rows: Dict[str, int] = {}
+        self._vectors: Optional[np.memmap] = None
+        self.dim: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self._meta_path):
+            return
+        with open(self._meta_path, encoding="utf-8") as f:
+            self.dim = json.load(f)["dim"]
+        capacity = os.path.getsize(self._vectors_path) // (4 * self.dim) if os.path.exists(self._vectors_path) else 0
+        if os.path.exists(self._keys_path):
+            with open(self._keys_path, encoding="utf-8") as f:
+                # 寫到一半中斷時，只採用向量確實寫入的部分
+                for row, line in enumerate(f):
+                    if row >= capacity or not line.endswith("\n"):
+                        break
+                    self._rows[line.strip()] = row
+        if capacity:
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _ensure_capacity(self, rows: int):
+        capacity = 0 if self._vectors is None else self._vectors.shape[0]
+        if rows <= capacity:
+            return
+        capacity = max(rows, capacity * 2, _GROW_ROWS)
+        if self._vectors is not None:
+            self._vectors.flush()
+            del self._vectors
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(capacity * 4 * self.dim)
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def get_many(self, hashes: Sequence[str]) -> Dict[str, np.ndarray]:
+        """讀取快取中已有的向量，回傳 {片段雜湊: 向量}"""
+        with self._lock:
+            found = {digest: np.array(self._vectors[self._rows[digest]])
+                     for digest in set(hashes) if digest in self._rows}
+            self.hits += len(found)
+            self.misses += len(set(hashes)) - len(found)
+            return found
+
+    def put_many(self, hashes: Sequence[str], vectors: Sequence[Sequence[float]]):
+        """寫入新向量：先寫向量再寫鍵，中途中斷時不會留下指向錯誤向量的鍵"""
+        with self._lock:
+            items = [(digest, vector) for digest, vector in zip(hashes, vectors) if digest not in self._rows]
+            if not items:
+                return
+            if self.dim is None:
+                self.dim = len(items[0][1])
+                with open(self._meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"model": self.model, "dim": self.dim}, f, ensure_ascii=False)
+            start = len(self._rows)
+            self._ensure_capacity(start + len(items))
+            self._vectors[start:start + len(items)] = np.asarray([vector for _, vector in items], dtype=np.float32)
+            self._vectors.flush()
+            with open(self._keys_path, "a", encoding="utf-8") as f:
+                f.writelines(f"{digest}\n" for digest, _ in items)
+            for offset, (digest, _) in enumerate(items):
+                self._rows[digest] = start + offset
+
+
+def _embed_batch(embeddings, texts: List[str]) -> List[List[float]]:
+    """在工作執行緒中以共用的模型計算一批 embedding"""
+    return embeddings.embed_documents(texts)
+
+
+# 工作行程中的 embedding 模型（由 _init_worker 建立，每個行程一個）
+_worker_embeddings = None
+
+
+def _init_worker(factory: Callable[[], Any]):
+    """行程池的 initializer：每個工作行程只建立一次模型"""
+    global _worker_embeddings
+    _worker_embeddings = factory()
+
+
+def _embed_in_worker(texts: List[str]) -> List[List[float]]:
+    """在工作行程中計算一批 embedding；只有片段文字需要序列化"""
+    return _worker_embeddings.embed_documents(texts)
+
+
+def _same(embeddings):
+    return embeddings
+
+
+class EmbeddingStage:
+    """分批、平行計算 embedding，並使用向量快取
+
+    factory 是可序列化的無參數函式（例如 functools.partial(FakeEmbeddings, size=1024)），回傳 embedding 模型；
+    行程池的每個工作行程以它建立自己的模型。只給 embeddings 時，模型物件在建立工作行程時序列化一次
+    """
+
+    def __init__(self, embeddings=None, batch_size: Optional[int] = None, workers: Optional[int] = None,
+                 executor: Optional[str] = None, cache_dir: Optional[str] = None,
+                 factory: Optional[Callable[[], Any]] = None):
+        if embeddings is None and factory is None:
+            raise ValueError("需要 embeddings 或 factory")
+        self.embeddings = embeddings if embeddings is not None else factory()
+        self.factory = factory
+        self.model = model_id(self.embeddings)
+        self.batch_size = max(1, batch_size or int(os.getenv("EMBED_BATCH_SIZE", DEFAULT_BATCH_SIZE)))
+        self.workers = max(1, workers or int(os.getenv("EMBED_WORKERS", 0)) or os.cpu_count() or 1)
+        self.executor_kind = executor or os.getenv("EMBED_EXECUTOR", "thread")
+        if cache_dir is None:
+            cache_dir = os.getenv("EMBED_CACHE_DIR", DEFAULT_CACHE_DIR)
+        self.cache = EmbeddingCache(cache_dir, self.model) if cache_dir else None
+        self.computed = 0
+        self._executor: Optional[Executor] = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_kind == "process":
+                factory = self.factory or functools.partial(_same, self.embeddings)
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                     initargs=(factory,))
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def _submit(self, texts: List[str]):
+        if self.executor_kind == "process":
+            return self._get_executor().submit(_embed_in_worker, texts)
+        return self._get_executor().submit(_embed_batch, self.embeddings, texts)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def iter_stream(self, items: Iterable[Tuple[Any, str, str]]) -> Iterator[Tuple[List[Any], List[List[float]]]]:
+        """逐批計算串流中片段的 embedding
+
+        items 為 (附帶資料, 文字, 片段雜湊)，依原本的順序逐批回傳 (附帶資料, 向量)；
+        只在需要時才從 items 取下一批，同時進行的批次不超過 workers 的兩倍，記憶體用量有上限
+        """
+        items = iter(items)
+        pending: deque = deque()
+        while True:
+            batch = list(islice(items, self.batch_size))
+            if not batch:
+                break
+            hashes = [digest for _, _, digest in batch]
+            cached = self.cache.get_many(hashes) if self.cache is not None else {}
+            # 同一批中重複的內容只計算一次
+            missing: Dict[str, str] = {}
+            for _, text, digest in batch:
+                if digest not in cached:
+                    missing.setdefault(digest, text)
+            future = self._submit(list(missing.values())) if missing else None
+            pending.append(([payload for payload, _, _ in batch], hashes, cached, list(missing), future))
+            while len(pending) >= self.workers * 2:
+                yield self._collect(*pending.popleft())
+        while pending:
+            yield self._collect(*pending.popleft())
+
+    def _collect(self, payloads, hashes, cached, missing, future):
+        vectors = dict(cached)
+        if future is not None:
+            computed = future.result()
+            self.computed += len(computed)
+            if self.cache is not None:
+                self.cache.put_many(missing, computed)
+            vectors.update(zip(missing, computed))
+        # 統一轉為 float32 精度，從快取讀取與新計算的向量完全相同
+        return payloads, [np.asarray(vectors[digest], dtype=np.float32).tolist() for digest in hashes]
+
+    def iter_batches(self, texts: Sequence[str], hashes: Sequence[str]) -> Iterator[Tuple[List[int], List[List[float]]]]:
+        """依原本的順序逐批回傳 (片段位置, 向量)"""
+        return self.iter_stream(zip(range(len(texts)), texts, hashes))
+
+    def embed(self, texts: Sequence[str], hashes: Optional[Sequence[str]] = None) -> List[List[float]]:
+        """計算全部片段的 embedding（依原本的順序）"""
+        if hashes is None:
+            hashes = [hashlib.sha256(text.encode("utf-8")).hexdigest() for text in texts]
+        result: List[List[float]] = []
+        for _, vectors in self.iter_batches(texts, hashes):
+            result.extend(vectors)
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "computed": self.computed,
+            "cache_hits": self.cache.hits if self.cache is not None else 0,
+            "cache_size": len(self.cache) if self.cache is not None else 0,
+        }
@@ -0,0 +1,297 @@
+"""
+手冊資料夾的平行匯入工具
+走訪整個目錄樹，支援 txt、Markdown、HTML 與 PDF（文字層）；各檔案的解析與切分在行程池中同時進行，
+主行程依序比對雜湊並把差異寫入指定的 collection（增量匯入，見 rag_ingest）。
+每個片段的 metadata 另外記錄檔案的修改時間、大小與內容雜湊；修改時間與大小都沒變的檔案不必重新解析
+
+用法：python lesson7/ingest_library.py 目錄 [--collection 名稱] [--db 路徑] [--workers N]
+                                     [--dry-run] [--prune] [--force] [--ollama-model 模型]
+例如：python lesson7/ingest_library.py lesson7/book --collection smartphone_manual
+
+來源路徑以目錄的上一層為基準（lesson7/book/a.txt 記錄為 book/a.txt），與 rag_ingest 相同。
+PDF 需要另外安裝 pypdf（pip install pypdf）；掃描影像的 PDF 沒有文字層，無法匯入
+"""
+
+import argparse
+import functools
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+from langchain_community.embeddings import FakeEmbeddings
+
+from embedding_stage import EmbeddingStage
+from rag_ingest import (DEFAULT_DB, bump_version, file_metadata, format_stats, get_collection, ingest_chunks,
+                        source_key)
+from stream_splitter import Chunk, StreamingSplitter, iter_chunks
+
+TEXT_EXTENSIONS = {".txt", ".text"}
+MARKDOWN_EXTENSIONS = {".md", ".markdown"}
+HTML_EXTENSIONS = {".html", ".htm"}
+PDF_EXTENSIONS = {".pdf"}
+
+
+class ParsedFile(NamedTuple):
+    path: str
+    file_type: str
+    metadata: Dict[str, Any]
+    chunks: List[Chunk]
+    error: Optional[str] = None
+
+
+class _HTMLText(HTMLParser):
+    """取出 HTML 中的文字，區塊元素之間以空行分隔，略過 script/style"""
+
+    BLOCK_TAGS = {"p", "div", "section", "article", "li", "ul", "ol", "table", "tr", "h1", "h2", "h3",
+                  "h4", "h5", "h6", "br", "pre", "blockquote", "header", "footer", "title"}
+    SKIP_TAGS = {"script", "style", "noscript", "template"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip += 1
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n\n")
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.parts.append(" ".join(data.split()))
+
+    def text(self) -> str:
+        return "".join(self.parts)
+
+
+def html_to_text(html: str) -> str:
+    parser = _HTMLText()
+    parser.feed(html)
+    parser.close()
+    return parser.text()
+
+
+def pdf_to_text(path: str) -> str:
+    """讀取 PDF 的文字層，每頁之間以空行分隔"""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise RuntimeError("匯入 PDF 需要安裝 pypdf：pip install pypdf") from None
+    return "\n\n".join(page.extract_text() or "" for page in PdfReader(path).pages)
+
+
+def file_type_of(path: str) -> Optional[str]:
+    extension = os.path.splitext(path)[1].lower()
+    for file_type, extensions in (("text", TEXT_EXTENSIONS), ("markdown", MARKDOWN_EXTENSIONS),
+                                  ("html", HTML_EXTENSIONS), ("pdf", PDF_EXTENSIONS)):
+        if extension in extensions:
+            return file_type
+    return None
+
+
+def parse_file(path: str, chunk_size: int = 500, chunk_overlap: int = 200) -> ParsedFile:
+    """解析並切分一個檔案（在行程池中執行）；失敗時回傳附帶 error 的結果，不拋出例外"""
+    file_type = file_type_of(path)
+    try:
+        metadata = file_metadata(path, file_type)
+        if file_type in ("text", "markdown"):
+            chunks = list(iter_chunks(path, chunk_size, chunk_overlap))
+        else:
+            if file_type == "html":
+                with open(path, encoding="utf-8", errors="replace") as f:
+                    text = html_to_text(f.read())
+            else:
+                text = pdf_to_text(path)
+            chunks = list(StreamingSplitter(chunk_size, chunk_overlap).split_text(text))
+    except Exception as e:
+        return ParsedFile(path, file_type, {}, [], f"{type(e).__name__}: {e}")
+    return ParsedFile(path, file_type, metadata, chunks)
+
+
+def iter_files(directory: str) -> Iterator[str]:
+    """依名稱順序走訪目錄樹中支援的檔案（略過隱藏檔與隱藏目錄）"""
+    for current, dirs, files in os.walk(directory):
+        dirs[:] = sorted(name for name in dirs if not name.startswith("."))
+        for name in sorted(files):
+            if not name.startswith(".") and file_type_of(name):
+                yield os.path.join(current, name)
+
+
+def _stored_file_info(collection, source: str) -> Dict[str, Any]:
+    if collection is None:
+        return {}
+    # 檔案資訊只記錄在第一個片段
+    records = collection.get(where={"$and": [{"source": source}, {"chunk_index": 0}]}, limit=1,
+                             include=["metadatas"])
+    return (records["metadatas"] or [{}])[0] or {}
+
+
+def _open_collection(db_path: str, name: str, dry_run: bool):
+    """dry-run 時不建立資料庫或 collection，不存在時回傳 None"""
+    if not dry_run:
+        return get_collection(db_path, name)
+    if not os.path.isdir(db_path):
+        return None
+    import chromadb
+
+    try:
+        return chromadb.PersistentClient(path=db_path).get_collection(name)
+    except Exception:
+        return None
+
+
+class LibraryIngester:
+    """平行匯入一個目錄樹"""
+
+    def __init__(self, collection, embeddings, base: str, workers: int = 0, dry_run: bool = False,
+                 force: bool = False, chunk_size: int = 500, chunk_overlap: int = 200):
+        self.collection = collection
+        self.embeddings = embeddings
+        self.base = base
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.dry_run = dry_run
+        self.force = force
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.totals = {"files": 0, "skipped": 0, "failed": 0, "chunks": 0, "added": 0, "deleted": 0,
+                       "updated": 0, "bytes": 0}
+        self.seen_sources: set = set()
+
+    def _is_unchanged(self, path: str, source: str) -> bool:
+        if self.force:
+            return False
+        stored = _stored_file_info(self.collection, source)
+        stat = os.stat(path)
+        return stored.get("file_mtime_ns") == stat.st_mtime_ns and stored.get("file_size") == stat.st_size
+
+    def _ingest_parsed(self, parsed: ParsedFile, source: str) -> Dict[str, Any]:
+        if self.collection is None:
+            # dry-run 且 collection 還不存在：全部片段都是新的
+            return {"source": source, "chunks": len(parsed.chunks), "added": len(parsed.chunks), "updated": 0,
+                    "deleted": 0, "unchanged": 0, "first_write": None, "seconds": 0.0}
+        return ingest_chunks(self.collection, source, parsed.chunks, self.embeddings,
+                             extra_metadata=parsed.metadata, dry_run=self.dry_run)
+
+    def run(self, paths: List[str]):
+        total = len(paths)
+        started = time.perf_counter()
+        pending: deque = deque()
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            done = 0
+            for path in paths + [None]:
+                if path is not None:
+                    source = source_key(path, self.base)
+                    self.seen_sources.add(source)
+                    if self._is_unchanged(path, source):
+                        done += 1
+                        self.totals["skipped"] += 1
+                        print(f"[{done}/{total}] ⏭️  {source}：修改時間與大小未變，略過")
+                        continue
+                    pending.append((source, pool.submit(parse_file, path, self.chunk_size, self.chunk_overlap)))
+                # 同時解析中的檔案不超過 workers 的兩倍，限制暫存的片段數；最後把剩下的全部處理完
+                while pending and (path is None or len(pending) >= self.workers * 2):
+                    source, future = pending.popleft()
+                    parsed = future.result()
+                    done += 1
+                    self._report(done, total, source, parsed, started)
+
+    def _report(self, done: int, total: int, source: str, parsed: ParsedFile, started: float):
+        if parsed.error:
+            self.totals["failed"] += 1
+            print(f"[{done}/{total}] ❌ {source}：{parsed.error}")
+            return
+        stats = self._ingest_parsed(parsed, source)
+        self.totals["files"] += 1
+        self.totals["bytes"] += parsed.metadata["file_size"]
+        for key in ("chunks", "added", "deleted", "updated"):
+            self.totals[key] += stats[key]
+        elapsed = time.perf_counter() - started
+        print(f"[{done}/{total}] {format_stats(stats)}｜累計 {self.totals['chunks'] / elapsed:.0f} 片段/秒、"
+              f"{self.totals['bytes'] / 1024 / 1024 / elapsed:.2f} MB/秒")
+
+    def prune(self, prefix: str) -> int:
+        """刪除來源在 prefix 底下、但這次沒有走訪到的檔案（已被刪除或改名）"""
+        if self.collection is None:
+            return 0
+        records = self.collection.get(include=["metadatas"])
+        stale = [record_id for record_id, metadata in zip(records["ids"], records["metadatas"])
+                 if str((metadata or {}).get("source", "")).startswith(prefix)
+                 and (metadata or {}).get("source") not in self.seen_sources]
+        if stale and not self.dry_run:
+            for start in range(0, len(stale), 256):
+                self.collection.delete(ids=stale[start:start + 256])
+            bump_version(self.collection)
+        return len(stale)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="平行匯入整個目錄的文件到 Chroma 向量資料庫")
+    parser.add_argument("directory", help="要匯入的目錄")
+    parser.add_argument("--collection", default="manual_library", help="collection 名稱")
+    parser.add_argument("--db", default=DEFAULT_DB, help="Chroma 資料庫目錄")
+    parser.add_argument("--base", help="來源路徑的基準目錄（預設為目錄的上一層）")
+    parser.add_argument("--workers", type=int, default=0, help="解析檔案的行程數（預設 CPU 核心數）")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--dry-run", action="store_true", help="只列出會新增、刪除的片段數，不寫入資料庫")
+    parser.add_argument("--prune", action="store_true", help="刪除目錄中已經不存在的檔案的片段")
+    parser.add_argument("--force", action="store_true", help="即使修改時間與大小未變也重新解析比對")
+    parser.add_argument("--ollama-model", help="使用 Ollama 的 embedding 模型（預設 FakeEmbeddings(size=1024)）")
+    args = parser.parse_args()
+
+    directory = os.path.abspath(args.directory)
+    if not os.path.isdir(directory):
+        print(f"❌ 目錄{directory}不存在,請檢查路徑")
+        sys.exit(1)
+    base = os.path.abspath(args.base) if args.base else os.path.dirname(directory)
+
+    if args.ollama_model:
+        from langchain_ollama import OllamaEmbeddings
+
+        factory = functools.partial(OllamaEmbeddings, model=args.ollama_model)
+    else:
+        # 使用 1024 維度以匹配已存在的資料庫
+        factory = functools.partial(FakeEmbeddings, size=1024)
+
+    collection = _open_collection(args.db, args.collection, args.dry_run)
+    paths = list(iter_files(directory))
+    mode = "（dry-run，不寫入）" if args.dry_run else ""
+    print(f"📚 {directory}：{len(paths)} 個檔案 → collection「{args.collection}」{mode}")
+
+    started = time.perf_counter()
+    # dry-run 不計算 embedding，也不建立向量快取
+    stage = None if args.dry_run else EmbeddingStage(factory=factory)
+    try:
+        ingester = LibraryIngester(collection, stage, base, args.workers, args.dry_run, args.force,
+                                   args.chunk_size, args.chunk_overlap)
+        ingester.run(paths)
+        pruned = ingester.prune(source_key(directory, base) + "/") if args.prune else 0
+    finally:
+        if stage is not None:
+            stage.close()
+    computed = stage.computed if stage is not None else 0
+    elapsed = time.perf_counter() - started
+
+    totals = ingester.totals
+    print(f"✅ 完成：{totals['files']} 個檔案（略過 {totals['skipped']}、失敗 {totals['failed']}），"
+          f"{totals['chunks']} 個片段，新增 {totals['added']}、刪除 {totals['deleted'] + pruned}、"
+          f"僅更新 metadata {totals['updated']}，計算 {computed} 個 embedding")
+    print(f"⏱️ {elapsed:.2f} 秒，{totals['chunks'] / elapsed:.0f} 片段/秒、"
+          f"{totals['bytes'] / 1024 / 1024 / elapsed:.2f} MB/秒")
+    if totals["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
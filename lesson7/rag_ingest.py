@@ -0,0 +1,273 @@
+"""
+向量資料庫的增量匯入
+文件切成片段後，以片段內容的雜湊作為 ID，並把雜湊記錄在 Chroma 的 metadata；
+再次匯入同一個檔案時只比對雜湊：新增或修改過的片段才重新 embedding 並寫入，
+已經不存在的片段會被刪除，沒變的片段完全不動，不必刪掉整個資料庫重建。
+檔案以串流方式讀取與切分（stream_splitter），切分、embedding 與寫入同時進行
+
+用法：python lesson7/rag_ingest.py [檔案 ...] [--db 路徑] [--collection 名稱]
+（未指定檔案時匯入 book/智慧型手機使用手冊.txt）
+"""
+
+import argparse
+import functools
+import hashlib
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import chromadb
+from langchain_community.embeddings import FakeEmbeddings
+
+from embedding_stage import EmbeddingStage
+from stream_splitter import Chunk, iter_chunks
+
+LESSON_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DB = os.path.join(LESSON_DIR, "db", "chroma_db_v3")
+DEFAULT_COLLECTION = "smartphone_manual"
+DEFAULT_FILE = os.path.join(LESSON_DIR, "book", "智慧型手機使用手冊.txt")
+# 每次更新、刪除 Chroma 資料的片段數（embedding 的批次大小由 EmbeddingStage 決定）
+BATCH_SIZE = 256
+# collection metadata 中的匯入格式版本；舊版（Chroma.from_documents 建立）的資料沒有這個欄位
+SCHEMA_VERSION = 1
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def source_key(path: str, root: Optional[str] = None) -> str:
+    """metadata 中記錄的來源：相對於 root 的路徑（統一使用 /），換一台電腦匯入也會一致"""
+    root = root or LESSON_DIR
+    path = os.path.abspath(path)
+    try:
+        relative = os.path.relpath(path, root)
+    except ValueError:
+        relative = path
+    if relative.startswith(".."):
+        relative = path
+    return relative.replace(os.sep, "/")
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_metadata(path: str, file_type: str = "text") -> Dict[str, Any]:
+    """檔案資訊（類型、修改時間、大小、內容雜湊）
+
+    修改時間存成整數奈秒（st_mtime_ns）：Chroma 讀回的浮點數與 st_mtime 不完全相同，無法用來精確比對
+    """
+    stat = os.stat(path)
+    return {"file_type": file_type, "file_mtime_ns": stat.st_mtime_ns, "file_size": stat.st_size,
+            "file_hash": file_hash(path)}
+
+
+class ChunkIds:
+    """片段 ID＝來源 + 內容雜湊 + 同一內容在檔案中第幾次出現（重複的段落也不會衝突）"""
+
+    def __init__(self, source: str):
+        self.prefix = hashlib.sha256(source.encode("utf-8")).hexdigest()[:16]
+        self._seen: Dict[str, int] = {}
+
+    def next(self, digest: str) -> str:
+        occurrence = self._seen.get(digest, 0)
+        self._seen[digest] = occurrence + 1
+        return f"{self.prefix}-{digest[:32]}-{occurrence}"
+
+
+def chunk_ids(source: str, hashes: List[str]) -> List[str]:
+    ids = ChunkIds(source)
+    return [ids.next(digest) for digest in hashes]
+
+
+def _batches(items: List[Any], size: int) -> Iterable[List[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def get_collection(db_path: str = DEFAULT_DB, name: str = DEFAULT_COLLECTION):
+    client = chromadb.PersistentClient(path=db_path)
+    return client.get_or_create_collection(name)
+
+
+def update_collection_metadata(collection, **updates):
+    """合併更新 collection 的 metadata（hnsw: 開頭的設定建立後不能修改，不重複送出）"""
+    metadata = {key: value for key, value in (collection.metadata or {}).items() if not key.startswith("hnsw:")}
+    metadata.update(updates)
+    collection.modify(metadata=metadata)
+
+
+def bump_version(collection, **updates):
+    """增加 collection 的 ingest_version，讓檢索快取（cached_retriever）知道資料已改變
+
+    版本取 max(舊版本 + 1, 目前時間的奈秒數)：多個行程同時匯入時也不會寫出相同的版本
+    """
+    version = int((collection.metadata or {}).get("ingest_version", 0))
+    update_collection_metadata(collection, ingest_version=max(version + 1, time.time_ns()), **updates)
+
+
+def _migrate_legacy(collection, source: str) -> Optional[Tuple[List[str], int]]:
+    """找出舊版匯入（沒有 chunk_hash）的片段，回傳 (來源檔名相同、這次匯入後要被取代的 ID, 其他來源剩下的舊片段數)；
+    collection 已經是目前的格式時回傳 None
+
+    舊片段要等各自的檔案重新匯入才能取代，所以逐一來源遷移，全部遷移完才設定 ingest_schema
+    """
+    if (collection.metadata or {}).get("ingest_schema") == SCHEMA_VERSION:
+        return None
+    records = collection.get(include=["metadatas"])
+    name = os.path.basename(source)
+    matched, remaining = [], 0
+    for record_id, metadata in zip(records["ids"], records["metadatas"]):
+        metadata = metadata or {}
+        if metadata.get("chunk_hash"):
+            continue
+        if os.path.basename(str(metadata.get("source", "")).replace("\\", "/")) == name:
+            matched.append(record_id)
+        else:
+            remaining += 1
+    return matched, remaining
+
+
+def _differs(stored: Dict[str, Any], metadata: Dict[str, Any]) -> bool:
+    """只比對這次要寫入的欄位；Chroma 的 update 會合併 metadata，舊資料多出的欄位不影響判斷"""
+    return any(stored.get(key) != value for key, value in metadata.items())
+
+
+def ingest_chunks(collection, source: str, chunks: Iterable[Union[str, Chunk]], embeddings,
+                  extra_metadata: Optional[Dict[str, Any]] = None, batch_size: int = BATCH_SIZE,
+                  dry_run: bool = False) -> Dict[str, Any]:
+    """把一個來源的片段與資料庫中的版本比對，只寫入差異，回傳統計
+
+    chunks 可以是字串或附帶位置的 Chunk，也可以是產生器：邊切分邊 embedding、邊寫入，不必先保留全部片段
+    extra_metadata 是檔案層級的資訊（大小、修改時間、雜湊），只記錄在第一個片段：檔案有任何修改時
+    只需更新一個片段的 metadata，內容沒變的片段不必因此重寫
+    embeddings 可以是 LangChain 的 Embeddings 或 EmbeddingStage（多個檔案共用同一個執行緒池與快取）
+    dry_run 時只比對並統計，不計算 embedding 也不修改資料庫（embeddings 可為 None）
+    """
+    started = time.perf_counter()
+    existing = collection.get(where={"source": source}, include=["metadatas"])
+    stored = dict(zip(existing["ids"], existing["metadatas"]))
+    migration = _migrate_legacy(collection, source)
+    legacy = migration[0] if migration is not None else []
+
+    ids = ChunkIds(source)
+    current = set()
+    moved: List[Tuple[str, Dict[str, Any]]] = []
+    counts = {"chunks": 0, "added": 0, "updated": 0}
+    first_write: List[float] = []
+
+    def flush_moved():
+        # 內容沒變但位置或其他 metadata 改變的片段：只更新 metadata，不必重新 embedding
+        if moved and not dry_run:
+            collection.update(ids=[chunk_id for chunk_id, _ in moved], metadatas=[metadata for _, metadata in moved])
+        counts["updated"] += len(moved)
+        moved.clear()
+
+    def new_chunks():
+        for index, chunk in enumerate(chunks):
+            text = chunk.text if isinstance(chunk, Chunk) else chunk
+            digest = chunk_hash(text)
+            chunk_id = ids.next(digest)
+            metadata = {"source": source, "chunk_hash": digest, "chunk_index": index}
+            if isinstance(chunk, Chunk):
+                metadata.update(start=chunk.start, end=chunk.end)
+            if index == 0:
+                metadata.update(extra_metadata or {})
+            counts["chunks"] += 1
+            current.add(chunk_id)
+            if chunk_id not in stored:
+                counts["added"] += 1
+                yield (chunk_id, metadata, text), text, digest
+            elif _differs(stored[chunk_id], metadata):
+                if index and extra_metadata:
+                    # 不再是第一個片段：清除舊的檔案資訊（值為 None 的鍵會被 Chroma 刪除）
+                    metadata.update(dict.fromkeys(extra_metadata))
+                moved.append((chunk_id, metadata))
+                if len(moved) >= batch_size:
+                    flush_moved()
+
+    if dry_run:
+        for _ in new_chunks():
+            pass
+    else:
+        # 先寫入新片段再刪除舊片段：中途失敗時頂多多出重複的片段，不會缺內容
+        stage = embeddings if isinstance(embeddings, EmbeddingStage) else EmbeddingStage(embeddings)
+        try:
+            # 每算好一批就寫入，不必等全部切分、算完
+            for batch, vectors in stage.iter_stream(new_chunks()):
+                collection.upsert(
+                    ids=[chunk_id for chunk_id, _, _ in batch],
+                    embeddings=vectors,
+                    documents=[text for _, _, text in batch],
+                    metadatas=[metadata for _, metadata, _ in batch],
+                )
+                if not first_write:
+                    first_write.append(time.perf_counter() - started)
+        finally:
+            if stage is not embeddings:
+                stage.close()
+    flush_moved()
+
+    vanished = [chunk_id for chunk_id in stored if chunk_id not in current]
+    vanished += [chunk_id for chunk_id in legacy if chunk_id not in stored]
+    if not dry_run:
+        for batch in _batches(vanished, batch_size):
+            collection.delete(ids=batch)
+        # 其他來源都沒有舊片段了才標記為目前的格式，之後不再掃描整個 collection
+        schema = {"ingest_schema": SCHEMA_VERSION} if migration is not None and not migration[1] else {}
+        if counts["added"] or counts["updated"] or vanished:
+            bump_version(collection, **schema)
+        elif schema:
+            update_collection_metadata(collection, **schema)
+
+    return {
+        "source": source,
+        **counts,
+        "deleted": len(vanished),
+        "unchanged": counts["chunks"] - counts["added"],
+        "first_write": first_write[0] if first_write else None,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def ingest_file(path: str, collection=None, embeddings=None, root: Optional[str] = None,
+                chunk_size: int = 500, chunk_overlap: int = 200) -> Dict[str, Any]:
+    """增量匯入一個文字檔（串流讀取與切分）"""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"檔案{path}不存在,請檢查路徑")
+    collection = collection if collection is not None else get_collection()
+    # 使用 1024 維度以匹配已存在的資料庫
+    embeddings = embeddings or FakeEmbeddings(size=1024)
+    chunks = iter_chunks(path, chunk_size, chunk_overlap)
+    return ingest_chunks(collection, source_key(path, root), chunks, embeddings, extra_metadata=file_metadata(path))
+
+
+def format_stats(stats: Dict[str, Any]) -> str:
+    first_write = f"，第一批寫入 {stats['first_write']:.2f} 秒" if stats.get("first_write") is not None else ""
+    return (f"📥 {stats['source']}：{stats['chunks']} 個片段，新增 {stats['added']}、"
+            f"刪除 {stats['deleted']}、未變更 {stats['unchanged']}"
+            f"（僅更新 metadata {stats['updated']}），{stats['seconds']:.2f} 秒{first_write}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="增量匯入文件到 Chroma 向量資料庫")
+    parser.add_argument("files", nargs="*", default=[DEFAULT_FILE], help="要匯入的文字檔")
+    parser.add_argument("--db", default=DEFAULT_DB, help="Chroma 資料庫目錄")
+    parser.add_argument("--collection", default=DEFAULT_COLLECTION, help="collection 名稱")
+    args = parser.parse_args()
+
+    collection = get_collection(args.db, args.collection)
+    with EmbeddingStage(factory=functools.partial(FakeEmbeddings, size=1024)) as stage:
+        for path in args.files:
+            print(format_stats(ingest_file(path, collection, stage)))
+        stats = stage.stats()
+    print(f"🧮 計算 {stats['computed']} 個 embedding，快取命中 {stats['cache_hits']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+串流式的文件讀取與切分
+以固定大小的區塊讀取檔案，邊讀邊切出片段並逐一回傳，不必先把整個檔案與所有片段載入記憶體；
+第一批片段切好後就能送去 embedding 與寫入 Chroma，多 GB 的語料記憶體用量也維持固定
+
+切分規則與 CharacterTextSplitter（separator="\\n\\n"）相同，同一份文件切出的片段（與雜湊）完全一致，
+改用串流切分不會讓已匯入的片段重新 embedding。每個片段附上在檔案中的字元位置 [start, end)
+（以換行統一為 \\n 後的文字計算），同樣內容的檔案每次切分得到的位置都相同
+"""
+
+import io
+from collections import deque
+from typing import Iterable, Iterator, NamedTuple, Tuple
+
+# 每次從檔案讀取的字元數
+DEFAULT_BLOCK_SIZE = 1 << 20
+
+
+class Chunk(NamedTuple):
+    text: str
+    start: int
+    end: int
+
+
+def iter_blocks(path: str, block_size: int = DEFAULT_BLOCK_SIZE, encoding: str = "utf-8") -> Iterator[str]:
+    """逐區塊讀取文字檔（與 TextLoader 相同，換行統一為 \\n）"""
+    with io.open(path, encoding=encoding) as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                return
+            yield block
+
+
+def iter_splits(blocks: Iterable[str], separator: str = "\n\n",
+                max_split: int = DEFAULT_BLOCK_SIZE) -> Iterator[Tuple[str, int]]:
+    """依分隔字串切開區塊串流，回傳 (段落, 開始位置)，略過空段落
+
+    跨區塊的段落會接起來；沒有分隔字串、超過 max_split 的超長段落直接切開，避免暫存無限增長
+    """
+    carry = ""
+    carry_start = 0
+    for block in blocks:
+        carry += block
+        pieces = carry.split(separator)
+        # 最後一段可能還沒結束，留到下一個區塊
+        carry = pieces.pop()
+        position = carry_start
+        for piece in pieces:
+            if piece:
+                yield piece, position
+            position += len(piece) + len(separator)
+        carry_start = position
+        if len(carry) > max_split:
+            # 保留結尾可能是分隔字串前半段的字元
+            split = len(carry) - len(separator) + 1
+            yield carry[:split], carry_start
+            carry, carry_start = carry[split:], carry_start + split
+    if carry:
+        yield carry, carry_start
+
+
+class StreamingSplitter:
+    """逐段合併成片段，規則與 CharacterTextSplitter 的 _merge_splits 相同"""
+
+    def __init__(self, chunk_size: int = 500, chunk_overlap: int = 200, separator: str = "\n\n",
+                 block_size: int = DEFAULT_BLOCK_SIZE):
+        if chunk_overlap > chunk_size:
+            raise ValueError(f"chunk_overlap（{chunk_overlap}）不可大於 chunk_size（{chunk_size}）")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separator = separator
+        self.block_size = block_size
+
+    def _join(self, current) -> Iterator[Chunk]:
+        """合併段落；位置為第一段的開頭到最後一段的結尾"""
+        text = self.separator.join(piece for piece, _ in current).strip()
+        if text:
+            last_piece, last_start = current[-1]
+            yield Chunk(text, current[0][1], last_start + len(last_piece))
+
+    def split_stream(self, blocks: Iterable[str]) -> Iterator[Chunk]:
+        """切分文字區塊串流"""
+        separator_len = len(self.separator)
+        current: deque = deque()
+        total = 0
+        for piece, start in iter_splits(blocks, self.separator, max(self.block_size, self.chunk_size)):
+            length = len(piece)
+            if total + length + (separator_len if current else 0) > self.chunk_size:
+                if current:
+                    yield from self._join(current)
+                    # 保留結尾不超過 chunk_overlap 的段落作為下一個片段的重疊部分
+                    while total > self.chunk_overlap or (
+                            total + length + (separator_len if current else 0) > self.chunk_size and total > 0):
+                        total -= len(current[0][0]) + (separator_len if len(current) > 1 else 0)
+                        current.popleft()
+            current.append((piece, start))
+            total += length + (separator_len if len(current) > 1 else 0)
+        if current:
+            yield from self._join(current)
+
+    def split_text(self, text: str) -> Iterator[Chunk]:
+        return self.split_stream([text])
+
+    def split_file(self, path: str, encoding: str = "utf-8") -> Iterator[Chunk]:
+        return self.split_stream(iter_blocks(path, self.block_size, encoding))
+
+
+def iter_chunks(path: str, chunk_size: int = 500, chunk_overlap: int = 200,
+                block_size: int = DEFAULT_BLOCK_SIZE, encoding: str = "utf-8") -> Iterator[Chunk]:
+    """逐一回傳檔案切出的片段"""
+    return StreamingSplitter(chunk_size, chunk_overlap, block_size=block_size).split_file(path, encoding)
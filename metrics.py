@@ -0,0 +1,444 @@
+"""
+Prometheus 格式的指標與請求追蹤
+翻譯與聊天的各個入口透過 track_request() 記錄請求數、延遲、首字延遲（TTFT）、
+prompt/completion token 數與錯誤，標籤為入口、模型與語言對；
+start_metrics_server() 會在本機提供 /metrics（Prometheus 文字格式）與 /traces（最近的請求追蹤，JSON）
+
+每個請求可以用 tracker.span("template_format" / "model_call" / "postprocess" 等) 量測各階段耗時，
+各階段的延遲分佈一律記錄在 llm_span_duration_seconds；
+設定 METRICS_TRACE=1 時還會保留最近 METRICS_TRACE_LIMIT（預設 200）個請求的完整追蹤
+
+環境變數：
+    METRICS_PORT         /metrics 服務的埠號（預設 9464，設為 0 表示不啟動）
+    METRICS_HOST         /metrics 服務的位址（預設 127.0.0.1）
+    METRICS_TRACE        設為 1 時保留每個請求的階段追蹤
+    METRICS_TRACE_LIMIT  保留的追蹤筆數（預設 200）
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from translation_engine import estimate_tokens
+
+DEFAULT_PORT = 9464
+# 延遲分佈的區間（秒），涵蓋快取命中到長文件翻譯
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+# ---------- 指標 ----------
+
+class _Metric:
+    """以標籤值組合為鍵的指標；標籤未提供時視為空字串"""
+
+    type = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    """只會增加的計數器"""
+
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+
+class Gauge(_Metric):
+    """可增可減的目前值（例如佇列長度）"""
+
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+
+class Histogram(_Metric):
+    """累積區間的分佈（bucket、sum、count）"""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [各區間計數, 總和, 次數]
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state[2] if state else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            # 複製一份，輸出時不必持有鎖
+            values = {key: [list(state[0]), state[1], state[2]] for key, state in self._values.items()}
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for key, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, ('le', _format_value(bound)))} "
+                             f"{cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, ('le', '+Inf'))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class Registry:
+    """指標的集合，負責輸出 Prometheus 文字格式"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, metric_type, name, help_text, labels, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_type(name, help_text, labels, **kwargs)
+            elif not isinstance(metric, metric_type) or metric.labels != tuple(labels):
+                raise ValueError(f"指標 {name} 已以不同的型別或標籤註冊")
+            return metric
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help_text, labels)
+
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, help_text, labels)
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, labels, buckets=buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+_REQUEST_LABELS = ("entry_point", "model", "lang_pair")
+
+REQUESTS = REGISTRY.counter("llm_requests_total", "模型請求數（status：ok、error、cached、cancelled、rejected）",
+                            _REQUEST_LABELS + ("status",))
+ERRORS = REGISTRY.counter("llm_errors_total", "模型請求錯誤數（依例外類型）", _REQUEST_LABELS + ("error_type",))
+LATENCY = REGISTRY.histogram("llm_request_duration_seconds", "請求總延遲（秒）", _REQUEST_LABELS + ("status",))
+TTFT = REGISTRY.histogram("llm_time_to_first_token_seconds", "首字延遲（秒）", _REQUEST_LABELS)
+PROMPT_TOKENS = REGISTRY.counter("llm_prompt_tokens_total", "prompt token 數（模型未回報時為估計值）",
+                                 _REQUEST_LABELS)
+COMPLETION_TOKENS = REGISTRY.counter("llm_completion_tokens_total", "completion token 數（模型未回報時為估計值）",
+                                     _REQUEST_LABELS)
+SPANS = REGISTRY.histogram("llm_span_duration_seconds", "請求各階段耗時（秒）", ("entry_point", "span"))
+
+
+# ---------- 請求追蹤 ----------
+
+_tracing = os.getenv("METRICS_TRACE", "0") not in ("", "0")
+_traces: deque = deque(maxlen=int(os.getenv("METRICS_TRACE_LIMIT", "200")))
+
+
+def set_tracing(enabled: bool):
+    """開啟或關閉每個請求的階段追蹤"""
+    global _tracing
+    _tracing = enabled
+
+
+def recent_traces() -> List[Dict[str, Any]]:
+    """最近的請求追蹤（舊到新）"""
+    return list(_traces)
+
+
+def _text_of(value) -> str:
+    """取出訊息、訊息串列或字串中的文字，用來估計 token 數"""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (list, tuple)):
+        return "\n".join(_text_of(item) for item in value)
+    content = getattr(value, "content", value)
+    if isinstance(content, list):
+        return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+    return str(content)
+
+
+class RequestTracker:
+    """單一請求的量測；由 track_request() 建立，結束時寫入指標"""
+
+    def __init__(self, entry_point: str, model: str, lang_pair: str = ""):
+        self.entry_point = entry_point
+        self.model = model
+        self.lang_pair = lang_pair
+        self.status = "ok"
+        self.ttft: Optional[float] = None
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._usage_reported = False
+        self._started = time.perf_counter()
+        self._started_at = time.time()
+        self._spans: Optional[List[Dict[str, Any]]] = [] if _tracing else None
+        self._lock = threading.Lock()
+        self._finished = False
+
+    def _labels(self) -> Dict[str, str]:
+        return {"entry_point": self.entry_point, "model": self.model, "lang_pair": self.lang_pair}
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """量測一個階段；串流時包住整個迴圈也會計入下游處理的時間"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - started
+            SPANS.observe(duration, entry_point=self.entry_point, span=name)
+            if self._spans is not None:
+                with self._lock:
+                    self._spans.append({"name": name, "offset": started - self._started, "duration": duration})
+
+    def first_token(self):
+        """記錄第一段輸出出現的時間（只有第一次呼叫有效）"""
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self._started
+
+    def record_usage(self, message) -> bool:
+        """累加模型回報的 token 用量（AIMessage / AIMessageChunk 的 usage_metadata）"""
+        usage = getattr(message, "usage_metadata", None)
+        if not usage:
+            return False
+        with self._lock:
+            self.prompt_tokens += usage.get("input_tokens", 0)
+            self.completion_tokens += usage.get("output_tokens", 0)
+            self._usage_reported = True
+        return True
+
+    def estimate_usage(self, prompt, completion):
+        """模型沒有回報用量時（例如 OllamaLLM 只回傳字串）改用估計值"""
+        if self._usage_reported:
+            return
+        with self._lock:
+            self.prompt_tokens += estimate_tokens(_text_of(prompt))
+            self.completion_tokens += estimate_tokens(_text_of(completion))
+
+    def error(self, exc: Union[BaseException, str]):
+        """計入一個錯誤，但不改變整個請求的狀態（例如批次中的單筆失敗）；exc 也可以是錯誤類型名稱"""
+        error_type = exc if isinstance(exc, str) else type(exc).__name__
+        ERRORS.inc(**self._labels(), error_type=error_type)
+
+    def fail(self, exc: Union[BaseException, str]):
+        """計入錯誤並將請求標記為失敗"""
+        self.error(exc)
+        self.status = "error"
+
+    def reject(self, exc: Union[BaseException, str]):
+        """計入錯誤並將請求標記為因過載而被拒絕"""
+        self.error(exc)
+        self.status = "rejected"
+
+    def finish(self):
+        """寫入指標（只會執行一次）"""
+        if self._finished:
+            return
+        self._finished = True
+        duration = time.perf_counter() - self._started
+        labels = self._labels()
+        REQUESTS.inc(**labels, status=self.status)
+        LATENCY.observe(duration, **labels, status=self.status)
+        if self.ttft is not None and self.status != "cached":
+            TTFT.observe(self.ttft, **labels)
+        if self.prompt_tokens:
+            PROMPT_TOKENS.inc(self.prompt_tokens, **labels)
+        if self.completion_tokens:
+            COMPLETION_TOKENS.inc(self.completion_tokens, **labels)
+        if self._spans is not None:
+            _traces.append({**labels, "status": self.status, "started_at": self._started_at,
+                            "duration": duration, "ttft": self.ttft,
+                            "prompt_tokens": self.prompt_tokens, "completion_tokens": self.completion_tokens,
+                            "spans": self._spans})
+
+
+class _NullTracker(RequestTracker):
+    """不記錄任何東西的 tracker，讓內部函式不必判斷是否有傳入 tracker"""
+
+    def __init__(self):
+        super().__init__("", "")
+        self._spans = None
+        self._finished = True
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        yield
+
+    def record_usage(self, message) -> bool:
+        return False
+
+    def estimate_usage(self, prompt, completion):
+        pass
+
+    def first_token(self):
+        pass
+
+    def error(self, exc: Union[BaseException, str]):
+        pass
+
+    def fail(self, exc: Union[BaseException, str]):
+        pass
+
+    def reject(self, exc: Union[BaseException, str]):
+        pass
+
+
+NULL_TRACKER = _NullTracker()
+
+
+@contextmanager
+def track_request(entry_point: str, model: str, lang_pair: str = "") -> Iterator[RequestTracker]:
+    """量測一個請求；區塊內拋出的例外會計為錯誤，產生器被提前關閉則計為 cancelled"""
+    tracker = RequestTracker(entry_point, model, lang_pair)
+    try:
+        yield tracker
+    except Exception as e:
+        tracker.fail(e)
+        raise
+    except BaseException:
+        # GeneratorExit（使用者停止串流）或 asyncio.CancelledError
+        if tracker.status == "ok":
+            tracker.status = "cancelled"
+        raise
+    finally:
+        tracker.finish()
+
+
+def lang_pair(source: str, target: str) -> str:
+    return f"{source}->{target}"
+
+
+# ---------- /metrics 服務 ----------
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body: str, content_type: str, status: int = 200):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/metrics":
+            self._send(REGISTRY.render(), "text/plain; version=0.0.4; charset=utf-8")
+        elif path == "/traces":
+            self._send(json.dumps({"enabled": _tracing, "traces": recent_traces()}, ensure_ascii=False),
+                       "application/json; charset=utf-8")
+        else:
+            self._send("not found\n", "text/plain; charset=utf-8", 404)
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: Optional[int] = None, host: Optional[str] = None) -> Optional[ThreadingHTTPServer]:
+    """在背景執行緒啟動 /metrics 服務（每個行程只啟動一次），埠號被占用時只顯示警告"""
+    global _server
+    if port is None:
+        port = int(os.getenv("METRICS_PORT", str(DEFAULT_PORT)))
+    if port <= 0:
+        return None
+    host = host or os.getenv("METRICS_HOST", "127.0.0.1")
+    with _server_lock:
+        if _server is not None:
+            return _server
+        try:
+            server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError as e:
+            print(f"⚠️ 無法啟動指標服務 {host}:{port}：{e}")
+            return None
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        _server = server
+    print(f"📈 指標：http://{host}:{server.server_address[1]}/metrics")
+    return server
@@ -0,0 +1,79 @@
+"""
+延遲載入的模型註冊表
+第一次使用某個模型時才匯入對應的套件並建立 client，之後重複使用同一個實例
+"""
+
+import importlib
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional
+
+
+class ModelRegistry:
+    """以名稱管理模型，匯入與建立都延遲到第一次 get()"""
+
+    def __init__(self, specs: Optional[Dict[str, Dict[str, Any]]] = None):
+        # specs: {顯示名稱: {"module": 模組路徑, "class": 類別或工廠函式名稱, "kwargs": 建構參數}}
+        self._specs = dict(specs or {})
+        self._instances = {}
+        self._timings = {}
+        self._locks = {name: threading.Lock() for name in self._specs}
+        self._registry_lock = threading.Lock()
+
+    def register(self, name: str, module: str, class_name: str, **kwargs):
+        """註冊一個模型（不會立即匯入或建立）"""
+        with self._registry_lock:
+            self._specs[name] = {"module": module, "class": class_name, "kwargs": kwargs}
+            self._locks.setdefault(name, threading.Lock())
+            self._instances.pop(name, None)
+
+    def keys(self):
+        return list(self._specs.keys())
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._specs
+
+    def __len__(self) -> int:
+        return len(self._specs)
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._instances
+
+    def get(self, name: str, default=None):
+        """取得模型實例，未註冊時回傳 default；匯入或建立失敗時拋出 RuntimeError"""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        if name not in self._specs:
+            return default
+
+        with self._locks[name]:
+            # 其他執行緒可能已經建立好
+            instance = self._instances.get(name)
+            if instance is not None:
+                return instance
+
+            spec = self._specs[name]
+            try:
+                started = time.perf_counter()
+                module = importlib.import_module(spec["module"])
+                imported = time.perf_counter()
+                instance = getattr(module, spec["class"])(**spec["kwargs"])
+                constructed = time.perf_counter()
+            except Exception as e:
+                raise RuntimeError(f"無法初始化模型 {name}：{e}") from e
+
+            self._timings[name] = {
+                "import": imported - started,
+                "construct": constructed - imported,
+            }
+            self._instances[name] = instance
+            print(f"⚙️ 已載入 {name}：匯入 {imported - started:.2f} 秒、建立 {constructed - imported:.3f} 秒")
+            return instance
+
+    def timings(self) -> Dict[str, Dict[str, float]]:
+        """各模型的匯入/建立耗時（只包含已載入的模型）"""
+        return {name: dict(timing) for name, timing in self._timings.items()}
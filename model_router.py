@@ -0,0 +1,208 @@
+"""
+多後端路由
+記錄每個後端最近的延遲與錯誤率，把請求送到最快且健康的後端；
+主要後端超過其 p95 延遲仍未回應時，對次佳後端發出對沖（hedged）請求，取最先成功者並取消另一個
+
+延遲依指標分開記錄：串流請求記錄第一段輸出的時間（ttft），完整回應的請求（atranslate）記錄總耗時（total），
+兩者的分布差很多，混在同一個視窗會讓 p50 排名與 p95 對沖延遲都失真
+"""
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+AUTO_MODEL = "Auto（自動選擇）"
+METRICS = ("ttft", "total")
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    """最近秩法計算百分位數"""
+    index = max(0, min(len(sorted_values) - 1, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class BackendStats:
+    """單一後端的滾動延遲與錯誤紀錄"""
+
+    def __init__(self, window: int):
+        self.latencies = {metric: deque(maxlen=window) for metric in METRICS}
+        self.outcomes = deque(maxlen=window)
+        self.last_failure = 0.0
+
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def samples(self, metric: str = "ttft") -> int:
+        return len(self.latencies[metric])
+
+    def percentile(self, q: float, metric: str = "ttft") -> Optional[float]:
+        if not self.latencies[metric]:
+            return None
+        return _percentile(sorted(self.latencies[metric]), q)
+
+
+class LatencyRouter:
+    """依 p50 延遲與錯誤率選擇後端，並支援對沖請求"""
+
+    def __init__(self, backends: List[str], window: int = 100, max_error_rate: float = 0.5,
+                 min_samples: int = 3, cooldown: float = 30.0, hedge: bool = True,
+                 default_hedge_delay: float = 0.5):
+        self.backends = list(backends)
+        self.window = window
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.hedge = hedge
+        self.default_hedge_delay = default_hedge_delay
+        self._stats = {name: BackendStats(window) for name in self.backends}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, latency: float, ok: bool, metric: str = "ttft"):
+        """記錄一次請求結果；latency 為 metric 指定的延遲（ttft：第一段輸出，total：完整回應）"""
+        with self._lock:
+            stats = self._stats.setdefault(name, BackendStats(self.window))
+            stats.outcomes.append(ok)
+            if ok:
+                stats.latencies[metric].append(latency)
+            else:
+                stats.last_failure = time.monotonic()
+
+    def record_cancelled(self, name: str, elapsed: float, metric: str = "ttft"):
+        """記錄被取消（落敗）的請求：這是設限（censored）樣本，只知道延遲至少有 elapsed
+
+        已超過該後端的對沖延遲（p95，樣本不足時為預設值）仍未回應時視為逾時，計入錯誤率並以 elapsed 作為延遲下限；
+        還沒到期限就被取消時沒有提供任何資訊，不記錄
+        """
+        if elapsed < self.hedge_delay(name, metric):
+            return
+        with self._lock:
+            stats = self._stats.setdefault(name, BackendStats(self.window))
+            stats.outcomes.append(False)
+            stats.latencies[metric].append(elapsed)
+            stats.last_failure = time.monotonic()
+
+    def _healthy(self, stats: BackendStats, now: float) -> bool:
+        if len(stats.outcomes) < self.min_samples or stats.error_rate() <= self.max_error_rate:
+            return True
+        # 錯誤率過高的後端在冷卻時間過後允許一次試探
+        return now - stats.last_failure >= self.cooldown
+
+    def ranked(self, metric: str = "ttft") -> List[str]:
+        """依 metric 的 p50 排序後的後端清單：最快的健康後端在最前面，其次是需要試探的後端（樣本不足或冷卻中，
+        作為對沖請求試用並收集資料），再來是其他健康後端，不健康的排在最後；都沒有樣本時依註冊順序"""
+        now = time.monotonic()
+        with self._lock:
+            healthy, probes, unhealthy = [], [], []
+            for name in self.backends:
+                stats = self._stats[name]
+                if not self._healthy(stats, now):
+                    unhealthy.append(name)
+                elif stats.samples(metric) < self.min_samples or stats.error_rate() > self.max_error_rate:
+                    # 樣本不足，或錯誤率過高但冷卻時間已過：只作為對沖請求試探
+                    probes.append(name)
+                else:
+                    healthy.append(name)
+            healthy.sort(key=lambda name: self._stats[name].percentile(0.5, metric))
+            unhealthy.sort(key=lambda name: self._stats[name].percentile(0.5, metric) or 0.0)
+            return healthy[:1] + probes + healthy[1:] + unhealthy
+
+    def choose(self, metric: str = "ttft") -> str:
+        """選出目前最適合的後端"""
+        return self.ranked(metric)[0]
+
+    def hedge_delay(self, name: str, metric: str = "ttft") -> float:
+        """對沖延遲：該後端在 metric 上的 p95，樣本不足時用預設值"""
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None or stats.samples(metric) < self.min_samples:
+                return self.default_hedge_delay
+            return stats.percentile(0.95, metric)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """各後端的 p50/p95（第一段輸出）、total_p50/total_p95（完整回應）、錯誤率與健康狀態"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                name: {
+                    "p50": stats.percentile(0.5),
+                    "p95": stats.percentile(0.95),
+                    "total_p50": stats.percentile(0.5, "total"),
+                    "total_p95": stats.percentile(0.95, "total"),
+                    "error_rate": stats.error_rate(),
+                    "samples": len(stats.outcomes),
+                    "healthy": self._healthy(stats, now),
+                }
+                for name, stats in self._stats.items()
+            }
+
+    async def race(self, start: Callable[[str], Awaitable[Any]],
+                   on_discard: Optional[Callable[[Any], Awaitable[None]]] = None,
+                   metric: str = "ttft") -> Tuple[str, Any]:
+        """依排名呼叫 start(後端名稱)，回傳 (勝出的後端, 結果)
+
+        metric 說明 start 完成代表什麼：ttft 為取得第一段輸出，total 為完整回應；排名、對沖延遲與紀錄都使用同一個指標
+
+        - 主要後端在 hedge_delay 內沒有結果時，對次佳後端送出一個對沖請求
+        - 任一請求失敗時立即改用下一個後端
+        - 取得第一個成功結果後取消其餘請求；已完成但落敗的結果交給 on_discard 清理
+        """
+        order = self.ranked(metric)
+        pending = {}
+        errors = []
+        next_index = 0
+
+        def launch():
+            nonlocal next_index
+            name = order[next_index]
+            next_index += 1
+            pending[asyncio.ensure_future(start(name))] = (name, time.perf_counter())
+            return name
+
+        last_launched = launch()
+        hedged = False
+        try:
+            while pending:
+                can_hedge = self.hedge and not hedged and next_index < len(order)
+                timeout = self.hedge_delay(last_launched, metric) if can_hedge else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # 主要後端太慢：送出對沖請求
+                    hedged = True
+                    last_launched = launch()
+                    continue
+
+                winner = None
+                failures = 0
+                for task in done:
+                    name, started = pending.pop(task)
+                    elapsed = time.perf_counter() - started
+                    if task.exception() is not None:
+                        self.record(name, elapsed, False, metric)
+                        errors.append(f"{name}: {task.exception()}")
+                        failures += 1
+                        continue
+                    if winner is None:
+                        self.record(name, elapsed, True, metric)
+                        winner = (name, task.result())
+                    elif on_discard is not None:
+                        await on_discard(task.result())
+
+                if winner is not None:
+                    # 落敗而被取消的請求不算成功：逾時的計入錯誤率，讓從不回應的後端會被判定為不健康
+                    now = time.perf_counter()
+                    for name, started in pending.values():
+                        self.record_cancelled(name, now - started, metric)
+                    return winner
+                # 失敗的請求由下一個後端接手
+                for _ in range(failures):
+                    if next_index < len(order):
+                        last_launched = launch()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        raise RuntimeError("所有後端都無法完成請求：" + "；".join(errors))
@@ -0,0 +1,283 @@
+"""
+共用的 Ollama 連線池
+所有模組透過這裡取得 ChatOllama / OllamaLLM，底層共用同一組 httpx 連線池（keep-alive），
+可限制對 Ollama 伺服器的連線數，並提供使用中/閒置連線數與等待時間等統計
+
+環境變數：
+    OLLAMA_URL              Ollama 伺服器位址（預設 http://localhost:11434）
+    OLLAMA_POOL_SIZE        最大連線數（預設 8）
+    OLLAMA_KEEPALIVE        閒置連線保留秒數（預設 60）
+    OLLAMA_TIMEOUT          讀取逾時秒數（預設 300）
+    OLLAMA_CONNECT_TIMEOUT  建立連線逾時秒數（預設 5）
+    OLLAMA_POOL_TIMEOUT     等待可用連線的逾時秒數（預設 60）
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+import httpx
+
+DEFAULT_BASE_URL = "http://localhost:11434"
+
+
+class PoolStats:
+    """連線池統計：使用中、等待中的請求數與等待時間"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.waiting = 0
+        self.requests = 0
+        self.acquired_count = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._recent_waits = deque(maxlen=1000)
+
+    def begin(self) -> Dict[str, Any]:
+        with self._lock:
+            self.waiting += 1
+            self.requests += 1
+        return {"started": time.perf_counter(), "acquired": False, "finished": False}
+
+    def acquired(self, state: Dict[str, Any]):
+        """第一個 trace 事件出現代表已經拿到連線"""
+        wait = time.perf_counter() - state["started"]
+        with self._lock:
+            if state["acquired"] or state["finished"]:
+                return
+            state["acquired"] = True
+            self.waiting -= 1
+            self.in_use += 1
+            self.acquired_count += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self._recent_waits.append(wait)
+
+    def finish(self, state: Dict[str, Any]):
+        with self._lock:
+            if state["finished"]:
+                return
+            state["finished"] = True
+            if state["acquired"]:
+                self.in_use -= 1
+            else:
+                self.waiting -= 1
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            waits = sorted(self._recent_waits)
+            return {
+                "in_use": self.in_use,
+                "waiting": self.waiting,
+                "requests": self.requests,
+                "avg_wait": self.total_wait / self.acquired_count if self.acquired_count else 0.0,
+                "p95_wait": waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0,
+                "max_wait": self.max_wait,
+            }
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """回應串流關閉時才釋放連線計數（串流回應在讀完之前都佔用連線）"""
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+class _PooledTransport(httpx.HTTPTransport):
+    """記錄等待時間與使用中連線數的同步 transport"""
+
+    def __init__(self, stats: PoolStats, **kwargs):
+        super().__init__(**kwargs)
+        self._stats = stats
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        state = self._stats.begin()
+        original_trace = request.extensions.get("trace")
+
+        def trace(event_name, info):
+            self._stats.acquired(state)
+            if original_trace is not None:
+                original_trace(event_name, info)
+
+        request.extensions = {**request.extensions, "trace": trace}
+        try:
+            response = super().handle_request(request)
+        except BaseException:
+            self._stats.finish(state)
+            raise
+        response.stream = _ReleasingStream(response.stream, lambda: self._stats.finish(state))
+        return response
+
+    def idle_connections(self) -> int:
+        pool = getattr(self, "_pool", None)
+        return sum(1 for connection in getattr(pool, "connections", []) if connection.is_idle())
+
+
+class _AsyncPooledTransport(httpx.AsyncHTTPTransport):
+    """非同步版本（httpcore 的非同步 trace 回呼必須是 coroutine）"""
+
+    def __init__(self, stats: PoolStats, **kwargs):
+        super().__init__(**kwargs)
+        self._stats = stats
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        state = self._stats.begin()
+        original_trace = request.extensions.get("trace")
+
+        async def trace(event_name, info):
+            self._stats.acquired(state)
+            if original_trace is not None:
+                await original_trace(event_name, info)
+
+        request.extensions = {**request.extensions, "trace": trace}
+        try:
+            response = await super().handle_async_request(request)
+        except BaseException:
+            self._stats.finish(state)
+            raise
+        response.stream = _AsyncReleasingStream(response.stream, lambda: self._stats.finish(state))
+        return response
+
+    def idle_connections(self) -> int:
+        pool = getattr(self, "_pool", None)
+        return sum(1 for connection in getattr(pool, "connections", []) if connection.is_idle())
+
+
+class OllamaPool:
+    """同一個 Ollama 伺服器的共用連線池與模型快取"""
+
+    def __init__(self, base_url: str = DEFAULT_BASE_URL, max_connections: int = 8,
+                 keepalive_expiry: float = 60.0, timeout: float = 300.0,
+                 connect_timeout: float = 5.0, pool_timeout: float = 60.0):
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout, pool=pool_timeout)
+
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._sync_stats = PoolStats()
+        self._async_stats = PoolStats()
+        self._transport = _PooledTransport(self._sync_stats, limits=limits)
+        self._async_transport = _AsyncPooledTransport(self._async_stats, limits=limits)
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _client_kwargs(self) -> Dict[str, Any]:
+        return {
+            "sync_client_kwargs": {"transport": self._transport, "timeout": self.timeout},
+            "async_client_kwargs": {"transport": self._async_transport, "timeout": self.timeout},
+        }
+
+    def _get(self, kind: str, model: str, **kwargs):
+        key = (kind, model, repr(sorted(kwargs.items())))
+        with self._lock:
+            instance = self._models.get(key)
+            if instance is None:
+                if kind == "chat":
+                    from langchain_ollama import ChatOllama as model_class
+                else:
+                    from langchain_ollama import OllamaLLM as model_class
+                instance = model_class(model=model, base_url=self.base_url,
+                                       **self._client_kwargs(), **kwargs)
+                self._models[key] = instance
+            return instance
+
+    def chat(self, model: str, **kwargs):
+        """取得共用連線池的 ChatOllama（相同參數重複使用同一個實例）"""
+        return self._get("chat", model, **kwargs)
+
+    def llm(self, model: str, **kwargs):
+        """取得共用連線池的 OllamaLLM"""
+        return self._get("llm", model, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        """連線池統計：同步與非同步各自的使用中/閒置連線數與等待時間"""
+        sync_stats = self._sync_stats.snapshot()
+        sync_stats["idle"] = self._transport.idle_connections()
+        async_stats = self._async_stats.snapshot()
+        async_stats["idle"] = self._async_transport.idle_connections()
+        return {
+            "base_url": self.base_url,
+            "max_connections": self.max_connections,
+            "sync": sync_stats,
+            "async": async_stats,
+        }
+
+    def close(self):
+        self._transport.close()
+
+
+_pools: Dict[str, OllamaPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(base_url: Optional[str] = None) -> OllamaPool:
+    """取得（或建立）指定伺服器的共用連線池，設定來自環境變數"""
+    base_url = base_url or os.getenv("OLLAMA_URL", DEFAULT_BASE_URL)
+    with _pools_lock:
+        pool = _pools.get(base_url)
+        if pool is None:
+            pool = OllamaPool(
+                base_url,
+                max_connections=int(os.getenv("OLLAMA_POOL_SIZE", "8")),
+                keepalive_expiry=float(os.getenv("OLLAMA_KEEPALIVE", "60")),
+                timeout=float(os.getenv("OLLAMA_TIMEOUT", "300")),
+                connect_timeout=float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5")),
+                pool_timeout=float(os.getenv("OLLAMA_POOL_TIMEOUT", "60")),
+            )
+            _pools[base_url] = pool
+        return pool
+
+
+def get_ollama_chat(model: str, base_url: Optional[str] = None, **kwargs):
+    """取得使用共用連線池的 ChatOllama"""
+    return get_pool(base_url).chat(model, **kwargs)
+
+
+def get_ollama_llm(model: str, base_url: Optional[str] = None, **kwargs):
+    """取得使用共用連線池的 OllamaLLM"""
+    return get_pool(base_url).llm(model, **kwargs)
+
+
+def format_pool_stats(stats: Dict[str, Any]) -> str:
+    """將連線池統計轉為 Markdown 文字"""
+    lines = [f"**Ollama 連線池**（{stats['base_url']}，上限 {stats['max_connections']}）"]
+    for label, key in (("同步", "sync"), ("非同步", "async")):
+        item = stats[key]
+        lines.append(
+            f"- {label}：使用中 {item['in_use']}、閒置 {item['idle']}、等待中 {item['waiting']}，"
+            f"平均等待 {item['avg_wait'] * 1000:.1f} ms（p95 {item['p95_wait'] * 1000:.1f} ms）"
+        )
+    return "\n".join(lines)
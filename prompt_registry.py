@@ -0,0 +1,72 @@
+"""
+提示模板註冊表
+每個模板在行程內只解析一次，並預先代入固定的變數（例如語言對），
+每次請求只需要代入剩下的變數（例如 text）
+"""
+
+from functools import lru_cache
+from string import Formatter
+from typing import List, Tuple
+
+
+class CompiledPrompt:
+    """已解析並代入固定變數的提示模板"""
+
+    def __init__(self, template: str, **static_vars):
+        # pieces：字串為固定內容，tuple 為 (變數名稱, 轉換, 格式)
+        pieces = []
+        literal = []
+        for text, field, spec, conversion in Formatter().parse(template):
+            literal.append(text)
+            if field is None:
+                continue
+            if field in static_vars:
+                literal.append(self._render(static_vars[field], conversion, spec))
+                continue
+            pieces.append("".join(literal))
+            literal = []
+            pieces.append((field, conversion, spec))
+        pieces.append("".join(literal))
+
+        self.template = template
+        self.static_vars = dict(static_vars)
+        self._pieces = [piece for piece in pieces if piece != ""]
+        self.input_variables = sorted({piece[0] for piece in self._pieces if isinstance(piece, tuple)})
+
+    @staticmethod
+    def _render(value, conversion, spec) -> str:
+        if conversion == "r":
+            value = repr(value)
+        elif conversion == "s":
+            value = str(value)
+        elif conversion == "a":
+            value = ascii(value)
+        return format(value, spec or "")
+
+    def format(self, **kwargs) -> str:
+        """代入剩下的變數，回傳提示字串"""
+        return "".join(
+            piece if isinstance(piece, str) else self._render(kwargs[piece[0]], piece[1], piece[2])
+            for piece in self._pieces
+        )
+
+    def format_messages(self, **kwargs) -> List:
+        """回傳與 ChatPromptTemplate.from_template(...).format_messages(...) 相同的訊息串列"""
+        from langchain_core.messages import HumanMessage
+
+        return [HumanMessage(content=self.format(**kwargs))]
+
+
+@lru_cache(maxsize=1024)
+def _compile(template: str, static_items: Tuple[Tuple[str, str], ...]) -> CompiledPrompt:
+    return CompiledPrompt(template, **dict(static_items))
+
+
+def get_prompt(template: str, **static_vars) -> CompiledPrompt:
+    """取得已編譯的提示模板（同一模板與固定變數組合只編譯一次）"""
+    return _compile(template, tuple(sorted(static_vars.items())))
+
+
+def cache_info():
+    """編譯快取的命中統計"""
+    return _compile.cache_info()
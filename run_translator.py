@@ -2,23 +2,26 @@
 """
 AI 翻譯機器人啟動腳本
 提供兩個版本選擇：完整版和簡化版
+另有非互動的批次翻譯子指令：
+    python run_translator.py batch catalog.jsonl catalog.zh.jsonl --target 繁體中文
 """
 
+import argparse
 import sys
 import subprocess
 import os
+import importlib.util
 
 def check_dependencies():
-    """檢查必要的依賴項"""
-    try:
-        import gradio
-        import langchain_ollama
-        print("✅ 所有依賴項已安裝")
-        return True
-    except ImportError as e:
-        print(f"❌ 缺少依賴項：{e}")
+    """檢查必要的依賴項（只確認套件存在，不實際匯入，避免拖慢啟動）"""
+    missing = [name for name in ("gradio", "langchain_ollama")
+               if importlib.util.find_spec(name) is None]
+    if missing:
+        print(f"❌ 缺少依賴項：{', '.join(missing)}")
         print("請執行：pip install -r requirements.txt")
         return False
+    print("✅ 所有依賴項已安裝")
+    return True
 
 def run_full_version():
     """運行完整版翻譯機器人"""
@@ -51,8 +54,61 @@ def run_simple_version():
     except Exception as e:
         print(f"❌ 啟動失敗：{e}")
 
+def run_batch_version(args):
+    """執行批次翻譯（非互動）"""
+    from batch_translator import run_batch
+
+    print(f"📦 批次翻譯 {args.input} → {args.output}")
+    try:
+        stats = run_batch(
+            args.input,
+            args.output,
+            source_lang=args.source,
+            target_lang=args.target,
+            model_name=args.model,
+            temperature=args.temperature,
+            field=args.field,
+            batch_size=args.batch_size,
+            max_concurrency=args.max_concurrency,
+            resume=not args.no_resume,
+            use_async=args.use_async
+        )
+    except KeyboardInterrupt:
+        print("\n⏸️ 已中斷，下次執行相同指令會從檢查點繼續")
+        return 130
+    except Exception as e:
+        print(f"❌ 批次翻譯失敗：{e}")
+        return 1
+
+    print(f"✅ 完成：共 {stats['records']} 筆，成功 {stats['translated']}、"
+          f"失敗 {stats['failed']}、略過 {stats['skipped']}，耗時 {stats['elapsed']:.1f} 秒")
+    return 0 if stats["failed"] == 0 else 2
+
+def build_parser():
+    """建立命令列參數解析器"""
+    parser = argparse.ArgumentParser(description="AI 智能翻譯機器人")
+    subparsers = parser.add_subparsers(dest="command")
+
+    batch = subparsers.add_parser("batch", help="批次翻譯 JSONL / CSV / PO 檔案")
+    batch.add_argument("input", help="輸入檔（.jsonl / .csv / .po）")
+    batch.add_argument("output", help="輸出檔（.jsonl / .csv / .po）")
+    batch.add_argument("--source", default="English", help="來源語言（預設 English）")
+    batch.add_argument("--target", default="繁體中文", help="目標語言（預設 繁體中文）")
+    batch.add_argument("--model", default="Ollama (Gemma3:1b)", help="模型名稱（同完整版的選單）")
+    batch.add_argument("--temperature", type=float, default=0.0, help="創意度（預設 0）")
+    batch.add_argument("--field", help="要翻譯的欄位（JSONL/CSV 預設 text，PO 為 msgid）")
+    batch.add_argument("--batch-size", type=int, default=32, help="每批紀錄數（預設 32）")
+    batch.add_argument("--max-concurrency", type=int, default=8, help="同時送出的請求數（預設 8）")
+    batch.add_argument("--no-resume", action="store_true", help="忽略檢查點，從頭開始")
+    batch.add_argument("--async", dest="use_async", action="store_true", help="使用 abatch 非同步翻譯")
+    return parser
+
 def main():
     """主選單"""
+    args = build_parser().parse_args()
+    if args.command == "batch":
+        sys.exit(run_batch_version(args))
+
     print("=" * 60)
     print("🌍 AI 智能翻譯機器人")
     print("=" * 60)
@@ -1,36 +1,60 @@
 import gradio as gr
-from langchain_ollama import ChatOllama
-from langchain.prompts import ChatPromptTemplate
+from functools import lru_cache
 from dotenv import load_dotenv
 import os
 
+from admission import Overloaded, admission_for
+from metrics import lang_pair, start_metrics_server, track_request
+from prompt_registry import get_prompt
+
 # 載入環境變數
 load_dotenv()
 
-def translate_text(text, source_lang, target_lang):
-    """簡化版翻譯函數"""
-    if not text.strip():
-        return "請輸入要翻譯的文本。"
-    
-    try:
-        # 使用 Ollama 模型
-        model = ChatOllama(model="gemma3:1b", base_url="http://localhost:11434")
-        
-        # 翻譯提示模板
-        template = f"""
+# 翻譯提示模板
+TRANSLATION_TEMPLATE = """
 你是一位專業的{target_lang}翻譯家。
 請將以下{source_lang}文本翻譯成{target_lang}，保持原文的語氣和風格。
 
 {source_lang}文本：{text}
 {target_lang}翻譯：
 """
-        
-        # 執行翻譯
-        response = model.invoke(template)
-        return response.content if hasattr(response, 'content') else str(response)
-        
-    except Exception as e:
-        return f"翻譯錯誤：{str(e)}"
+
+@lru_cache(maxsize=1)
+def get_model():
+    """取得共用連線池中的 Ollama 模型（第一次呼叫時才建立）"""
+    from ollama_pool import get_ollama_chat
+    return get_ollama_chat("gemma3:1b")
+
+def translate_text(text, source_lang, target_lang):
+    """簡化版翻譯函數"""
+    if not text.strip():
+        return "請輸入要翻譯的文本。"
+    
+    with track_request("simple_translator", "gemma3:1b", lang_pair(source_lang, target_lang)) as tracker:
+        try:
+            # 使用 Ollama 模型
+            model = get_model()
+            
+            # 取得已編譯的提示模板，只代入要翻譯的文本
+            with tracker.span("template_format"):
+                prompt = get_prompt(TRANSLATION_TEMPLATE, source_lang=source_lang, target_lang=target_lang)
+                prompt_text = prompt.format(text=text)
+            
+            # 執行翻譯
+            with tracker.span("model_call"), admission_for(model).admit():
+                response = model.invoke(prompt_text)
+            with tracker.span("postprocess"):
+                translated = response.content if hasattr(response, 'content') else str(response)
+                if not tracker.record_usage(response):
+                    tracker.estimate_usage(prompt_text, translated)
+            return translated
+            
+        except Overloaded as e:
+            tracker.reject(e)
+            return str(e)
+        except Exception as e:
+            tracker.fail(e)
+            return f"翻譯錯誤：{str(e)}"
 
 def create_simple_interface():
     """創建簡化版翻譯介面"""
@@ -100,5 +124,9 @@ def create_simple_interface():
 
 if __name__ == "__main__":
     print("🚀 啟動簡化版 AI 翻譯機器人...")
+    start_metrics_server()
     interface = create_simple_interface()
+    # 同時處理的請求數與 Gradio 佇列長度；模型呼叫另外由 admission.py 控制
+    interface.queue(default_concurrency_limit=int(os.getenv("TRANSLATOR_CONCURRENCY", "16")),
+                    max_size=int(os.getenv("TRANSLATOR_QUEUE_SIZE", "64")))
     interface.launch(server_name="127.0.0.1", server_port=7861)
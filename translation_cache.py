@@ -0,0 +1,177 @@
+"""
+翻譯記憶（Translation Memory）快取
+兩層結構：行程內 LRU + SQLite 磁碟層，重複的文本不必再呼叫一次 LLM
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "translation_memory.sqlite3")
+
+
+def normalize_text(text: str) -> str:
+    """正規化文本：統一 Unicode 形式與換行，去除行尾空白（保留換行格式）"""
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+    return "\n".join(line.rstrip() for line in text.strip().split("\n"))
+
+
+def template_hash(template: str) -> str:
+    """計算提示模板的雜湊值，模板一改快取就自動失效"""
+    return hashlib.sha1(template.encode("utf-8")).hexdigest()[:16]
+
+
+def make_cache_key(text: str, source_lang: str, target_lang: str,
+                   model_name: str, temperature: float, template_digest: str) -> str:
+    """以 (正規化文本, 語言對, 模型, 溫度, 模板雜湊) 建立快取鍵"""
+    parts = [
+        normalize_text(text),
+        source_lang,
+        target_lang,
+        model_name,
+        f"{float(temperature):.2f}",
+        template_digest,
+    ]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class TranslationMemory:
+    """兩層翻譯記憶：記憶體 LRU 在前，SQLite 在後"""
+
+    def __init__(self, db_path: Optional[str] = DEFAULT_DB_PATH, max_memory_entries: int = 1024,
+                 max_disk_entries: int = 100_000, ttl_seconds: Optional[float] = 7 * 24 * 3600):
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._memory = OrderedDict()  # key -> (translation, created_at)
+        self._lock = threading.Lock()
+        self._puts_since_trim = 0
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+        # db_path 為 None 時只使用記憶體層
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS translation_memory ("
+                "key TEXT PRIMARY KEY, translation TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_tm_accessed ON translation_memory(accessed_at)"
+            )
+            self._db.commit()
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def _remember(self, key: str, translation: str, created_at: float):
+        """放入記憶體層並依容量淘汰最久未使用的項目（呼叫端需持有鎖）"""
+        self._memory[key] = (translation, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def get(self, key: str) -> Optional[str]:
+        """查詢翻譯記憶，找不到或已過期時回傳 None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                translation, created_at = entry
+                if not self._expired(created_at, now):
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return translation
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT translation, created_at FROM translation_memory WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    translation, created_at = row
+                    if not self._expired(created_at, now):
+                        self._db.execute(
+                            "UPDATE translation_memory SET accessed_at = ? WHERE key = ?", (now, key)
+                        )
+                        self._db.commit()
+                        self._remember(key, translation, created_at)
+                        self._counters["disk_hits"] += 1
+                        return translation
+                    self._db.execute("DELETE FROM translation_memory WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self._counters["misses"] += 1
+            return None
+
+    def put(self, key: str, translation: str):
+        """寫入翻譯記憶（兩層同時寫入）"""
+        now = time.time()
+        with self._lock:
+            self._remember(key, translation, now)
+            self._counters["writes"] += 1
+            if self._db is None:
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO translation_memory (key, translation, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, translation, now, now),
+            )
+            self._db.commit()
+
+            # 每寫入一批才檢查一次磁碟容量，避免每次都 COUNT(*)
+            self._puts_since_trim += 1
+            if self._puts_since_trim >= 256:
+                self._puts_since_trim = 0
+                self._trim_disk(now)
+
+    def _trim_disk(self, now: float):
+        """清除過期項目，並依最後存取時間淘汰超出容量的項目（呼叫端需持有鎖）"""
+        if self.ttl_seconds is not None:
+            self._db.execute(
+                "DELETE FROM translation_memory WHERE created_at < ?", (now - self.ttl_seconds,)
+            )
+        (count,) = self._db.execute("SELECT COUNT(*) FROM translation_memory").fetchone()
+        overflow = count - self.max_disk_entries
+        if overflow > 0:
+            self._db.execute(
+                "DELETE FROM translation_memory WHERE key IN ("
+                "SELECT key FROM translation_memory ORDER BY accessed_at LIMIT ?)",
+                (overflow,),
+            )
+            self._counters["evictions"] += overflow
+        self._db.commit()
+
+    def clear(self):
+        """清空兩層快取"""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM translation_memory")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, float]:
+        """取得命中/未命中統計"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def close(self):
+        """關閉磁碟連線"""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,155 @@
+"""
+長文件翻譯引擎
+將輸入切成段落/句子，依 token 預算組成批次，以有限大小的執行緒池平行翻譯，
+最後依原順序與原本的換行格式重新組合
+"""
+
+import asyncio
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Awaitable, Callable, Iterator, List, Tuple
+
+# 段落分隔（空白行），以捕獲群組保留原本的分隔字元
+_PARAGRAPH_SPLIT = re.compile(r"(\n[ \t]*\n\s*)")
+# 句子分隔：中日文句末標點之後，或英文句末標點加空白之後
+_SENTENCE_SPLIT = re.compile(r"((?<=[。！？；])\s*|(?<=[.!?;])\s+)")
+_CJK = re.compile(r"[぀-ヿ㐀-鿿가-힯豈-﫿]")
+
+Segment = Tuple[str, str]  # (內容, 其後的分隔字元)
+
+
+def estimate_tokens(text: str) -> int:
+    """粗估 token 數：CJK 字元約 1 token，其餘約 4 個字元 1 token"""
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _split_keep(pattern: re.Pattern, text: str) -> List[Segment]:
+    """依 pattern 切分文本，回傳 (內容, 分隔字元) 串列"""
+    parts = pattern.split(text)
+    segments = []
+    for i in range(0, len(parts), 2):
+        body = parts[i]
+        sep = parts[i + 1] if i + 1 < len(parts) else ""
+        if body:
+            segments.append((body, sep))
+        elif segments:
+            # 連續分隔字元併入前一段
+            prev_body, prev_sep = segments[-1]
+            segments[-1] = (prev_body, prev_sep + sep)
+    return segments
+
+
+def split_segments(text: str, token_budget: int) -> List[Segment]:
+    """切成段落；超過 token 預算的段落再切成句子"""
+    segments = []
+    for paragraph, sep in _split_keep(_PARAGRAPH_SPLIT, text):
+        if estimate_tokens(paragraph) <= token_budget:
+            segments.append((paragraph, sep))
+            continue
+        sentences = _split_keep(_SENTENCE_SPLIT, paragraph)
+        if sentences:
+            last_body, last_sep = sentences[-1]
+            sentences[-1] = (last_body, last_sep + sep)
+            segments.extend(sentences)
+    return segments
+
+
+def build_batches(segments: List[Segment], token_budget: int) -> List[Tuple[str, str]]:
+    """將相鄰片段組成不超過 token 預算的批次，回傳 (批次文本, 批次後的分隔字元)"""
+    batches = []
+    current, current_tokens = [], 0
+    for body, sep in segments:
+        tokens = estimate_tokens(body)
+        if current and current_tokens + tokens > token_budget:
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append((body, sep))
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+
+    result = []
+    for batch in batches:
+        # 批次內部保留原分隔字元，批次最後的分隔字元留到組合時再補回
+        text = "".join(body + sep for body, sep in batch[:-1]) + batch[-1][0]
+        result.append((text, batch[-1][1]))
+    return result
+
+
+class DocumentTranslator:
+    """以有限執行緒池平行翻譯長文件"""
+
+    def __init__(self, token_budget: int = 1200, max_workers: int = 4):
+        self.token_budget = token_budget
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="doc-translate"
+                )
+            return self._executor
+
+    def needs_chunking(self, text: str) -> bool:
+        """文本是否超過單一提示的 token 預算"""
+        return estimate_tokens(text) > self.token_budget
+
+    def _plan(self, text: str) -> Tuple[str, List[Tuple[str, str]]]:
+        """回傳 (開頭空白, 批次串列)"""
+        leading = text[:len(text) - len(text.lstrip())]
+        return leading, build_batches(split_segments(text.strip(), self.token_budget), self.token_budget)
+
+    def iter_translate(self, text: str, translate_fn: Callable[[str], str]) -> Iterator[str]:
+        """平行翻譯所有批次，依原順序逐步產生已組合完成的譯文"""
+        leading, batches = self._plan(text)
+        executor = self._get_executor()
+        futures = [executor.submit(translate_fn, batch_text) for batch_text, _ in batches]
+
+        assembled = leading
+        try:
+            for future, (_, sep) in zip(futures, batches):
+                assembled += future.result().strip() + sep
+                yield assembled
+        finally:
+            # 呼叫端中途停止時，取消尚未開始的批次
+            for future in futures:
+                future.cancel()
+
+    async def aiter_translate(self, text: str,
+                              atranslate_fn: Callable[[str], Awaitable[str]]) -> AsyncIterator[str]:
+        """非同步版本：以 Semaphore 限制同時進行的批次數"""
+        leading, batches = self._plan(text)
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def run(batch_text):
+            async with semaphore:
+                return await atranslate_fn(batch_text)
+
+        tasks = [asyncio.ensure_future(run(batch_text)) for batch_text, _ in batches]
+        assembled = leading
+        try:
+            for task, (_, sep) in zip(tasks, batches):
+                assembled += (await task).strip() + sep
+                yield assembled
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def translate(self, text: str, translate_fn: Callable[[str], str]) -> str:
+        """翻譯整份文件並回傳完整譯文"""
+        result = text
+        for result in self.iter_translate(text, translate_fn):
+            pass
+        return result
+
+    def shutdown(self):
+        """關閉執行緒池"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None